@@ -4,150 +4,3799 @@ Automatiza o backup de arquivos e pastas com compressão e versionamento
 """
 
 import os
+import errno
+import bisect
 import shutil
+import sys
 import zipfile
+import zlib
+import bz2
+import lzma
+import hashlib
+import sqlite3
+import struct
+import tempfile
+import fnmatch
+import re
+import select
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, redirect_stdout
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
 from datetime import datetime
 from pathlib import Path
 import json
 
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    import ctypes
+    import ctypes.util
+except ImportError:
+    ctypes = None
+
+
+def _load_libc():
+    """
+    libc do Linux via ctypes (None em outros sistemas ou se ela não carregar;
+    sem ela o inotify fica indisponível e o código usa varredura)
+    """
+    if ctypes is None or not sys.platform.startswith("linux"):
+        return None
+    try:
+        # No Windows find_library("c") retorna None e CDLL(None) gera TypeError
+        return ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    except (OSError, TypeError, AttributeError):
+        return None
+
+
+_libc = _load_libc()
+INOTIFY_AVAILABLE = hasattr(_libc, "inotify_init1")
+
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+try:
+    import lz4.frame
+    LZ4_AVAILABLE = True
+except ImportError:
+    LZ4_AVAILABLE = False
+
+try:
+    import numpy
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+
+# Tamanho dos blocos lidos ao calcular hashes e gravar arquivos no ZIP
+BLOCK_SIZE = 1024 * 1024
+
+# Bit do cabeçalho ZIP que indica CRC e tamanhos num descritor após os dados
+ZIP_DATA_DESCRIPTOR = 0x08
+ZIP_DESCRIPTOR_SIGNATURE = 0x08074b50
+
+# Formatos que já são comprimidos e praticamente não diminuem com deflate
+COMPRESSED_EXTENSIONS = {
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.heic',
+    '.mp3', '.mp4', '.m4a', '.m4v', '.mkv', '.avi', '.mov', '.ogg', '.webm', '.flac',
+    '.zip', '.gz', '.tgz', '.bz2', '.xz', '.7z', '.rar', '.zst', '.lz4',
+    '.docx', '.xlsx', '.pptx', '.odt', '.ods', '.jar', '.apk', '.pdf',
+}
+
+# Tipos de compressão do ZIP para cada codec (zstd e lz4 não são lidos pelo zipfile)
+ZIP_COMPRESSION = {
+    "store": zipfile.ZIP_STORED,
+    "deflate": zipfile.ZIP_DEFLATED,
+    "bzip2": zipfile.ZIP_BZIP2,
+    "lzma": zipfile.ZIP_LZMA,
+}
+
+# Marcador de 1 byte do codec usado em cada chunk do repositório deduplicado
+CHUNK_CODEC_TAGS = {
+    "store": b"s",
+    "deflate": b"z",
+    "bzip2": b"b",
+    "lzma": b"x",
+    "zstd": b"Z",
+    "lz4": b"4",
+}
+
+
+def compress_data(data, codec, level=None):
+    """Comprime bytes com o codec indicado"""
+    if codec == "deflate":
+        return zlib.compress(data, zlib.Z_DEFAULT_COMPRESSION if level is None else level)
+    if codec == "bzip2":
+        return bz2.compress(data, 9 if level is None else level)
+    if codec == "lzma":
+        return lzma.compress(data, preset=level)
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=3 if level is None else level).compress(data)
+    if codec == "lz4":
+        return lz4.frame.compress(data, compression_level=level or 0)
+    return data
+
+
+def decompress_data(data, codec):
+    """Descomprime bytes gerados por compress_data"""
+    if codec == "deflate":
+        return zlib.decompress(data)
+    if codec == "bzip2":
+        return bz2.decompress(data)
+    if codec == "lzma":
+        return lzma.decompress(data)
+    if codec == "zstd":
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == "lz4":
+        return lz4.frame.decompress(data)
+    return data
+
+
+class CodecPolicy:
+    """
+    Escolhe como comprimir cada arquivo: formatos já comprimidos e dados
+    incompressíveis são armazenados sem compressão
+    """
+    
+    def __init__(self, codec="deflate", level=None, sample_size=64 * 1024, min_saving=0.05):
+        """
+        Inicializa a política de compressão
+        
+        Args:
+            codec: "deflate", "bzip2", "lzma", "zstd", "lz4" ou "store"
+            level: Nível de compressão do codec (None = padrão do codec)
+            sample_size: Bytes do início do arquivo usados no teste de compressão
+            min_saving: Economia mínima na amostra para valer a pena comprimir
+        """
+        if codec not in CHUNK_CODEC_TAGS:
+            raise ValueError(f"Codec inválido: {codec}")
+        if (codec == "zstd" and not ZSTD_AVAILABLE) or (codec == "lz4" and not LZ4_AVAILABLE):
+            module = "zstandard" if codec == "zstd" else "lz4"
+            print(f"⚠️  {module} não instalado. Usando deflate. Instale com: pip install {module}")
+            codec, level = "deflate", None
+        self.codec = codec
+        self.level = level
+        self.sample_size = sample_size
+        self.min_saving = min_saving
+    
+    def choose(self, file_path, size=None):
+        """Retorna o codec para um arquivo: o configurado ou store"""
+        if self.codec == "store":
+            return "store"
+        if Path(file_path).suffix.lower() in COMPRESSED_EXTENSIONS:
+            return "store"
+        if size is None:
+            size = os.path.getsize(file_path)
+        # Arquivos pequenos são comprimidos direto: o teste custaria o mesmo
+        if size > self.sample_size and self._is_incompressible(file_path):
+            return "store"
+        return self.codec
+    
+    def _is_incompressible(self, file_path):
+        """Testa a compressão (rápida) de uma amostra do início do arquivo"""
+        with open(file_path, 'rb') as f:
+            sample = f.read(self.sample_size)
+        return len(zlib.compress(sample, 1)) > len(sample) * (1 - self.min_saving)
+    
+    def zip_compression(self, file_path, size=None):
+        """Retorna (tipo de compressão ZIP, nível) para um arquivo"""
+        codec = self.choose(file_path, size)
+        if codec not in ZIP_COMPRESSION:
+            # zstd/lz4 só são usados no repositório de chunks (BackupSystem
+            # os recusa no backend "files"); aqui viram deflate
+            return zipfile.ZIP_DEFLATED, None
+        return ZIP_COMPRESSION[codec], self.level
+
+
+# Arquivo na raiz da origem com regras de exclusão no formato do .gitignore
+IGNORE_FILE = ".backupignore"
+
+
+def _translate_glob(pattern):
+    """Converte um glob do estilo gitignore (*, ?, [..] e **) em regex"""
+    i, n = 0, len(pattern)
+    parts = []
+    while i < n:
+        c = pattern[i]
+        if pattern.startswith("**/", i):
+            parts.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("**", i):
+            parts.append(".*")
+            i += 2
+        elif c == "*":
+            parts.append("[^/]*")
+            i += 1
+        elif c == "?":
+            parts.append("[^/]")
+            i += 1
+        elif c == "[" and pattern.find("]", i + 2) != -1:
+            j = pattern.find("]", i + 2)
+            chars = pattern[i + 1:j].replace("\\", "\\\\")
+            if chars.startswith("!"):
+                chars = "^" + chars[1:]
+            parts.append(f"[{chars}]")
+            i = j + 1
+        else:
+            parts.append(re.escape(c))
+            i += 1
+    return "".join(parts)
+
+
+class ScanRules:
+    """
+    Regras de inclusão/exclusão da varredura da origem, compiladas em uma
+    única regex por tipo de teste
+    
+    Os padrões seguem o .gitignore: sem barra casam com o nome em qualquer
+    nível, com barra (ou iniciados por /) são relativos à raiz, terminados em
+    / valem só para pastas, ** atravessa pastas e ! reinclui um caminho.
+    """
+    
+    def __init__(self, exclude=(), include=(), min_size=None, max_size=None, max_age_days=None):
+        """
+        Compila as regras
+        
+        Args:
+            exclude: Padrões de arquivos e pastas a ignorar
+            include: Se informado, só arquivos que casam com algum padrão entram
+            min_size: Tamanho mínimo dos arquivos em bytes
+            max_size: Tamanho máximo dos arquivos em bytes
+            max_age_days: Ignora arquivos modificados há mais dias que isso
+        """
+        exclude = [p.strip() for p in exclude if p.strip() and not p.strip().startswith("#")]
+        self._exclude_dirs = self._compile(p for p in exclude if not p.startswith("!"))
+        self._exclude_files = self._compile(
+            p for p in exclude if not p.startswith("!") and not p.endswith("/"))
+        self._keep_dirs = self._compile(p[1:] for p in exclude if p.startswith("!"))
+        self._keep_files = self._compile(
+            p[1:] for p in exclude if p.startswith("!") and not p.endswith("/"))
+        self._include = self._compile(include)
+        self.min_size = min_size
+        self.max_size = max_size
+        self.min_mtime = time.time() - max_age_days * 86400 if max_age_days is not None else None
+        self.needs_stat = any(v is not None for v in (min_size, max_size, max_age_days))
+    
+    @staticmethod
+    def _compile(patterns):
+        """Une os padrões em uma regex (None se não houver padrões)"""
+        regexes = []
+        for pattern in patterns:
+            anchored = "/" in pattern.rstrip("/")
+            body = _translate_glob(pattern.strip("/"))
+            regexes.append(body if anchored else f"(?:.*/)?{body}")
+        if not regexes:
+            return None
+        return re.compile("|".join(f"(?:{r})" for r in regexes))
+    
+    @classmethod
+    def from_ignore_file(cls, path, **kwargs):
+        """Cria as regras a partir de um arquivo .backupignore (se existir)"""
+        exclude = list(kwargs.pop("exclude", ()))
+        path = Path(path)
+        if path.is_file():
+            exclude.extend(path.read_text(encoding='utf-8').splitlines())
+        return cls(exclude, **kwargs)
+    
+    @staticmethod
+    def _matches(regex, rel):
+        return regex is not None and regex.fullmatch(rel) is not None
+    
+    def prune_dir(self, rel):
+        """Indica se uma pasta (caminho relativo) deve ser ignorada sem descer nela"""
+        return self._matches(self._exclude_dirs, rel) and not self._matches(self._keep_dirs, rel)
+    
+    def accept_name(self, rel):
+        """Testa as regras de nome de um arquivo (sem precisar de stat)"""
+        if self._matches(self._exclude_files, rel) and not self._matches(self._keep_files, rel):
+            return False
+        return self._include is None or self._matches(self._include, rel)
+    
+    def accept_stat(self, stat):
+        """Testa os limites de tamanho e idade de um arquivo"""
+        if self.min_size is not None and stat.st_size < self.min_size:
+            return False
+        if self.max_size is not None and stat.st_size > self.max_size:
+            return False
+        return self.min_mtime is None or stat.st_mtime >= self.min_mtime
+
+
+class _TokenBucket:
+    """Balde de fichas: permite rate unidades por segundo, com rajadas de até um segundo"""
+    
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def take(self, amount):
+        """Retira fichas e retorna quantos segundos esperar para pagar o saldo negativo"""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= amount
+            return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+
+class IOThrottle:
+    """
+    Limita a vazão de leitura e escrita (MB/s) e as aberturas de arquivos por
+    segundo com baldes de fichas, reduz a prioridade de I/O do processo e
+    pausa quando o iowait do sistema passa do limite
+    """
+    
+    def __init__(self, read_mb=None, write_mb=None, opens_per_s=None, iowait_threshold=None,
+                 idle_priority=True):
+        """
+        Args:
+            read_mb: Leitura máxima em MB/s (None = sem limite)
+            write_mb: Escrita máxima em MB/s (None = sem limite)
+            opens_per_s: Aberturas de arquivo por segundo (None = sem limite)
+            iowait_threshold: Fração de iowait da CPU (ex: 0.2) a partir da
+                qual o backup pausa, dobrando a pausa enquanto continuar alto
+            idle_priority: Usa a classe de I/O "idle" (requer psutil)
+        """
+        self._read = _TokenBucket(read_mb * 1024 * 1024) if read_mb else None
+        self._write = _TokenBucket(write_mb * 1024 * 1024) if write_mb else None
+        self._opens = _TokenBucket(opens_per_s) if opens_per_s else None
+        self.iowait_threshold = iowait_threshold
+        self.idle_priority = idle_priority
+        self._warned = False
+        self._lock = threading.Lock()
+        self._cpu_sample = self._cpu_times() if iowait_threshold is not None else None
+        self._next_check = time.monotonic() + 1.0
+        self._backoff = 0.1
+        self.reset_stats()
+    
+    def reset_stats(self):
+        """Zera o tempo de espera e as pausas contabilizados"""
+        self.stats = {"waited": 0.0, "iowait_pauses": 0}
+    
+    @staticmethod
+    def _cpu_times():
+        """(iowait, total) em jiffies, da primeira linha de /proc/stat"""
+        try:
+            with open("/proc/stat", "r") as f:
+                values = [int(v) for v in f.readline().split()[1:9]]
+        except (OSError, ValueError):
+            return None
+        return values[4], sum(values)
+    
+    def lower_priority(self):
+        """
+        Coloca a thread atual na classe de I/O idle (herdada pelas threads e
+        processos que ela criar)
+        
+        No Linux a prioridade de I/O é de cada thread (ioprio_set no id da
+        thread): no BackupScheduler só a thread do job limitado muda.
+        
+        Returns:
+            Prioridade anterior (para restore_priority) ou None se não mudou
+        """
+        if not self.idle_priority:
+            return None
+        if not PSUTIL_AVAILABLE:
+            if not self._warned:
+                self._warned = True
+                print("⚠️  psutil não instalado: prioridade de I/O mantida. Instale com: pip install psutil")
+            return None
+        try:
+            thread = psutil.Process(threading.get_native_id())
+            previous = thread.ionice()
+            thread.ionice(psutil.IOPRIO_CLASS_IDLE)
+        except (AttributeError, OSError, psutil.Error) as e:
+            if not self._warned:
+                self._warned = True
+                print(f"⚠️  Não foi possível reduzir a prioridade de I/O: {e}")
+            return None
+        return previous
+    
+    def restore_priority(self, previous):
+        """Volta a thread atual à prioridade de I/O retornada por lower_priority"""
+        if previous is None:
+            return
+        try:
+            psutil.Process(threading.get_native_id()).ionice(previous.ioclass, previous.value)
+        except (AttributeError, OSError, psutil.Error) as e:
+            print(f"⚠️  Não foi possível restaurar a prioridade de I/O: {e}")
+    
+    @contextmanager
+    def idle_io(self):
+        """Mantém a thread atual na classe de I/O idle enquanto o bloco roda"""
+        previous = self.lower_priority()
+        try:
+            yield
+        finally:
+            self.restore_priority(previous)
+    
+    def _sleep(self, seconds):
+        if seconds > 0:
+            time.sleep(seconds)
+            with self._lock:
+                self.stats["waited"] += seconds
+    
+    def _check_iowait(self):
+        """A cada segundo, mede o iowait do sistema e pausa se estiver alto"""
+        if self._cpu_sample is None or time.monotonic() < self._next_check:
+            return
+        with self._lock:
+            if time.monotonic() < self._next_check:
+                return
+            self._next_check = time.monotonic() + 1.0
+            sample = self._cpu_times()
+            iowait = sample[0] - self._cpu_sample[0]
+            total = sample[1] - self._cpu_sample[1]
+            self._cpu_sample = sample
+            if total <= 0 or iowait / total < self.iowait_threshold:
+                self._backoff = 0.1
+                return
+            pause = self._backoff
+            self._backoff = min(self._backoff * 2, 5.0)
+            self.stats["iowait_pauses"] += 1
+        self._sleep(pause)
+    
+    def read(self, nbytes):
+        """Contabiliza bytes lidos, esperando se o limite foi excedido"""
+        if self._read is not None:
+            self._sleep(self._read.take(nbytes))
+        self._check_iowait()
+    
+    def write(self, nbytes):
+        """Contabiliza bytes gravados, esperando se o limite foi excedido"""
+        if self._write is not None:
+            self._sleep(self._write.take(nbytes))
+        self._check_iowait()
+    
+    def opened(self):
+        """Contabiliza a abertura de um arquivo"""
+        if self._opens is not None:
+            self._sleep(self._opens.take(1))
+    
+    def open(self, path, mode='rb'):
+        """Abre um arquivo cujas leituras e escritas passam pelo limitador"""
+        self.opened()
+        return _ThrottledFile(open(path, mode), self)
+    
+    def report(self):
+        return (f"{self.stats['waited']:.2f}s de espera, "
+                f"{self.stats['iowait_pauses']} pausa(s) por iowait")
+
+
+class _ThrottledFile:
+    """Arquivo cujas leituras e escritas são contabilizadas em um IOThrottle"""
+    
+    def __init__(self, f, throttle):
+        self._f = f
+        self._throttle = throttle
+    
+    def read(self, size=-1):
+        data = self._f.read(size)
+        if data:
+            self._throttle.read(len(data))
+        return data
+    
+    def readinto(self, buffer):
+        count = self._f.readinto(buffer)
+        if count:
+            self._throttle.read(count)
+        return count
+    
+    def write(self, data):
+        self._throttle.write(len(data))
+        return self._f.write(data)
+    
+    def __getattr__(self, name):
+        return getattr(self._f, name)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self._f.close()
+
+
+class _ReadMeter:
+    """
+    Abre arquivos para leitura contando os bytes realmente lidos e o tempo
+    gasto nas leituras (métricas "bytes_read" e "read" de create_backup)
+    """
+    
+    def __init__(self, opener=open):
+        self.opener = opener
+        self.bytes = 0
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+    
+    def open(self, path, mode='rb'):
+        f = self.opener(path, mode)
+        return _MeteredFile(f, self) if mode == 'rb' else f
+    
+    def add(self, nbytes, seconds):
+        with self._lock:
+            self.bytes += nbytes
+            self.seconds += seconds
+
+
+class _MeteredFile:
+    """Arquivo cujas leituras são contabilizadas em um _ReadMeter"""
+    
+    def __init__(self, f, meter):
+        self._f = f
+        self._meter = meter
+    
+    def read(self, size=-1):
+        start = time.perf_counter()
+        data = self._f.read(size)
+        self._meter.add(len(data), time.perf_counter() - start)
+        return data
+    
+    def readinto(self, buffer):
+        start = time.perf_counter()
+        count = self._f.readinto(buffer)
+        self._meter.add(count or 0, time.perf_counter() - start)
+        return count
+    
+    def __getattr__(self, name):
+        return getattr(self._f, name)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self._f.close()
+
+
+class _StreamOutput:
+    """
+    Destino do ZIP no modo stream (pipe, socket, saída padrão)
+    
+    Sem seek nem tell, o zipfile grava cada membro com descritor de dados e
+    nunca volta atrás: o ZIP sai em ordem e a memória não depende do tamanho
+    dos arquivos. Conta os bytes gravados e, com throttle, limita a escrita.
+    """
+    
+    def __init__(self, stream, throttle=None):
+        self._stream = stream
+        self._throttle = throttle
+        self.written = 0
+    
+    def write(self, data):
+        if self._throttle is not None:
+            self._throttle.write(len(data))
+        self._stream.write(data)
+        self.written += len(data)
+        return len(data)
+    
+    def flush(self):
+        self._stream.flush()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.flush()
+
+
+def calculate_hash(file_path, algorithm='sha256', opener=open):
+    """Calcula o hash do conteúdo de um arquivo lendo em blocos"""
+    hash_obj = hashlib.new(algorithm)
+    with opener(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(BLOCK_SIZE), b""):
+            hash_obj.update(chunk)
+    return hash_obj.hexdigest()
+
+
+# Tabela do rolling hash Gear usado no chunking definido pelo conteúdo
+GEAR_TABLE = [int.from_bytes(hashlib.sha256(bytes([i])).digest()[:8], 'big')
+              for i in range(256)]
+GEAR_ARRAY = numpy.array(GEAR_TABLE, dtype=numpy.uint64) if NUMPY_AVAILABLE else None
+
+# Bytes de hash Gear calculados por vez na versão com numpy
+GEAR_SEGMENT = 16 * 1024
+
+# Sem numpy: byte k do valor Gear de cada byte (para bytes.translate) e
+# bytes de hash calculados por vez com inteiros do Python
+GEAR_PLANES = [bytes((gear >> (8 * k)) & 0xFF for gear in GEAR_TABLE) for k in range(8)]
+GEAR_INT_SEGMENT = 4 * 1024
+
+
+def _write_zip_member(zipf, file_path, arcname, compress_type=zipfile.ZIP_DEFLATED, level=None,
+                      metrics=None, opener=open, force_zip64=False):
+    """
+    Grava um arquivo no ZIP em blocos, calculando o hash na mesma leitura
+    
+    Com metrics (BackupMetrics), soma o tempo de compressão e escrita
+    ("compress"); a leitura é medida pelo opener de create_backup. opener
+    abre o arquivo de origem (ex: IOThrottle.open). force_zip64 grava os campos ZIP64 mesmo em
+    arquivos pequenos, para o caso de o arquivo crescer durante a leitura.
+    """
+    zinfo = zipfile.ZipInfo.from_file(file_path, arcname)
+    zinfo.compress_type = compress_type
+    zinfo._compresslevel = level
+    hash_obj = hashlib.sha256()
+    compress_time = 0.0
+    with opener(file_path, 'rb') as src, \
+            zipf.open(zinfo, 'w', force_zip64=force_zip64) as dest:
+        while True:
+            chunk = src.read(BLOCK_SIZE)
+            if not chunk:
+                break
+            hash_obj.update(chunk)
+            start = time.perf_counter()
+            dest.write(chunk)
+            compress_time += time.perf_counter() - start
+    if metrics is not None:
+        metrics.add_time("compress", compress_time)
+    return hash_obj.hexdigest()
+
+
+def _copy_raw_member(src_fp, info, zipf, arcname=None):
+    """
+    Copia um membro de outro ZIP para zipf sem descomprimir nem recomprimir
+    
+    Args:
+        src_fp: Arquivo do ZIP de origem, aberto para leitura
+        info: ZipInfo do membro no ZIP de origem
+        zipf: ZipFile de destino, aberto para escrita
+        arcname: Nome no destino (padrão: o mesmo da origem)
+    """
+    # O cabeçalho local pode ter um campo extra diferente do diretório central
+    src_fp.seek(info.header_offset)
+    header = src_fp.read(zipfile.sizeFileHeader)
+    name_length, extra_length = struct.unpack("<HH", header[26:30])
+    src_fp.seek(info.header_offset + zipfile.sizeFileHeader + name_length + extra_length)
+    
+    zinfo = zipfile.ZipInfo(arcname or info.filename, info.date_time)
+    zinfo.compress_type = info.compress_type
+    zinfo.external_attr = info.external_attr
+    # Os tamanhos vão no cabeçalho local: sem descritor de dados
+    zinfo.flag_bits = info.flag_bits & ~ZIP_DATA_DESCRIPTOR
+    zinfo.CRC = info.CRC
+    zinfo.file_size = info.file_size
+    zinfo.compress_size = info.compress_size
+    
+    fp = zipf.fp
+    zinfo.header_offset = fp.tell()
+    fp.write(zinfo.FileHeader())
+    remaining = info.compress_size
+    while remaining:
+        data = src_fp.read(min(remaining, BLOCK_SIZE))
+        if not data:
+            raise zipfile.BadZipFile(f"Membro truncado: {info.filename}")
+        fp.write(data)
+        remaining -= len(data)
+    zipf.filelist.append(zinfo)
+    zipf.NameToInfo[zinfo.filename] = zinfo
+    zipf.start_dir = fp.tell()
+
+
+def _deflate_block(data, level, final):
+    """
+    Comprime um bloco em deflate bruto (executado nos processos do pool)
+    
+    Blocos intermediários terminam com Z_SYNC_FLUSH (alinhados em byte e sem
+    marca de fim), então a concatenação de todos forma um único stream válido.
+    """
+    if level is None:
+        level = zlib.Z_DEFAULT_COMPRESSION
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    data = compressor.compress(data)
+    return data + compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+# ioctl do Linux que clona um arquivo inteiro por reflink (btrfs, XFS)
+FICLONE = 0x40049409
+
+# Bytes por chamada de copy_file_range/sendfile
+KERNEL_COPY_SIZE = 64 * 1024 * 1024
+
+# Erros que indicam que o método de cópia não é suportado neste par de arquivos
+COPY_FALLBACK_ERRNOS = {
+    errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP,
+    errno.ENOTSUP, errno.EBADF, errno.EPERM, errno.ETXTBSY, errno.ENOTTY,
+}
+
+
+class CopyEngine:
+    """
+    Copia arquivos pelo kernel, sem passar por buffers do Python
+    
+    Tenta, em ordem: clone por reflink (instantâneo em btrfs/XFS),
+    copy_file_range, sendfile e, por último, a cópia em blocos do shutil.
+    Um método recusado pelo sistema de arquivos não é tentado novamente.
+    """
+    
+    def __init__(self, workers=4, throttle=None):
+        """
+        Inicializa o motor de cópia
+        
+        Args:
+            workers: Threads usadas para copiar muitos arquivos em paralelo
+            throttle: IOThrottle que limita a vazão (cópias em blocos menores)
+        """
+        self.workers = workers
+        self.throttle = throttle
+        self._reflink = fcntl is not None and hasattr(fcntl, "ioctl")
+        self._copy_file_range = hasattr(os, "copy_file_range")
+        self._sendfile = hasattr(os, "sendfile")
+        self._lock = threading.Lock()
+        self.stats = {"files": 0, "bytes": 0, "seconds": 0.0, "methods": {}}
+    
+    def copy_file(self, src, dst, hash_obj=None):
+        """
+        Copia um arquivo preservando metadados e retorna o método usado
+        
+        Com hash_obj (ex: hashlib.sha256()), o conteúdo também é passado ao
+        hash: sem reflink a cópia é feita em blocos pelo Python, calculando o
+        hash na mesma leitura em vez de reler a cópia; depois de um clone por
+        reflink, que não lê nada, a origem é lida só para o hash.
+        """
+        if self.throttle is not None:
+            self.throttle.opened()
+        with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+            size = os.fstat(fsrc.fileno()).st_size
+            method = self._copy_data(fsrc, fdst, size, hash_obj)
+        shutil.copystat(src, dst)
+        
+        with self._lock:
+            self.stats["files"] += 1
+            self.stats["bytes"] += size
+            self.stats["methods"][method] = self.stats["methods"].get(method, 0) + 1
+        return method
+    
+    def _copy_data(self, fsrc, fdst, size, hash_obj=None):
+        """Copia o conteúdo com o método mais rápido disponível"""
+        src_fd, dst_fd = fsrc.fileno(), fdst.fileno()
+        if self._reflink and size:
+            try:
+                fcntl.ioctl(dst_fd, FICLONE, src_fd)
+                if hash_obj is not None:
+                    self._copy_buffered(fsrc, None, hash_obj)
+                return "reflink"
+            except OSError as e:
+                if e.errno not in COPY_FALLBACK_ERRNOS:
+                    raise
+                self._reflink = False
+        
+        # Com limite de vazão, cada bloco copiado é contabilizado no throttle
+        step = BLOCK_SIZE if self.throttle is not None else KERNEL_COPY_SIZE
+        
+        # Com hash, os dados precisam passar pelo Python de qualquer forma
+        if self._copy_file_range and hash_obj is None:
+            try:
+                while True:
+                    copied = os.copy_file_range(src_fd, dst_fd, step)
+                    if not copied:
+                        break
+                    self._account(copied)
+                return "copy_file_range"
+            except OSError as e:
+                if e.errno not in COPY_FALLBACK_ERRNOS:
+                    raise
+                self._copy_file_range = False
+                self._rewind(src_fd, dst_fd)
+        
+        if self._sendfile and hash_obj is None:
+            try:
+                offset = 0
+                while True:
+                    sent = os.sendfile(dst_fd, src_fd, offset, step)
+                    if not sent:
+                        break
+                    offset += sent
+                    self._account(sent)
+                return "sendfile"
+            except OSError as e:
+                if e.errno not in COPY_FALLBACK_ERRNOS:
+                    raise
+                self._sendfile = False
+                self._rewind(src_fd, dst_fd)
+        
+        self._copy_buffered(fsrc, fdst, hash_obj)
+        return "python"
+    
+    def _copy_buffered(self, fsrc, fdst, hash_obj=None):
+        """Copia em blocos pelo Python (ou só lê, com fdst None) atualizando hash_obj"""
+        if self.throttle is not None:
+            fsrc = _ThrottledFile(fsrc, self.throttle)
+            if fdst is not None:
+                fdst = _ThrottledFile(fdst, self.throttle)
+        if hash_obj is None:
+            shutil.copyfileobj(fsrc, fdst, BLOCK_SIZE)
+            return
+        for block in iter(lambda: fsrc.read(BLOCK_SIZE), b""):
+            hash_obj.update(block)
+            if fdst is not None:
+                fdst.write(block)
+    
+    def _account(self, nbytes):
+        """Contabiliza um bloco copiado pelo kernel (lido e gravado) no throttle"""
+        if self.throttle is not None:
+            self.throttle.read(nbytes)
+            self.throttle.write(nbytes)
+    
+    @staticmethod
+    def _rewind(src_fd, dst_fd):
+        """Desfaz uma cópia parcial antes de tentar o próximo método"""
+        os.lseek(src_fd, 0, os.SEEK_SET)
+        os.lseek(dst_fd, 0, os.SEEK_SET)
+        os.ftruncate(dst_fd, 0)
+    
+    def copy_many(self, pairs, hash_files=False, known_hashes=None):
+        """
+        Copia vários arquivos em paralelo
+        
+        Args:
+            pairs: Lista de (origem, destino)
+            hash_files: Se True, retorna o hash SHA-256 de cada arquivo,
+                calculado na leitura da origem (ver copy_file)
+            known_hashes: Hashes já conhecidos {origem: hash}; esses arquivos
+                são copiados pelo método mais rápido, sem leitura para o hash
+        
+        Returns:
+            Lista (na ordem de pairs) com o hash de cada arquivo ou None
+        """
+        known_hashes = known_hashes or {}
+        
+        def copy_one(pair):
+            src, dst = pair
+            Path(dst).parent.mkdir(parents=True, exist_ok=True)
+            known = known_hashes.get(src)
+            if not hash_files or known is not None:
+                self.copy_file(src, dst)
+                return known if hash_files else None
+            hash_obj = hashlib.sha256()
+            self.copy_file(src, dst, hash_obj)
+            return hash_obj.hexdigest()
+        
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            results = list(pool.map(copy_one, pairs))
+        self.stats["seconds"] += time.time() - start
+        return results
+    
+    def copy_tree(self, src_dir, dst_dir):
+        """Copia uma árvore de pastas (mesclando com o destino, se existir)"""
+        src_dir, dst_dir = Path(src_dir), Path(dst_dir)
+        pairs = []
+        for root, dirs, files in os.walk(src_dir):
+            target_root = dst_dir / Path(root).relative_to(src_dir)
+            target_root.mkdir(parents=True, exist_ok=True)
+            pairs.extend((Path(root) / name, target_root / name) for name in files)
+        self.copy_many(pairs)
+    
+    def report(self):
+        """Resumo da cópia: arquivos, volume, vazão e métodos usados"""
+        size_mb = self.stats["bytes"] / (1024 * 1024)
+        seconds = self.stats["seconds"]
+        rate = size_mb / seconds if seconds else 0.0
+        methods = ", ".join(f"{name}: {count}" for name, count in sorted(self.stats["methods"].items()))
+        return (f"{self.stats['files']} arquivo(s), {size_mb:.2f} MB em {seconds:.2f}s "
+                f"({rate:.2f} MB/s) [{methods}]")
+
+
+class _ParallelZipWriter:
+    """
+    Grava membros no ZIP comprimindo blocos em paralelo num pool de processos
+    
+    A leitura, o CRC e o hash ficam no processo principal; os blocos
+    comprimidos são gravados na ordem original conforme ficam prontos.
+    Membros sem compressão não passam pelo pool, e bzip2/lzma (que não
+    podem ser divididos em blocos) são gravados sequencialmente. Em destinos
+    não posicionáveis (pipes), CRC e tamanhos vão num descritor de dados
+    depois do conteúdo, em vez de regravar o cabeçalho local.
+    """
+    
+    def __init__(self, zipf, pool, workers, opener=open, force_zip64=False):
+        self.zipf = zipf
+        self.pool = pool
+        self.opener = opener
+        self.force_zip64 = force_zip64
+        self.max_pending = workers * 4
+        self.pending = deque()
+        self._pending_blocks = 0
+        self._zip64 = False
+        self._compress_size = 0
+        # Tempo esperando os blocos comprimidos e gravando-os no ZIP
+        self.seconds = 0.0
+    
+    def add_file(self, file_path, arcname, compress_type=zipfile.ZIP_DEFLATED, level=None):
+        """Enfileira um arquivo e retorna o hash SHA-256 do conteúdo"""
+        if compress_type not in (zipfile.ZIP_DEFLATED, zipfile.ZIP_STORED):
+            self.flush()
+            return _write_zip_member(self.zipf, file_path, arcname, compress_type, level,
+                                     opener=self.opener, force_zip64=self.force_zip64)
+        
+        zinfo = zipfile.ZipInfo.from_file(file_path, arcname)
+        zinfo.compress_type = compress_type
+        hash_obj = hashlib.sha256()
+        crc = 0
+        size = 0
+        
+        # Abre antes de enfileirar o cabeçalho: um arquivo que sumiu não deixa
+        # membro pela metade no ZIP
+        with self.opener(file_path, 'rb') as f:
+            self.pending.append(("start", zinfo))
+            block = f.read(BLOCK_SIZE)
+            while True:
+                next_block = f.read(BLOCK_SIZE) if block else b""
+                final = not next_block
+                hash_obj.update(block)
+                crc = zlib.crc32(block, crc)
+                size += len(block)
+                self._wait_for_slot()
+                if compress_type == zipfile.ZIP_STORED:
+                    self.pending.append(("data", block))
+                else:
+                    self.pending.append(("block", self.pool.submit(_deflate_block, block, level, final)))
+                self._pending_blocks += 1
+                if final:
+                    break
+                block = next_block
+        self.pending.append(("end", zinfo, crc, size))
+        return hash_obj.hexdigest()
+    
+    def _wait_for_slot(self):
+        """Limita a quantidade de blocos em memória aguardando os mais antigos"""
+        while self._pending_blocks >= self.max_pending:
+            self._write_next()
+    
+    def _write_next(self):
+        """Grava no ZIP o próximo item da fila, respeitando a ordem"""
+        start = time.perf_counter()
+        try:
+            self._write_item(self.pending.popleft())
+        finally:
+            self.seconds += time.perf_counter() - start
+    
+    def _write_item(self, item):
+        """Grava um item da fila (cabeçalho, bloco ou fim de membro)"""
+        fp = self.zipf.fp
+        if item[0] == "start":
+            zinfo = item[1]
+            self._zip64 = self.force_zip64 or zinfo.file_size * 1.05 > zipfile.ZIP64_LIMIT
+            self._compress_size = 0
+            zinfo.CRC = 0
+            zinfo.compress_size = 0
+            if not self.zipf._seekable:
+                zinfo.flag_bits |= ZIP_DATA_DESCRIPTOR
+            zinfo.header_offset = fp.tell()
+            fp.write(zinfo.FileHeader(self._zip64))
+        elif item[0] in ("block", "data"):
+            data = item[1].result() if item[0] == "block" else item[1]
+            self._pending_blocks -= 1
+            fp.write(data)
+            self._compress_size += len(data)
+        else:
+            zinfo, crc, size = item[1], item[2], item[3]
+            if not self._zip64 and max(size, self._compress_size) > zipfile.ZIP64_LIMIT:
+                raise RuntimeError(f"{zinfo.filename} cresceu além de 4 GB durante a leitura")
+            zinfo.CRC = crc
+            zinfo.file_size = size
+            zinfo.compress_size = self._compress_size
+            if zinfo.flag_bits & ZIP_DATA_DESCRIPTOR:
+                fp.write(struct.pack("<LLQQ" if self._zip64 else "<LLLL", ZIP_DESCRIPTOR_SIGNATURE,
+                                     crc, zinfo.compress_size, size))
+            else:
+                # Reescreve o cabeçalho local com CRC e tamanhos finais
+                end = fp.tell()
+                fp.seek(zinfo.header_offset)
+                fp.write(zinfo.FileHeader(self._zip64))
+                fp.seek(end)
+            self.zipf.filelist.append(zinfo)
+            self.zipf.NameToInfo[zinfo.filename] = zinfo
+            self.zipf.start_dir = fp.tell()
+    
+    def flush(self):
+        """Grava todos os itens pendentes"""
+        while self.pending:
+            self._write_next()
+
+
+# Idade mínima (s) para a limpeza remover um chunk temporário: os mais novos
+# podem estar sendo gravados por um backup em andamento
+CHUNK_TMP_GRACE = 60 * 60
+
+
+class ChunkStore:
+    """
+    Repositório deduplicado: cada chunk único é gravado uma única vez,
+    identificado pelo seu hash SHA-256
+    """
+    
+    def __init__(self, root, min_size=16 * 1024, avg_size=64 * 1024, max_size=256 * 1024):
+        """
+        Inicializa o repositório de chunks
+        
+        Args:
+            root: Pasta onde os chunks são armazenados
+            min_size: Tamanho mínimo de um chunk (bytes)
+            avg_size: Tamanho médio desejado (potência de 2)
+            max_size: Tamanho máximo de um chunk (bytes)
+        """
+        self.root = Path(root)
+        self.root.mkdir(exist_ok=True)
+        self.min_size = min_size
+        self.avg_size = avg_size
+        self.max_size = max_size
+        # Usa os bits altos do hash Gear, que dependem da janela inteira
+        bits = avg_size.bit_length() - 1
+        self.mask = ((1 << bits) - 1) << (64 - bits)
+        if not NUMPY_AVAILABLE:
+            # Constantes repetidas em cada faixa de 128 bits de _find_cut_int
+            lanes = GEAR_INT_SEGMENT + 63
+            repeat = lambda value: int.from_bytes(value.to_bytes(16, 'little') * lanes, 'little')
+            self._lane_mask = repeat(self.mask)
+            self._lane_carry = repeat((1 << 64) - (1 << (64 - bits)))
+            self._lane_bit = repeat(1 << 64)
+    
+    def _find_cut(self, buffer):
+        """
+        Retorna a posição do próximo corte de chunk dentro do buffer
+        
+        O corte fica logo após o primeiro byte em que o hash Gear
+        h = ((h << 1) + GEAR_TABLE[byte]) mod 2**64, iniciado em zero em
+        min_size (os bytes anteriores nunca são corte), tem h & mask == 0.
+        """
+        end = min(len(buffer), self.max_size)
+        if end <= self.min_size:
+            return end
+        
+        if NUMPY_AVAILABLE:
+            return self._find_cut_vectorized(buffer, end)
+        return self._find_cut_int(buffer, end)
+    
+    def _find_cut_int(self, buffer, end):
+        """
+        _find_cut sem numpy, com os mesmos cortes
+        
+        A mesma soma que dobra a janela de _find_cut_vectorized, feita com um
+        inteiro do Python com uma faixa de 128 bits por posição: a soma dos
+        64 valores deslocados cabe na faixa sem vazar para a seguinte, e os
+        64 bits baixos são o hash. Um único teste por trecho encontra a
+        primeira faixa com (hash & mask) == 0: somar à parte mascarada um
+        valor que leva qualquer bit ligado até o bit 64 deixa esse bit
+        apagado só nas posições de corte.
+        """
+        lanes = GEAR_INT_SEGMENT + 63
+        for start in range(self.min_size, end, GEAR_INT_SEGMENT):
+            # O hash começa em zero em min_size: nada antes dele entra na janela
+            context = max(self.min_size, start - 63)
+            segment = buffer[context:min(end, start + GEAR_INT_SEGMENT)]
+            values = bytearray(16 * len(segment))
+            for k, plane in enumerate(GEAR_PLANES):
+                values[k::16] = segment.translate(plane)
+            h = int.from_bytes(values, 'little')
+            for shift in (1, 2, 4, 8, 16, 32):
+                h += h << (129 * shift)
+            unused = 128 * (lanes - len(segment))
+            bit = self._lane_bit >> unused
+            misses = ((h & (self._lane_mask >> unused)) + (self._lane_carry >> unused)) & bit
+            hits = (bit ^ misses) >> (128 * (start - context))
+            if hits:
+                return start + ((hits & -hits).bit_length() - 65) // 128 + 1
+        return end
+    
+    def _find_cut_vectorized(self, buffer, end):
+        """
+        _find_cut com numpy, com os mesmos cortes
+        
+        O hash Gear de uma posição só depende dos últimos 64 bytes (os mais
+        antigos saem pelo deslocamento), então o de todas as posições de um
+        trecho sai de 6 somas vetoriais que dobram a janela (1, 2, ..., 64).
+        """
+        mask = numpy.uint64(self.mask)
+        data = numpy.frombuffer(buffer, dtype=numpy.uint8, count=end)
+        for start in range(self.min_size, end, GEAR_SEGMENT):
+            # O hash começa em zero em min_size: nada antes dele entra na janela
+            context = max(self.min_size, start - 63)
+            h = GEAR_ARRAY[data[context:min(end, start + GEAR_SEGMENT)]]
+            shift = 1
+            while shift < 64:
+                h[shift:] += h[:-shift] << numpy.uint64(shift)
+                shift *= 2
+            hits = numpy.flatnonzero((h[start - context:] & mask) == 0)
+            if hits.size:
+                return start + int(hits[0]) + 1
+        return end
+    
+    def chunk_file(self, file_path, opener=open):
+        """Divide um arquivo em chunks definidos pelo conteúdo"""
+        buffer = bytearray()
+        with opener(file_path, 'rb') as f:
+            while True:
+                data = f.read(BLOCK_SIZE)
+                buffer += data
+                while len(buffer) >= self.max_size or (not data and buffer):
+                    cut = self._find_cut(buffer)
+                    yield bytes(buffer[:cut])
+                    del buffer[:cut]
+                if not data:
+                    break
+    
+    def store_file(self, file_path, codec="deflate", level=None, opener=open):
+        """
+        Divide um arquivo em chunks e grava os que ainda não existem
+        
+        Returns:
+            Tupla (hash SHA-256 do conteúdo, hashes dos chunks, chunks novos,
+            bytes gravados em disco)
+        """
+        hash_obj = hashlib.sha256()
+        chunks = []
+        new_chunks = 0
+        written = 0
+        for data in self.chunk_file(file_path, opener):
+            hash_obj.update(data)
+            digest, stored = self.put(data, codec, level)
+            chunks.append(digest)
+            if stored:
+                new_chunks += 1
+                written += stored
+        return hash_obj.hexdigest(), chunks, new_chunks, written
+    
+    def _chunk_path(self, digest):
+        """Caminho de um chunk (subpastas pelos 2 primeiros caracteres do hash)"""
+        return self.root / digest[:2] / digest
+    
+    def put(self, data, codec="deflate", level=None):
+        """
+        Grava um chunk se ainda não existir
+        
+        Args:
+            data: Conteúdo do chunk
+            codec: Codec de compressão (ver CodecPolicy)
+            level: Nível de compressão
+        
+        Returns:
+            Tupla (hash do chunk, bytes gravados em disco)
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        chunk_path = self._chunk_path(digest)
+        if chunk_path.exists():
+            return digest, 0
+        
+        compressed = compress_data(data, codec, level)
+        if len(compressed) < len(data):
+            payload = CHUNK_CODEC_TAGS[codec] + compressed
+        else:
+            payload = CHUNK_CODEC_TAGS["store"] + data
+        
+        chunk_path.parent.mkdir(exist_ok=True)
+        # Nome temporário por processo: workers podem gravar o mesmo chunk
+        tmp_path = chunk_path.with_name(f"{digest}.{os.getpid()}.tmp")
+        with open(tmp_path, 'wb') as f:
+            f.write(payload)
+        os.replace(tmp_path, chunk_path)
+        return digest, len(payload)
+    
+    def get(self, digest):
+        """Lê e descomprime um chunk"""
+        with open(self._chunk_path(digest), 'rb') as f:
+            payload = f.read()
+        for codec, tag in CHUNK_CODEC_TAGS.items():
+            if payload[:1] == tag:
+                return decompress_data(payload[1:], codec)
+        raise ValueError(f"Codec desconhecido no chunk {digest}")
+    
+    def collect_garbage(self, live_digests):
+        """
+        Remove chunks que não são referenciados por nenhum backup
+        
+        Arquivos .tmp só são removidos depois de CHUNK_TMP_GRACE segundos
+        (sobras de um backup interrompido); os mais novos podem ser de um
+        backup que está gravando chunks neste momento.
+        """
+        removed = 0
+        now = time.time()
+        for chunk_path in self.root.glob('*/*'):
+            if chunk_path.name in live_digests:
+                continue
+            try:
+                if (chunk_path.suffix == ".tmp"
+                        and now - chunk_path.stat().st_mtime < CHUNK_TMP_GRACE):
+                    continue
+                chunk_path.unlink()
+            except FileNotFoundError:
+                # O .tmp já foi renomeado para o chunk final
+                continue
+            removed += 1
+        return removed
+
+
+# Blocos de assinatura do delta binário: adler32 (4 bytes) + blake2b (16 bytes)
+DELTA_BLOCK_SIZE = 64 * 1024
+DELTA_MIN_SIZE = 16 * 1024 * 1024
+DELTA_SIG_ENTRY = 20
+DELTA_MAGIC = b"BKD1"
+DELTA_SUFFIX = ".bkdelta"
+DELTA_MAX_LITERAL = 0.5
+# A busca byte a byte roda a ~1 MB/s: desiste (e grava o arquivo completo)
+# depois de tantos bytes seguidos sem bloco em comum ou literais no total
+DELTA_MAX_MISS_RUN = 256 * DELTA_BLOCK_SIZE
+DELTA_MAX_LITERAL_BYTES = 64 * 1024 * 1024
+ADLER_MOD = 65521
+
+
+def _block_strong(data):
+    """Hash forte de um bloco da assinatura"""
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+def _block_signature(file_path, block_size=DELTA_BLOCK_SIZE, opener=open):
+    """
+    Assinatura de um arquivo para deltas: adler32 e hash forte de cada bloco
+    completo de block_size bytes (o último bloco parcial fica de fora)
+    """
+    signature = bytearray()
+    with opener(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            if len(block) == block_size:
+                signature += struct.pack(">I", zlib.adler32(block)) + _block_strong(block)
+    return bytes(signature)
+
+
+def _delta_ops(file_path, signature, block_size, max_literal=DELTA_MAX_LITERAL, opener=open,
+               max_miss_run=DELTA_MAX_MISS_RUN, max_literal_bytes=DELTA_MAX_LITERAL_BYTES):
+    """
+    Compara um arquivo com a assinatura da versão anterior (estilo rsync)
+    
+    Uma janela de block_size bytes percorre o arquivo com adler32 rolante;
+    quando o adler32 e o hash forte coincidem com um bloco da assinatura, o
+    bloco vira uma cópia da versão anterior, senão a janela avança um byte.
+    
+    Returns:
+        (operações, hash sha256, nova assinatura) ou None quando os dados
+        literais passam de max_literal do tamanho do arquivo ou de
+        max_literal_bytes, ou quando max_miss_run bytes seguidos não têm
+        nenhum bloco em comum (arquivo muito reescrito: a busca seria lenta
+        e o delta, inútil). As operações são ("C", primeiro bloco,
+        quantidade) ou ("L", posição no arquivo, tamanho)
+    """
+    index = {}
+    for i in range(len(signature) // DELTA_SIG_ENTRY):
+        entry = signature[i * DELTA_SIG_ENTRY:(i + 1) * DELTA_SIG_ENTRY]
+        weak = struct.unpack(">I", entry[:4])[0]
+        index.setdefault(weak, {}).setdefault(entry[4:], i)
+    
+    literal_limit = min(os.path.getsize(file_path) * max_literal, max_literal_bytes)
+    hash_obj = hashlib.sha256()
+    new_signature = bytearray()
+    pending = b""
+    ops = []
+    literal = 0
+    literal_start = None
+    
+    def add_literal(end):
+        nonlocal literal, literal_start
+        if literal_start is not None and end > literal_start:
+            ops.append(("L", literal_start, end - literal_start))
+            literal += end - literal_start
+        literal_start = None
+    
+    with opener(file_path, 'rb') as f:
+        buf = b""
+        offset = 0  # posição no arquivo de buf[0]
+        pos = 0
+        weak = None
+        eof = False
+        while True:
+            if len(buf) - pos < block_size and not eof:
+                if literal_start is not None:
+                    run = offset + pos - literal_start
+                    if literal + run > literal_limit or run > max_miss_run:
+                        return None
+                data = f.read(BLOCK_SIZE * 4)
+                if not data:
+                    eof = True
+                    continue
+                hash_obj.update(data)
+                pending += data
+                whole = len(pending) - len(pending) % block_size
+                for i in range(0, whole, block_size):
+                    block = pending[i:i + block_size]
+                    new_signature += struct.pack(">I", zlib.adler32(block)) + _block_strong(block)
+                pending = pending[whole:]
+                offset += pos
+                buf = buf[pos:] + data
+                pos = 0
+                continue
+            if len(buf) - pos < block_size:
+                break
+            
+            if weak is None:
+                weak = zlib.adler32(buf[pos:pos + block_size])
+            candidates = index.get(weak)
+            if candidates is not None:
+                block = candidates.get(_block_strong(buf[pos:pos + block_size]))
+                if block is not None:
+                    add_literal(offset + pos)
+                    if ops and ops[-1][0] == "C" and ops[-1][1] + ops[-1][2] == block:
+                        ops[-1] = ("C", ops[-1][1], ops[-1][2] + 1)
+                    else:
+                        ops.append(("C", block, 1))
+                    pos += block_size
+                    weak = None
+                    continue
+            
+            # Sem correspondência: o byte sai da janela como literal
+            if literal_start is None:
+                literal_start = offset + pos
+                if literal > literal_limit:
+                    return None
+            if len(buf) - pos > block_size:
+                out_byte = buf[pos]
+                a = ((weak & 0xffff) - out_byte + buf[pos + block_size]) % ADLER_MOD
+                b = ((weak >> 16) - block_size * out_byte + a - 1) % ADLER_MOD
+                weak = (b << 16) | a
+            else:
+                weak = None
+            pos += 1
+        
+        if literal_start is None:
+            literal_start = offset + pos
+        add_literal(offset + len(buf))
+    
+    if literal > literal_limit:
+        return None
+    return ops, hash_obj.hexdigest(), bytes(new_signature)
+
+
+def _write_delta(ops, block_size, src, dest):
+    """
+    Grava o delta: cabeçalho, cópias de blocos da versão anterior e
+    literais lidos do arquivo novo
+    """
+    dest.write(DELTA_MAGIC + struct.pack(">I", block_size))
+    for op, first, count in ops:
+        if op == "C":
+            dest.write(b"C" + struct.pack(">QI", first, count))
+            continue
+        src.seek(first)
+        remaining = count
+        while remaining:
+            data = src.read(min(remaining, BLOCK_SIZE))
+            if not data:
+                raise ValueError("Arquivo alterado durante o backup")
+            dest.write(b"L" + struct.pack(">I", len(data)) + data)
+            remaining -= len(data)
+
+
+def _read_exact(stream, size):
+    """Lê exatamente size bytes de um stream (ZipExtFile pode retornar menos)"""
+    data = b""
+    while len(data) < size:
+        chunk = stream.read(size - len(data))
+        if not chunk:
+            raise ValueError("Delta truncado")
+        data += chunk
+    return data
+
+
+def _apply_delta(base, delta, write):
+    """
+    Reconstrói uma versão a partir da anterior e do delta
+    
+    Args:
+        base: Arquivo da versão anterior, aberto para leitura com seek
+        delta: Stream do delta
+        write: Função que recebe os dados reconstruídos
+    """
+    header = _read_exact(delta, 8)
+    if header[:4] != DELTA_MAGIC:
+        raise ValueError("Delta inválido")
+    block_size = struct.unpack(">I", header[4:])[0]
+    while True:
+        op = delta.read(1)
+        if not op:
+            break
+        if op == b"C":
+            first, count = struct.unpack(">QI", _read_exact(delta, 12))
+            base.seek(first * block_size)
+            remaining = count * block_size
+            while remaining:
+                data = base.read(min(remaining, BLOCK_SIZE))
+                if not data:
+                    raise ValueError("Versão base menor que o esperado pelo delta")
+                write(data)
+                remaining -= len(data)
+        elif op == b"L":
+            size = struct.unpack(">I", _read_exact(delta, 4))[0]
+            write(_read_exact(delta, size))
+        else:
+            raise ValueError("Delta inválido")
+
+
+def _rebuild_delta(steps, write, open_archive, temp_dir):
+    """
+    Reconstrói um arquivo guardado como cópia completa seguida de deltas
+    
+    Args:
+        steps: Lista de (caminho do ZIP, membro), começando pela cópia completa
+        write: Função que recebe o conteúdo final
+        open_archive: Função que retorna o ZipFile aberto de um caminho
+        temp_dir: Pasta das versões intermediárias temporárias
+    """
+    base = tempfile.TemporaryFile(dir=temp_dir)
+    try:
+        backup_path, member = steps[0]
+        with open_archive(backup_path).open(member) as src:
+            shutil.copyfileobj(src, base, BLOCK_SIZE)
+        for i, (backup_path, member) in enumerate(steps[1:], 1):
+            last = i == len(steps) - 1
+            out = None if last else tempfile.TemporaryFile(dir=temp_dir)
+            with open_archive(backup_path).open(member) as delta:
+                _apply_delta(base, delta, write if last else out.write)
+            if out is not None:
+                base.close()
+                base = out
+    finally:
+        base.close()
+
+
+class _DeltaWriter:
+    """
+    Grava no ZIP os arquivos grandes como delta da versão anterior e registra
+    a assinatura de cada arquivo grande gravado (base do próximo delta)
+    """
+    
+    def __init__(self, bases, min_size, block_size=DELTA_BLOCK_SIZE, opener=open):
+        """
+        Args:
+            bases: Dicionário {caminho: (block_size, profundidade, assinatura)}
+                com as versões anteriores que podem servir de base
+            min_size: Tamanho mínimo para registrar assinaturas e gerar deltas
+            block_size: Tamanho dos blocos das novas assinaturas
+            opener: Função que abre os arquivos de origem (ex: IOThrottle.open)
+        """
+        self.bases = bases
+        self.opener = opener
+        self.min_size = min_size
+        self.block_size = block_size
+        self.signatures = {}
+        self.deltas = set()
+        self.saved = 0
+        self.seconds = 0.0
+    
+    def write(self, zipf, rel, file_path, arcname, level=None):
+        """
+        Grava o arquivo como delta, se houver base e o delta valer a pena
+        
+        Returns:
+            Hash do arquivo ou None se ele deve ser gravado completo
+        """
+        base = self.bases.get(rel)
+        if base is None:
+            return None
+        block_size, depth, signature = base
+        start = time.perf_counter()
+        result = _delta_ops(file_path, signature, block_size, opener=self.opener)
+        self.seconds += time.perf_counter() - start
+        if result is None:
+            return None
+        ops, digest, new_signature = result
+        
+        zinfo = zipfile.ZipInfo.from_file(file_path, arcname + DELTA_SUFFIX)
+        zinfo.compress_type = zipfile.ZIP_DEFLATED
+        zinfo._compresslevel = level
+        start = time.perf_counter()
+        with self.opener(file_path, 'rb') as src, zipf.open(zinfo, 'w') as dest:
+            _write_delta(ops, block_size, src, dest)
+        self.seconds += time.perf_counter() - start
+        self.signatures[rel] = (block_size, depth + 1, new_signature)
+        self.deltas.add(rel)
+        self.saved += sum(count for op, _, count in ops if op == "C") * block_size
+        return digest
+    
+    def record(self, rel, file_path):
+        """Registra a assinatura de um arquivo grande gravado completo"""
+        if self.min_size is None:
+            return
+        try:
+            if file_path.stat().st_size < self.min_size:
+                return
+            start = time.perf_counter()
+            self.signatures[rel] = (self.block_size, 0,
+                                    _block_signature(file_path, self.block_size, self.opener))
+            self.seconds += time.perf_counter() - start
+        except FileNotFoundError:
+            # Removido logo depois de gravado: a próxima versão vai completa
+            pass
+
+
+def _chunk_batch(store, items, level):
+    """
+    Grava no repositório de chunks um lote de arquivos (executado nos
+    processos de _create_chunk_backup)
+    
+    Args:
+        store: ChunkStore (copiado para o processo)
+        items: Lista de (caminho, codec)
+        level: Nível de compressão
+    
+    Returns:
+        (lista com o resultado de ChunkStore.store_file de cada arquivo,
+        bytes lidos, segundos de leitura, segundos no restante: divisão em
+        chunks, hash, compressão e gravação)
+    """
+    meter = _ReadMeter()
+    start = time.perf_counter()
+    results = [store.store_file(file_path, codec, level, meter.open) for file_path, codec in items]
+    return results, meter.bytes, meter.seconds, time.perf_counter() - start - meter.seconds
+
+
+def _verify_batch(backup_path, backup_format, chunk_root, items):
+    """
+    Recalcula o hash de um lote de arquivos de um backup (executado no pool)
+    
+    Args:
+        backup_path: Caminho do backup
+        backup_format: "zip", "copy", "chunks" ou "delta" (arquivos
+            reconstruídos a partir de uma cópia completa e deltas)
+        chunk_root: Pasta do repositório de chunks
+        items: Lista de (caminho, membro/arquivo ou passos do delta,
+            hash esperado, chunks)
+    
+    Returns:
+        Lista de (caminho, status, bytes lidos, detalhe), com status
+        "ok", "corrupt" ou "missing"
+    """
+    results = []
+    archives = {}
+    
+    def open_archive(path):
+        if path not in archives:
+            archives[path] = zipfile.ZipFile(path, 'r')
+        return archives[path]
+    
+    zipf = open_archive(backup_path) if backup_format == "zip" else None
+    store = ChunkStore(chunk_root) if backup_format == "chunks" else None
+    try:
+        for rel, location, expected, chunks in items:
+            hash_obj = hashlib.sha256()
+            size = 0
+            
+            def feed(data):
+                nonlocal size
+                hash_obj.update(data)
+                size += len(data)
+            
+            try:
+                if backup_format == "delta":
+                    _rebuild_delta(location, feed, open_archive, Path(location[0][0]).parent)
+                elif store is not None:
+                    for digest in chunks:
+                        data = store.get(digest)
+                        if hashlib.sha256(data).hexdigest() != digest:
+                            raise ValueError(f"chunk {digest[:12]} corrompido")
+                        hash_obj.update(data)
+                        size += len(data)
+                else:
+                    src = zipf.open(location) if zipf is not None else open(location, 'rb')
+                    with src:
+                        for block in iter(lambda: src.read(BLOCK_SIZE), b""):
+                            hash_obj.update(block)
+                            size += len(block)
+            except (KeyError, FileNotFoundError) as e:
+                results.append((rel, "missing", size, str(e)))
+                continue
+            except (zipfile.BadZipFile, zlib.error, ValueError, OSError, EOFError) as e:
+                results.append((rel, "corrupt", size, str(e)))
+                continue
+            
+            if hash_obj.hexdigest() == expected:
+                results.append((rel, "ok", size, ""))
+            else:
+                results.append((rel, "corrupt", size, "hash diferente do registrado"))
+    finally:
+        for archive in archives.values():
+            archive.close()
+    return results
+
+
+class BackupCatalog:
+    """
+    Catálogo de backups em SQLite (modo WAL), com uma linha por backup e
+    uma linha por arquivo de cada backup
+    """
+    
+    # Colunas próprias da tabela backups; os demais campos ficam em "extra"
+    COLUMNS = ("backup_name", "timestamp", "backup_path", "source_path", "size", "type", "parent")
+    
+    def __init__(self, db_path):
+        """
+        Abre (ou cria) o catálogo
+        
+        Args:
+            db_path: Caminho do arquivo SQLite
+        """
+        self.db_path = Path(db_path)
+        self.conn = sqlite3.connect(str(self.db_path), timeout=30)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS backups (
+                id INTEGER PRIMARY KEY,
+                backup_name TEXT UNIQUE NOT NULL,
+                timestamp TEXT NOT NULL,
+                backup_path TEXT NOT NULL,
+                source_path TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                type TEXT,
+                parent TEXT,
+                extra TEXT
+            );
+            CREATE TABLE IF NOT EXISTS files (
+                backup_id INTEGER NOT NULL REFERENCES backups(id) ON DELETE CASCADE,
+                path TEXT NOT NULL,
+                size INTEGER,
+                mtime INTEGER,
+                hash TEXT,
+                status TEXT NOT NULL,
+                chunks TEXT
+            );
+            CREATE TABLE IF NOT EXISTS signatures (
+                backup_id INTEGER NOT NULL REFERENCES backups(id) ON DELETE CASCADE,
+                path TEXT NOT NULL,
+                block_size INTEGER NOT NULL,
+                depth INTEGER NOT NULL,
+                data BLOB NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_backups_source ON backups(source_path, timestamp);
+            CREATE INDEX IF NOT EXISTS idx_backups_timestamp ON backups(timestamp);
+            CREATE INDEX IF NOT EXISTS idx_files_backup ON files(backup_id);
+            CREATE INDEX IF NOT EXISTS idx_files_path ON files(path);
+            CREATE INDEX IF NOT EXISTS idx_signatures_path ON signatures(path);
+        """)
+    
+    def _row_to_info(self, row):
+        """Converte uma linha da tabela backups no dicionário de informações"""
+        info = {key: row[key] for key in self.COLUMNS}
+        if row["extra"]:
+            info.update(json.loads(row["extra"]))
+        return info
+    
+    def add_backup(self, backup_info, manifest):
+        """
+        Registra um backup e seus arquivos em uma única transação
+        
+        Args:
+            backup_info: Dicionário com as informações do backup
+            manifest: Dicionário com "files", "changed" e "deleted" e,
+                opcionalmente, "signatures" {caminho: (block_size, profundidade, dados)}
+        """
+        with self.conn:
+            self._insert_backup(backup_info, manifest)
+    
+    def replace_backup(self, old_name, backup_info, manifest):
+        """
+        Substitui um backup por outro com o mesmo conteúdo (ex: um backup
+        completo sintético): o novo ocupa a posição do antigo na lista e os
+        incrementais que dependiam do antigo passam a depender do novo
+        """
+        with self.conn:
+            (backup_id,) = self.conn.execute(
+                "SELECT id FROM backups WHERE backup_name = ?", (old_name,)).fetchone()
+            self.conn.execute("DELETE FROM backups WHERE id = ?", (backup_id,))
+            self._insert_backup(backup_info, manifest, backup_id)
+            self.conn.execute("UPDATE backups SET parent = ? WHERE parent = ?",
+                              (backup_info["backup_name"], old_name))
+    
+    def _insert_backup(self, backup_info, manifest, backup_id=None):
+        """Insere o backup, seus arquivos e assinaturas (dentro de uma transação)"""
+        extra = {k: v for k, v in backup_info.items() if k not in self.COLUMNS}
+        stored = set(manifest["changed"])
+        rows = [
+            (rel, entry["size"], entry["mtime"], entry["hash"],
+             ("delta" if entry.get("delta") else "stored") if rel in stored else "unchanged",
+             json.dumps(entry["chunks"]) if "chunks" in entry else None)
+            for rel, entry in manifest["files"].items()
+        ]
+        rows.extend((rel, None, None, None, "deleted", None) for rel in manifest["deleted"])
+        
+        cursor = self.conn.execute(
+            "INSERT INTO backups (id, backup_name, timestamp, backup_path, source_path, "
+            "size, type, parent, extra) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [backup_id] + [backup_info.get(key) for key in self.COLUMNS] +
+            [json.dumps(extra, ensure_ascii=False) if extra else None]
+        )
+        backup_id = cursor.lastrowid
+        self.conn.executemany(
+            "INSERT INTO files (backup_id, path, size, mtime, hash, status, chunks) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            ((backup_id,) + row for row in rows)
+        )
+        self.conn.executemany(
+            "INSERT INTO signatures (backup_id, path, block_size, depth, data) "
+            "VALUES (?, ?, ?, ?, ?)",
+            ((backup_id, rel) + tuple(signature)
+             for rel, signature in manifest.get("signatures", {}).items())
+        )
+    
+    def list_backups(self, source_path=None, since=None, until=None):
+        """
+        Lista backups em ordem de criação
+        
+        Args:
+            source_path: Filtra pela origem (opcional)
+            since: Timestamp mínimo no formato AAAAMMDD_HHMMSS (opcional)
+            until: Timestamp máximo no formato AAAAMMDD_HHMMSS (opcional)
+        """
+        conditions = []
+        params = []
+        if source_path is not None:
+            conditions.append("source_path = ?")
+            params.append(str(source_path))
+        if since is not None:
+            conditions.append("timestamp >= ?")
+            params.append(since)
+        if until is not None:
+            conditions.append("timestamp <= ?")
+            params.append(until)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        rows = self.conn.execute(f"SELECT * FROM backups {where} ORDER BY id", params)
+        return [self._row_to_info(row) for row in rows]
+    
+    def has_backup(self, backup_name):
+        """Indica se já existe um backup com esse nome (consulta pelo índice UNIQUE)"""
+        return self.conn.execute("SELECT 1 FROM backups WHERE backup_name = ?",
+                                 (backup_name,)).fetchone() is not None
+    
+    def load_manifest(self, backup_name):
+        """Carrega o manifesto de um backup a partir das linhas de arquivos"""
+        manifest = {"files": {}, "changed": [], "deleted": []}
+        rows = self.conn.execute(
+            "SELECT f.* FROM files f JOIN backups b ON b.id = f.backup_id "
+            "WHERE b.backup_name = ?", (backup_name,))
+        for row in rows:
+            if row["status"] == "deleted":
+                manifest["deleted"].append(row["path"])
+                continue
+            entry = {"size": row["size"], "mtime": row["mtime"], "hash": row["hash"]}
+            if row["chunks"] is not None:
+                entry["chunks"] = json.loads(row["chunks"])
+            if row["status"] == "delta":
+                entry["delta"] = True
+            manifest["files"][row["path"]] = entry
+            if row["status"] in ("stored", "delta"):
+                manifest["changed"].append(row["path"])
+        return manifest
+    
+    def delete_backups(self, backup_names):
+        """Remove backups (e seus arquivos) do catálogo em uma única transação"""
+        with self.conn:
+            self.conn.executemany("DELETE FROM backups WHERE backup_name = ?",
+                                  ((name,) for name in backup_names))
+    
+    def _content_history(self, backup_names):
+        """
+        Backups da lista que gravaram conteúdo de cada arquivo, em ordem
+        
+        Returns:
+            Dicionário {caminho: [(nome do backup, "stored" ou "delta"), ...]}
+        """
+        order = {name: i for i, name in enumerate(backup_names)}
+        placeholders = ", ".join("?" * len(order))
+        rows = self.conn.execute(
+            "SELECT f.path, b.backup_name, f.status FROM files f JOIN backups b ON b.id = f.backup_id "
+            f"WHERE f.status IN ('stored', 'delta') AND b.backup_name IN ({placeholders})",
+            list(order))
+        history = {}
+        for path, backup_name, status in rows:
+            history.setdefault(path, []).append((backup_name, status))
+        for versions in history.values():
+            versions.sort(key=lambda version: order[version[0]])
+        return history
+    
+    def stored_locations(self, backup_names):
+        """
+        Indica em qual backup da lista está o conteúdo mais recente de cada arquivo
+        
+        Args:
+            backup_names: Nomes dos backups, do mais antigo para o mais recente
+        
+        Returns:
+            Dicionário {caminho: nome do backup}
+        """
+        return {path: versions[-1][0]
+                for path, versions in self._content_history(backup_names).items()}
+    
+    def delta_chains(self, backup_names):
+        """
+        Backups necessários para reconstruir os arquivos guardados como delta
+        
+        Args:
+            backup_names: Nomes dos backups, do mais antigo para o mais recente
+        
+        Returns:
+            Dicionário {caminho: [backup com a cópia completa, backups com deltas...]}
+            apenas para arquivos cuja versão mais recente é um delta
+        """
+        chains = {}
+        for path, versions in self._content_history(backup_names).items():
+            if versions[-1][1] != "delta":
+                continue
+            start = max((i for i, (_, status) in enumerate(versions) if status == "stored"),
+                        default=0)
+            chains[path] = [name for name, _ in versions[start:]]
+        return chains
+    
+    def load_signature(self, backup_names, path):
+        """
+        Assinatura mais recente de um arquivo entre os backups da lista
+        
+        Returns:
+            (nome do backup, block_size, profundidade, dados) ou None
+        """
+        order = {name: i for i, name in enumerate(backup_names)}
+        placeholders = ", ".join("?" * len(order))
+        rows = self.conn.execute(
+            "SELECT b.backup_name, s.block_size, s.depth, s.data FROM signatures s "
+            f"JOIN backups b ON b.id = s.backup_id WHERE s.path = ? AND b.backup_name IN ({placeholders})",
+            [path] + list(order))
+        return max((tuple(row) for row in rows), key=lambda row: order[row[0]], default=None)
+    
+    def find_file(self, pattern, source_path=None):
+        """
+        Busca backups que contêm arquivos cujo caminho casa com o padrão
+        
+        Args:
+            pattern: Caminho ou padrão glob (relativo à origem)
+            source_path: Filtra pela origem (opcional)
+        
+        Returns:
+            Lista de dicionários com backup, caminho, tamanho, hash e se o
+            conteúdo está gravado no próprio backup ("stored")
+        """
+        query = ("SELECT b.backup_name, b.timestamp, b.backup_path, f.path, f.size, f.hash, f.status "
+                 "FROM files f JOIN backups b ON b.id = f.backup_id "
+                 "WHERE f.path GLOB ? AND f.status != 'deleted'")
+        params = [pattern]
+        if source_path is not None:
+            query += " AND b.source_path = ?"
+            params.append(str(source_path))
+        rows = self.conn.execute(query + " ORDER BY b.id, f.path", params)
+        return [dict(row) for row in rows]
+    
+    def live_chunks(self):
+        """Conjunto de chunks referenciados por algum backup do catálogo"""
+        live_digests = set()
+        for (chunks,) in self.conn.execute("SELECT chunks FROM files WHERE chunks IS NOT NULL"):
+            live_digests.update(json.loads(chunks))
+        return live_digests
+    
+    def import_json(self, config_file):
+        """
+        Importa um backup_config.json antigo (e os manifestos referenciados)
+        e o renomeia para .imported, para que a importação ocorra uma única vez
+        """
+        config_file = Path(config_file)
+        with open(config_file, 'r', encoding='utf-8') as f:
+            configs = json.load(f)
+        
+        for backup_info in configs:
+            backup_info = dict(backup_info)
+            if not backup_info.get("backup_name"):
+                name = Path(backup_info["backup_path"]).name
+                for suffix in (".chunks.json", ".zip"):
+                    if name.endswith(suffix):
+                        name = name[:-len(suffix)]
+                backup_info["backup_name"] = name
+            
+            manifest = {"files": {}, "changed": [], "deleted": []}
+            manifest_path = backup_info.get("manifest")
+            if manifest_path and Path(manifest_path).exists():
+                with open(manifest_path, 'r', encoding='utf-8') as f:
+                    manifest = json.load(f)
+            self.add_backup(backup_info, manifest)
+        
+        os.replace(config_file, config_file.with_name(config_file.name + ".imported"))
+        print(f"✅ {len(configs)} backup(s) importado(s) de {config_file.name} para o catálogo")
+    
+    def close(self):
+        """Fecha a conexão com o catálogo"""
+        self.conn.close()
+
+
+# Eventos do inotify (linux/inotify.h)
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_ISDIR = 0x40000000
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+              IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR | IN_DONT_FOLLOW)
+INOTIFY_EVENT = struct.Struct("iIII")
+
+
+class InotifyWatcher:
+    """
+    Observa uma árvore de pastas com inotify (via ctypes) e informa os
+    caminhos relativos alterados
+    """
+    
+    def __init__(self, root, rules):
+        """
+        Cria as watches de todas as pastas não excluídas da árvore
+        
+        Args:
+            root: Pasta observada
+            rules: ScanRules (pastas excluídas não são observadas)
+        
+        Raises:
+            OSError: inotify indisponível ou limite de watches atingido
+        """
+        if not INOTIFY_AVAILABLE:
+            raise OSError(errno.ENOSYS, "inotify não disponível neste sistema")
+        self.root = Path(root)
+        self.rules = rules
+        self.fd = _libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 falhou")
+        self.watches = {}
+        self.add_tree("")
+    
+    def _add_watch(self, rel):
+        path = str(self.root / rel) if rel else str(self.root)
+        wd = _libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err in (errno.ENOENT, errno.ENOTDIR):
+                return
+            raise OSError(err, f"inotify_add_watch falhou em {path}: {os.strerror(err)}")
+        self.watches[wd] = rel + "/" if rel else ""
+    
+    def add_tree(self, rel):
+        """Observa uma pasta (relativa à raiz) e todas as subpastas não excluídas"""
+        stack = [rel]
+        while stack:
+            current = stack.pop()
+            self._add_watch(current)
+            try:
+                with os.scandir(self.root / current) as entries:
+                    for entry in entries:
+                        child = f"{current}/{entry.name}" if current else entry.name
+                        if (entry.is_dir(follow_symlinks=False)
+                                and not self.rules.prune_dir(child)):
+                            stack.append(child)
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+    
+    def remove_tree(self, rel):
+        """Remove as watches de uma pasta movida e das subpastas"""
+        prefix = rel + "/"
+        for wd, watched in list(self.watches.items()):
+            if watched.startswith(prefix):
+                _libc.inotify_rm_watch(self.fd, wd)
+                del self.watches[wd]
+    
+    def read(self, timeout):
+        """
+        Espera eventos por até timeout segundos
+        
+        Returns:
+            (conjunto de caminhos relativos alterados, True se a fila do
+            kernel transbordou e eventos foram perdidos)
+        """
+        changed = set()
+        overflow = False
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return changed, overflow
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+                name = os.fsdecode(data[offset + INOTIFY_EVENT.size:
+                                        offset + INOTIFY_EVENT.size + length].rstrip(b"\0"))
+                offset += INOTIFY_EVENT.size + length
+                if mask & IN_Q_OVERFLOW:
+                    overflow = True
+                    continue
+                if mask & IN_IGNORED:
+                    self.watches.pop(wd, None)
+                    continue
+                prefix = self.watches.get(wd)
+                if prefix is None or not name:
+                    continue
+                rel = prefix + name
+                if mask & IN_ISDIR:
+                    if self.rules.prune_dir(rel):
+                        continue
+                    if mask & (IN_CREATE | IN_MOVED_TO):
+                        self.add_tree(rel)
+                    elif mask & IN_MOVED_FROM:
+                        self.remove_tree(rel)
+                elif not self.rules.accept_name(rel):
+                    continue
+                changed.add(rel)
+        return changed, overflow
+    
+    def close(self):
+        """Fecha o descritor do inotify (e todas as watches)"""
+        os.close(self.fd)
+
+
+class ChangeJournal:
+    """
+    Diário durável dos caminhos alterados ainda não gravados em backup: cada
+    lote é gravado com fsync, então nada se perde se o processo cair
+    """
+    
+    def __init__(self, path):
+        self.path = Path(path)
+    
+    def load(self):
+        """Caminhos registrados (de execuções anteriores que não chegaram ao backup)"""
+        if not self.path.exists():
+            return set()
+        paths = set()
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    paths.add(json.loads(line))
+                except ValueError:
+                    # Última linha incompleta de uma gravação interrompida
+                    continue
+        return paths
+    
+    def append(self, paths):
+        """Acrescenta caminhos ao diário e força a gravação em disco"""
+        if not paths:
+            return
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.writelines(json.dumps(rel, ensure_ascii=False) + "\n" for rel in paths)
+            f.flush()
+            os.fsync(f.fileno())
+    
+    def clear(self):
+        """Esvazia o diário depois que as alterações foram gravadas em backup"""
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.flush()
+            os.fsync(f.fileno())
+
+
+# Nome de cada tipo de compressão do ZIP nas métricas
+ZIP_CODEC_NAMES = {
+    zipfile.ZIP_STORED: "store",
+    zipfile.ZIP_DEFLATED: "deflate",
+    zipfile.ZIP_BZIP2: "bzip2",
+    zipfile.ZIP_LZMA: "lzma",
+}
+
+
+class BackupMetrics:
+    """
+    Métricas de uma execução de backup: contadores de arquivos e bytes,
+    tempo de cada fase e taxa de compressão por codec
+    """
+    
+    # Contadores e sua descrição (HELP no formato do Prometheus)
+    COUNTERS = {
+        "files_scanned": "Arquivos encontrados na origem",
+        "bytes_scanned": "Bytes dos arquivos encontrados na origem",
+        "files_skipped": "Arquivos ignorados pelas regras de exclusão ou ilegíveis",
+        "bytes_skipped": "Bytes dos arquivos ignorados pelas regras de exclusão",
+        "dirs_pruned": "Pastas ignoradas pelas regras de exclusão",
+        "files_unchanged": "Arquivos inalterados desde o backup anterior",
+        "files_deleted": "Arquivos removidos desde o backup anterior",
+        "files_archived": "Arquivos gravados no backup",
+        "bytes_read": "Bytes lidos da origem (inclusive releituras, como as dos deltas)",
+        "bytes_written": "Bytes gravados no destino",
+    }
+    
+    def __init__(self, source_path, backup_format):
+        self.source_path = str(source_path)
+        self.backup_format = backup_format
+        self.timestamp = time.time()
+        self.counters = dict.fromkeys(self.COUNTERS, 0)
+        self.phases = {}
+        self.codecs = {}
+        self._lock = threading.Lock()
+    
+    @contextmanager
+    def phase(self, name):
+        """Mede o tempo de um bloco e o soma à fase indicada"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+    
+    def add_time(self, name, seconds):
+        with self._lock:
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+    
+    def add(self, counter, value=1):
+        with self._lock:
+            self.counters[counter] += value
+    
+    def add_codec(self, codec, bytes_in, bytes_out, files=1):
+        """Soma os bytes antes e depois da compressão de um codec"""
+        with self._lock:
+            stats = self.codecs.setdefault(codec, {"files": 0, "bytes_in": 0, "bytes_out": 0})
+            stats["files"] += files
+            stats["bytes_in"] += bytes_in
+            stats["bytes_out"] += bytes_out
+    
+    def add_zip_codecs(self, members):
+        """Soma os tamanhos dos membros (ZipInfo) de um ZIP gravado, por codec"""
+        for info in members:
+            codec = ("delta" if info.filename.endswith(DELTA_SUFFIX)
+                     else ZIP_CODEC_NAMES.get(info.compress_type, str(info.compress_type)))
+            self.add_codec(codec, info.file_size, info.compress_size)
+    
+    def to_dict(self):
+        """Métricas em um dicionário serializável em JSON"""
+        archive = self.phases.get("archive", 0.0)
+        codecs = {
+            codec: dict(stats, ratio=round(stats["bytes_out"] / stats["bytes_in"], 4)
+                        if stats["bytes_in"] else 1.0)
+            for codec, stats in self.codecs.items()
+        }
+        return {
+            "timestamp": datetime.fromtimestamp(self.timestamp).isoformat(timespec="seconds"),
+            "source_path": self.source_path,
+            "format": self.backup_format,
+            **self.counters,
+            "phases": {name: round(seconds, 4) for name, seconds in self.phases.items()},
+            "codecs": codecs,
+            "read_mb_per_s": round(self.counters["bytes_read"] / (1024 * 1024) / archive, 2)
+            if archive else 0.0,
+            "write_mb_per_s": round(self.counters["bytes_written"] / (1024 * 1024) / archive, 2)
+            if archive else 0.0,
+        }
+    
+    def write_jsonl(self, path):
+        """Acrescenta as métricas como uma linha JSON"""
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(self.to_dict(), ensure_ascii=False) + "\n")
+    
+    def write_prometheus(self, path):
+        """
+        Grava as métricas no formato texto do Prometheus (para o textfile
+        collector do node_exporter), substituindo o arquivo atomicamente
+        """
+        data = self.to_dict()
+        source = self.source_path.replace("\\", "\\\\").replace('"', '\\"')
+        labels = f'source="{source}"'
+        lines = []
+        
+        def metric(name, help_text, samples):
+            lines.append(f"# HELP backup_{name} {help_text}")
+            lines.append(f"# TYPE backup_{name} gauge")
+            for extra, value in samples:
+                lines.append(f"backup_{name}{{{labels}{extra}}} {value}")
+        
+        for counter, help_text in self.COUNTERS.items():
+            metric(counter, help_text, [("", data[counter])])
+        metric("phase_seconds", "Segundos gastos em cada fase",
+               [(f',phase="{name}"', seconds) for name, seconds in data["phases"].items()])
+        metric("codec_bytes_in", "Bytes antes da compressão, por codec",
+               [(f',codec="{c}"', s["bytes_in"]) for c, s in data["codecs"].items()])
+        metric("codec_bytes_out", "Bytes depois da compressão, por codec",
+               [(f',codec="{c}"', s["bytes_out"]) for c, s in data["codecs"].items()])
+        metric("read_mb_per_second", "Vazão de leitura da fase de gravação",
+               [("", data["read_mb_per_s"])])
+        metric("write_mb_per_second", "Vazão de escrita da fase de gravação",
+               [("", data["write_mb_per_s"])])
+        metric("last_run_timestamp_seconds", "Horário Unix da última execução",
+               [("", round(self.timestamp, 3))])
+        
+        path = Path(path)
+        temp = path.with_name(path.name + ".tmp")
+        temp.write_text("\n".join(lines) + "\n", encoding='utf-8')
+        os.replace(temp, path)
+
 
 class BackupSystem:
-    def __init__(self, source_path, backup_dir="backups"):
+    def __init__(self, source_path, backup_dir="backups", backend="files",
+                 codec="deflate", level=None, delta_min_size=DELTA_MIN_SIZE, max_delta_chain=8,
+                 rules=None, prometheus_file=None, throttle=None):
         """
         Inicializa o sistema de backup
         
         Args:
             source_path: Caminho da pasta/arquivo a fazer backup
             backup_dir: Diretório onde os backups serão salvos
+            backend: "files" (ZIP ou cópia) ou "chunks" (repositório deduplicado)
+            codec: Codec de compressão (ver CodecPolicy); zstd e lz4 valem
+                apenas para o backend "chunks" (ValueError no backend "files")
+            level: Nível de compressão do codec
+            delta_min_size: Arquivos a partir deste tamanho são gravados nos
+                backups incrementais em ZIP como delta binário da versão
+                anterior (None desativa os deltas)
+            max_delta_chain: Quantidade máxima de deltas seguidos de um
+                arquivo antes de gravar novamente uma cópia completa
+            rules: ScanRules com as exclusões e limites da varredura (padrão:
+                regras do arquivo .backupignore na raiz da origem, se existir)
+            prometheus_file: Arquivo .prom atualizado com as métricas de cada
+                execução (as métricas sempre vão para backup_metrics.jsonl)
+            throttle: IOThrottle que limita a vazão, as aberturas de arquivos e
+                a prioridade de I/O dos backups (None = sem limites)
         """
+        if backend not in ("files", "chunks"):
+            raise ValueError(f"Backend inválido: {backend}")
+        if backend == "files" and codec in CHUNK_CODEC_TAGS and codec not in ZIP_COMPRESSION:
+            raise ValueError(f"O codec {codec} vale apenas para o backend \"chunks\": "
+                             f"o zipfile não lê esse formato")
         self.source_path = Path(source_path)
         self.backup_dir = Path(backup_dir)
         self.backup_dir.mkdir(exist_ok=True)
         self.config_file = self.backup_dir / "backup_config.json"
+        self.catalog = BackupCatalog(self.backup_dir / "backup_catalog.db")
+        if self.config_file.exists():
+            self.catalog.import_json(self.config_file)
+        self.backend = backend
+        if backend == "chunks" and not NUMPY_AVAILABLE:
+            print("⚠️  numpy não instalado: a divisão em chunks fica bem mais lenta. "
+                  "Instale com: pip install numpy")
+        self.codec_policy = CodecPolicy(codec, level)
+        self.delta_min_size = delta_min_size
+        self.max_delta_chain = max_delta_chain
+        self.rules = rules or ScanRules.from_ignore_file(self.source_path / IGNORE_FILE)
+        self.metrics_file = self.backup_dir / "backup_metrics.jsonl"
+        self.prometheus_file = prometheus_file
+        self.throttle = throttle
+        self.metrics = None
+        self._meter = None
+        self._chunk_store = None
+    
+    @property
+    def _opener(self):
+        """Função que abre os arquivos lidos e gravados pelos backups"""
+        if self._meter is not None:
+            return self._meter.open
+        return self.throttle.open if self.throttle is not None else open
+    
+    @property
+    def chunk_store(self):
+        """Repositório de chunks compartilhado pelos backups desta pasta"""
+        if self._chunk_store is None:
+            self._chunk_store = ChunkStore(self.backup_dir / "chunks")
+        return self._chunk_store
         
-    def create_backup(self, compress=True):
+    def create_backup(self, compress=True, incremental=False, workers=None, snapshot=False,
+                      changed_paths=None, stream=None):
         """
         Cria um backup do arquivo/pasta especificado
         
         Args:
-            compress: Se True, comprime o backup em ZIP
+            compress: Se True, comprime o backup em ZIP (backend "files")
+            incremental: Se True, salva apenas arquivos novos ou alterados
+                desde o último backup desta origem
+            workers: Número de processos para comprimir o ZIP em paralelo
+                (None ou 1 = compressão sequencial) ou de threads de cópia
+                nos backups sem compressão (padrão 4)
+            snapshot: Com compress=False, cria uma árvore completa em que os
+                arquivos inalterados são hardlinks para o snapshot anterior
+            changed_paths: Caminhos relativos (arquivos ou pastas) que podem
+                ter mudado desde o último backup; apenas eles são examinados,
+                sem varrer a origem inteira (usado pelo modo contínuo)
+            stream: Arquivo binário (ex: sys.stdout.buffer ou o stdin de um
+                subprocesso) que recebe o ZIP em vez de backup_dir; pode não
+                ser posicionável, como um pipe. O backup fica no catálogo com
+                o nome do ZIP em backup_dir, onde deve ser salvo para poder
+                ser restaurado
+        
+        No backend "chunks" cada backup é um índice completo de referências a
+        chunks, e arquivos inalterados sempre reaproveitam os chunks anteriores.
+        Nos incrementais em ZIP, arquivos grandes alterados são gravados como
+        delta binário da versão anterior (ver delta_min_size).
+        
+        As métricas da execução ficam em self.metrics (BackupMetrics).
         """
         if not self.source_path.exists():
             raise FileNotFoundError(f"Arquivo/pasta não encontrado: {self.source_path}")
+        if snapshot and (compress or self.backend != "files"):
+            raise ValueError("O modo snapshot exige compress=False e o backend \"files\"")
+        if snapshot and incremental:
+            raise ValueError("Snapshots já são completos: use snapshot ou incremental")
+        if stream is not None and (not compress or snapshot or self.backend != "files"):
+            raise ValueError("O modo stream exige compress=True e o backend \"files\"")
         
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup_name = f"backup_{self.source_path.name}_{timestamp}"
+        args = (compress, incremental, workers, snapshot, changed_paths, stream)
+        # Conta os bytes realmente lidos da origem (inclusive releituras)
+        self._meter = _ReadMeter(self._opener)
+        try:
+            if self.throttle is None:
+                return self._create_backup(*args)
+            with self.throttle.idle_io():
+                return self._create_backup(*args)
+        finally:
+            self._meter = None
+    
+    def _create_backup(self, compress, incremental, workers, snapshot, changed_paths, stream):
+        """Executa create_backup (com os argumentos já validados)"""
+        backup_format = self._format_for(compress)
+        metrics = self.metrics = BackupMetrics(self.source_path,
+                                               "snapshot" if snapshot else backup_format)
+        run_start = time.perf_counter()
+        if self.throttle is not None:
+            self.throttle.reset_stats()
+        reuse_previous = incremental or snapshot or backup_format == "chunks"
+        previous = self._load_last_manifest(backup_format, snapshot) if reuse_previous else None
+        if incremental and previous is None:
+            print("ℹ️  Nenhum backup anterior com manifesto. Criando backup completo.")
         
-        if compress:
-            backup_path = self.backup_dir / f"{backup_name}.zip"
-            self._create_zip_backup(backup_path)
-        else:
-            backup_path = self.backup_dir / backup_name
-            if self.source_path.is_file():
-                shutil.copy2(self.source_path, backup_path)
+        previous_info, previous_manifest = previous or (None, {"files": {}})
+        previous_files = previous_manifest["files"]
+        
+        # Compara tamanho e data de modificação com o manifesto anterior
+        with metrics.phase("scan"):
+            if changed_paths is not None and previous is not None:
+                files = self._scan_changes(previous_files, changed_paths)
             else:
-                shutil.copytree(self.source_path, backup_path)
+                files = self._scan_source()
+            changed = []
+            for rel, entry in files.items():
+                old_entry = previous_files.get(rel)
+                if (old_entry and old_entry["size"] == entry["size"]
+                        and old_entry["mtime"] == entry["mtime"]):
+                    entry["hash"] = old_entry["hash"]
+                    if "chunks" in old_entry:
+                        entry["chunks"] = old_entry["chunks"]
+                else:
+                    changed.append(rel)
+            deleted = sorted(set(previous_files) - set(files))
+        metrics.add("files_scanned", len(files))
+        metrics.add("bytes_scanned", sum(entry["size"] for entry in files.values()))
+        metrics.add("files_unchanged", len(files) - len(changed))
+        metrics.add("files_deleted", len(deleted))
+        metrics.add("files_archived", len(changed))
         
-        self._save_backup_info(backup_path, timestamp)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        backup_name = self._unique_backup_name(f"backup_{self.source_path.name}_{timestamp}")
+        extra_manifest = {}
+        
+        backup_path = None
+        try:
+            with metrics.phase("archive"):
+                if backup_format == "chunks":
+                    backup_path = self.backup_dir / f"{backup_name}.chunks.json"
+                    hashes = self._create_chunk_backup(files, changed, workers)
+                elif snapshot:
+                    backup_path = self.backup_dir / backup_name
+                    previous_path = Path(previous_info["backup_path"]) if previous_info else None
+                    hashes = self._create_snapshot_backup(
+                        backup_path, files, changed, previous_path, workers)
+                elif compress:
+                    backup_path = self.backup_dir / f"{backup_name}.zip"
+                    delta_writer = self._delta_writer(
+                        previous_info if incremental else None, files, changed)
+                    output = _StreamOutput(stream, self.throttle) if stream is not None else None
+                    hashes = self._create_zip_backup(backup_path, changed, workers, delta_writer,
+                                                     output)
+                    vanished = [rel for rel in changed if rel not in hashes]
+                    if vanished:
+                        print(f"👻 {len(vanished)} arquivo(s) removido(s) da origem durante o backup")
+                        for rel in vanished:
+                            del files[rel]
+                        changed = [rel for rel in changed if rel in hashes]
+                        deleted = sorted(set(deleted).union(rel for rel in vanished
+                                                            if rel in previous_files))
+                    for rel in delta_writer.deltas:
+                        files[rel]["delta"] = True
+                    extra_manifest["signatures"] = delta_writer.signatures
+                    if delta_writer.seconds:
+                        metrics.add_time("delta", delta_writer.seconds)
+                    if delta_writer.deltas:
+                        print(f"🧬 {len(delta_writer.deltas)} arquivo(s) gravado(s) como delta, "
+                              f"{delta_writer.saved / (1024 * 1024):.2f} MB reaproveitados da versão anterior")
+                else:
+                    backup_path = self.backup_dir / backup_name
+                    known = self._known_hashes(files, changed) if previous_info is None else None
+                    hashes = self._create_copy_backup(backup_path, changed, workers, known)
+            metrics.add("bytes_read", self._meter.bytes)
+            if self._meter.bytes:
+                metrics.add_time("read", self._meter.seconds)
+            if stream is not None:
+                metrics.add("bytes_written", output.written)
+            elif backup_format == "zip":
+                metrics.add("bytes_written", backup_path.stat().st_size)
+            
+            for rel, digest in hashes.items():
+                files[rel]["hash"] = digest
+            
+            manifest = {"files": files, "changed": sorted(changed), "deleted": deleted}
+            manifest.update(extra_manifest)
+            extra = {}
+            if backup_format == "chunks":
+                # O índice de chunks já é o manifesto completo: não depende de outro backup
+                self._write_json(backup_path, manifest)
+                parent_info = None
+            elif snapshot:
+                # Snapshots são árvores completas: também não dependem do anterior
+                parent_info = None
+                extra["snapshot"] = True
+            else:
+                parent_info = previous_info
+            if stream is not None:
+                extra.update(stream=True, size=output.written)
+            
+            with metrics.phase("catalog"):
+                self._save_backup_info(
+                    backup_path, timestamp, manifest,
+                    backup_name=backup_name,
+                    type="incremental" if parent_info else "full",
+                    parent=parent_info["backup_name"] if parent_info else None,
+                    **extra
+                )
+        except BaseException:
+            # Não deixa no destino um backup pela metade fora do catálogo
+            if stream is None and backup_path is not None:
+                self._discard_partial(backup_path)
+            raise
+        metrics.add_time("total", time.perf_counter() - run_start)
+        if self.throttle is not None:
+            metrics.add_time("throttled", self.throttle.stats["waited"])
+            print(f"🐢 Limitação de I/O: {self.throttle.report()}")
+        self._emit_metrics(metrics)
+        if previous_info:
+            print(f"📝 {len(changed)} arquivo(s) alterado(s), {len(deleted)} removido(s)")
         print(f"✅ Backup criado com sucesso: {backup_path}")
         return backup_path
     
-    def _create_zip_backup(self, zip_path):
-        """Cria um backup comprimido em ZIP"""
-        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            if self.source_path.is_file():
-                zipf.write(self.source_path, self.source_path.name)
-            else:
-                for root, dirs, files in os.walk(self.source_path):
-                    for file in files:
-                        file_path = Path(root) / file
-                        arcname = file_path.relative_to(self.source_path.parent)
-                        zipf.write(file_path, arcname)
-    
-    def _save_backup_info(self, backup_path, timestamp):
-        """Salva informações do backup em JSON"""
+    def _emit_metrics(self, metrics):
+        """Grava as métricas da execução (JSON lines e Prometheus) e mostra o resumo"""
+        metrics.write_jsonl(self.metrics_file)
+        if self.prometheus_file:
+            metrics.write_prometheus(self.prometheus_file)
+        data = metrics.to_dict()
+        phases = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in data["phases"].items()
+                           if name != "total")
+        print(f"📈 {phases} | leitura {data['read_mb_per_s']} MB/s, "
+              f"escrita {data['write_mb_per_s']} MB/s")
+    
+    def _scan_source(self):
+        """
+        Retorna tamanho e data de modificação de cada arquivo da origem
+        
+        Percorre a árvore com os.scandir aplicando self.rules: pastas
+        excluídas são descartadas antes de descer nelas (sem nenhum stat do
+        seu conteúdo). Arquivos excluídos têm um stat só para somar o
+        tamanho em bytes_skipped.
+        """
+        if self.source_path.is_file():
+            stat = self.source_path.stat()
+            return {self.source_path.name: {"size": stat.st_size, "mtime": stat.st_mtime_ns,
+                                             "hash": None}}
+        
+        files = {}
+        skipped, pruned, unreadable, skipped_bytes = self._scan_tree(str(self.source_path), "", files)
+        if self.metrics is not None:
+            self.metrics.add("files_skipped", skipped + unreadable)
+            self.metrics.add("bytes_skipped", skipped_bytes)
+            self.metrics.add("dirs_pruned", pruned)
+        if skipped or pruned:
+            print(f"🚫 {skipped} arquivo(s) e {pruned} pasta(s) ignorado(s) pelas regras de exclusão")
+        if unreadable:
+            print(f"⚠️  {unreadable} arquivo(s)/pasta(s) ilegível(is) ficaram fora do backup")
+        return files
+    
+    def _scan_tree(self, root, prefix, files):
+        """
+        Acrescenta a files os arquivos de uma pasta e subpastas
+        
+        Pastas e arquivos ilegíveis (sem permissão ou removidos durante a
+        varredura) são pulados com um aviso, como no os.walk.
+        
+        Returns:
+            (arquivos ignorados, pastas ignoradas, entradas ilegíveis, bytes
+            dos arquivos ignorados)
+        """
+        skipped = pruned = unreadable = skipped_bytes = 0
+        stack = [(root, prefix)]
+        while stack:
+            path, prefix = stack.pop()
+            try:
+                with os.scandir(path) as entries:
+                    for entry in entries:
+                        rel = prefix + entry.name
+                        try:
+                            if entry.is_dir():
+                                # Links para pastas não são seguidos (como no os.walk)
+                                if entry.is_symlink():
+                                    continue
+                                if self.rules.prune_dir(rel):
+                                    pruned += 1
+                                else:
+                                    stack.append((entry.path, rel + "/"))
+                                continue
+                            stat = entry.stat()
+                            if not self.rules.accept_name(rel):
+                                skipped += 1
+                                skipped_bytes += stat.st_size
+                                continue
+                        except OSError as e:
+                            unreadable += 1
+                            print(f"⚠️  Ignorado (ilegível): {rel} ({e.strerror or e})")
+                            continue
+                        if self.rules.needs_stat and not self.rules.accept_stat(stat):
+                            skipped += 1
+                            skipped_bytes += stat.st_size
+                            continue
+                        files[rel] = {"size": stat.st_size, "mtime": stat.st_mtime_ns, "hash": None}
+            except OSError as e:
+                unreadable += 1
+                print(f"⚠️  Pasta ignorada (ilegível): {prefix or path} ({e.strerror or e})")
+        return skipped, pruned, unreadable, skipped_bytes
+    
+    def _scan_changes(self, previous_files, changed_paths):
+        """
+        Monta o manifesto atual a partir do anterior examinando apenas os
+        caminhos alterados (pastas alteradas são varridas por inteiro)
+        """
+        files = {rel: {"size": entry["size"], "mtime": entry["mtime"], "hash": None}
+                 for rel, entry in previous_files.items()}
+        # Chaves ordenadas: o conteúdo anterior de uma pasta é uma faixa contígua
+        keys = sorted(files)
+        for rel in changed_paths:
+            prefix = rel + "/"
+            files.pop(rel, None)
+            i = bisect.bisect_left(keys, prefix)
+            while i < len(keys) and keys[i].startswith(prefix):
+                files.pop(keys[i], None)
+                i += 1
+            path = self.source_path / rel
+            try:
+                if path.is_dir() and not path.is_symlink():
+                    if not self.rules.prune_dir(rel):
+                        skipped, _, unreadable, skipped_bytes = self._scan_tree(str(path), prefix, files)
+                        if self.metrics is not None:
+                            self.metrics.add("files_skipped", skipped + unreadable)
+                            self.metrics.add("bytes_skipped", skipped_bytes)
+                    continue
+                stat = path.stat()
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+            if self.rules.accept_name(rel) and (not self.rules.needs_stat
+                                                or self.rules.accept_stat(stat)):
+                files[rel] = {"size": stat.st_size, "mtime": stat.st_mtime_ns, "hash": None}
+        return files
+    
+    def _relative_name(self, file_path):
+        """Caminho do arquivo relativo à origem, usado como chave do manifesto"""
+        if self.source_path.is_file():
+            return self.source_path.name
+        return file_path.relative_to(self.source_path).as_posix()
+    
+    def _source_file(self, rel):
+        """Caminho na origem de uma chave do manifesto"""
+        if self.source_path.is_file():
+            return self.source_path
+        return self.source_path / rel
+    
+    def _arcname(self, rel):
+        """Nome do membro no ZIP (inclui o nome da pasta de origem)"""
+        if self.source_path.is_file():
+            return rel
+        return f"{self.source_path.name}/{rel}"
+    
+    def _unique_backup_name(self, backup_name):
+        """Evita colisão de nomes entre backups criados no mesmo segundo"""
+        candidate = backup_name
+        counter = 1
+        # Backups enviados por stream estão só no catálogo
+        while self.catalog.has_backup(candidate) or any((self.backup_dir / f"{candidate}{suffix}").exists()
+                                        for suffix in ("", ".zip", ".chunks.json")):
+            candidate = f"{backup_name}_{counter}"
+            counter += 1
+        return candidate
+    
+    def _create_zip_backup(self, zip_path, files, workers=None, delta_writer=None, output=None):
+        """
+        Cria um backup comprimido em ZIP
+        
+        Args:
+            zip_path: Caminho do arquivo ZIP
+            files: Chaves do manifesto a incluir no backup
+            workers: Processos de compressão (None ou 1 = sequencial)
+            delta_writer: _DeltaWriter que grava arquivos grandes como delta
+            output: _StreamOutput que recebe o ZIP no lugar de zip_path
+        
+        Arquivos removidos depois da varredura ficam de fora do ZIP e do
+        dicionário retornado.
+        
+        Returns:
+            Dicionário com o hash do conteúdo de cada arquivo gravado
+        """
+        if delta_writer is None:
+            delta_writer = _DeltaWriter({}, None, opener=self._opener)
+        if workers and workers > 1:
+            return self._create_zip_backup_parallel(zip_path, files, workers, delta_writer, output)
+        
+        # No stream o cabeçalho local não pode ser corrigido depois: ZIP64
+        # sempre, para arquivos que passem de 4 GB enquanto são lidos
+        force_zip64 = output is not None
+        hashes = {}
+        with output or self._opener(zip_path, 'w+b') as out, \
+                zipfile.ZipFile(out, 'w', zipfile.ZIP_DEFLATED) as zipf:
+            for rel in files:
+                file_path = self._source_file(rel)
+                try:
+                    compress_type, level = self.codec_policy.zip_compression(file_path)
+                    digest = delta_writer.write(zipf, rel, file_path, self._arcname(rel), level)
+                    if digest is None:
+                        digest = _write_zip_member(
+                            zipf, file_path, self._arcname(rel), compress_type, level,
+                            self.metrics, self._opener, force_zip64)
+                        delta_writer.record(rel, file_path)
+                except FileNotFoundError:
+                    # Removido depois da varredura: a falha vem antes de o
+                    # membro começar a ser gravado
+                    continue
+                hashes[rel] = digest
+            self.metrics.add_zip_codecs(zipf.infolist())
+        return hashes
+    
+    def _create_zip_backup_parallel(self, zip_path, files, workers, delta_writer, output=None):
+        """Cria o ZIP comprimindo arquivos (ou blocos de arquivos grandes) em paralelo"""
+        hashes = {}
+        with output or self._opener(zip_path, 'w+b') as out, \
+                zipfile.ZipFile(out, 'w', zipfile.ZIP_DEFLATED) as zipf, \
+                ProcessPoolExecutor(max_workers=workers) as pool:
+            writer = _ParallelZipWriter(zipf, pool, workers, self._opener,
+                                        force_zip64=output is not None)
+            for rel in files:
+                file_path = self._source_file(rel)
+                try:
+                    compress_type, level = self.codec_policy.zip_compression(file_path)
+                    if rel in delta_writer.bases:
+                        # O delta é gravado direto no ZIP: os blocos pendentes vão antes
+                        writer.flush()
+                        digest = delta_writer.write(zipf, rel, file_path, self._arcname(rel), level)
+                        if digest is not None:
+                            hashes[rel] = digest
+                            continue
+                    hashes[rel] = writer.add_file(file_path, self._arcname(rel), compress_type, level)
+                except FileNotFoundError:
+                    continue
+                delta_writer.record(rel, file_path)
+            writer.flush()
+            self.metrics.add_time("compress", writer.seconds)
+            self.metrics.add_zip_codecs(zipf.infolist())
+        return hashes
+    
+    def _delta_writer(self, previous_info, files, changed):
+        """
+        Prepara o _DeltaWriter de um backup em ZIP com as assinaturas das
+        versões anteriores dos arquivos grandes alterados
+        
+        Args:
+            previous_info: Backup do qual o novo é incremental (ou None)
+            files: Manifesto atual
+            changed: Chaves dos arquivos que serão gravados
+        """
+        bases = {}
+        if previous_info is not None and self.delta_min_size is not None:
+            chain = self._backup_chain(self._load_configs(), previous_info) or []
+            names = [link["backup_name"] for link in chain]
+            locations = self.catalog.stored_locations(names) if names else {}
+            for rel in changed:
+                if files[rel]["size"] < self.delta_min_size or rel not in locations:
+                    continue
+                signature = self.catalog.load_signature(names, rel)
+                # A assinatura só vale se for da versão mais recente gravada
+                if (signature and signature[0] == locations[rel]
+                        and signature[2] < self.max_delta_chain):
+                    bases[rel] = signature[1:]
+        return _DeltaWriter(bases, self.delta_min_size, opener=self._opener)
+    
+    def _create_chunk_backup(self, files, changed, workers=None):
+        """
+        Grava os arquivos alterados no repositório de chunks
+        
+        Args:
+            files: Manifesto atual (recebe a lista de chunks de cada arquivo)
+            changed: Chaves dos arquivos a ler da origem
+            workers: Processos que dividem e gravam arquivos em paralelo
+                (None ou 1 = sequencial; com throttle a leitura fica no
+                processo principal e a gravação é sequencial)
+        
+        Returns:
+            Dicionário com o hash do conteúdo de cada arquivo lido
+        """
+        store = self.chunk_store
+        level = self.codec_policy.level
+        items = []
+        for rel in changed:
+            file_path = self._source_file(rel)
+            items.append((file_path, self.codec_policy.choose(file_path)))
+        if workers and workers > 1 and self.throttle is None and len(items) > 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                batch_size = max(1, -(-len(items) // (workers * 4)))
+                futures = [pool.submit(_chunk_batch, store, items[i:i + batch_size], level)
+                           for i in range(0, len(items), batch_size)]
+                results = []
+                for future in futures:
+                    batch, bytes_read, read_time, chunk_time = future.result()
+                    results.extend(batch)
+                    # Somados entre os processos
+                    if self.metrics is not None:
+                        self.metrics.add("bytes_read", bytes_read)
+                        self.metrics.add_time("read", read_time)
+                        self.metrics.add_time("chunk", chunk_time)
+        else:
+            # As leituras são medidas pelo opener de create_backup
+            start = time.perf_counter()
+            read_before = self._meter.seconds if self._meter is not None else 0.0
+            results = [store.store_file(file_path, codec, level, self._opener) for file_path, codec in items]
+            if self.metrics is not None:
+                read_time = (self._meter.seconds if self._meter is not None else 0.0) - read_before
+                self.metrics.add_time("chunk", time.perf_counter() - start - read_time)
+        
+        hashes = {}
+        new_chunks = 0
+        written = 0
+        for rel, (file_path, codec), (digest, chunks, file_new, file_written) in zip(changed, items, results):
+            new_chunks += file_new
+            written += file_written
+            if self.throttle is not None:
+                self.throttle.write(file_written)
+            if self.metrics is not None:
+                # Inclui a deduplicação: chunks já existentes não são gravados
+                self.metrics.add_codec(codec, files[rel]["size"], file_written)
+            files[rel]["chunks"] = chunks
+            hashes[rel] = digest
+        if self.metrics is not None:
+            self.metrics.add("bytes_written", written)
+        print(f"🧩 {new_chunks} chunk(s) novo(s), {written / (1024 * 1024):.2f} MB gravados")
+        return hashes
+    
+    def _create_copy_backup(self, backup_path, files, workers=None, known_hashes=None):
+        """
+        Cria um backup sem compressão copiando os arquivos indicados
+        
+        known_hashes ({chave: hash}, de _known_hashes) evita ler de novo os
+        arquivos que não mudaram desde o backup anterior.
+        """
+        if self.source_path.is_dir():
+            backup_path.mkdir(exist_ok=True)
+        engine = CopyEngine(workers or 4, self.throttle)
+        pairs = [(self._source_file(rel), self._copy_destination(backup_path, rel)) for rel in files]
+        known = {self._source_file(rel): digest for rel, digest in (known_hashes or {}).items()}
+        digests = engine.copy_many(pairs, hash_files=True, known_hashes=known)
+        if self.metrics is not None:
+            # Copiados pelo kernel: lidos da origem sem passar pelo opener
+            self.metrics.add("bytes_read", engine.stats["bytes"])
+            self.metrics.add_time("copy", engine.stats["seconds"])
+            self.metrics.add("bytes_written", engine.stats["bytes"])
+            self.metrics.add_codec("copy", engine.stats["bytes"], engine.stats["bytes"],
+                                   engine.stats["files"])
+        if files:
+            print(f"⚡ Cópia: {engine.report()}")
+        return dict(zip(files, digests))
+    
+    def _known_hashes(self, files, changed):
+        """
+        Hashes do último backup em cópia para os arquivos de um backup
+        completo que não mudaram desde ele (mesmo tamanho e data, o critério
+        dos incrementais): com reflink, a cópia deles fica instantânea
+        """
+        previous = self._load_last_manifest("copy")
+        if previous is None:
+            return {}
+        previous_files = previous[1]["files"]
+        known = {}
+        for rel in changed:
+            old_entry = previous_files.get(rel)
+            if (old_entry and old_entry.get("hash") and old_entry["size"] == files[rel]["size"]
+                    and old_entry["mtime"] == files[rel]["mtime"]):
+                known[rel] = old_entry["hash"]
+        return known
+    
+    def _create_snapshot_backup(self, backup_path, files, changed, previous_path, workers=None):
+        """
+        Cria um snapshot completo: arquivos alterados são copiados e os
+        inalterados viram hardlinks para o snapshot anterior (como rsync --link-dest)
+        
+        Returns:
+            Dicionário com o hash do conteúdo de cada arquivo copiado
+        """
+        changed_set = set(changed)
+        to_copy = list(changed)
+        linked = 0
+        if self.source_path.is_dir():
+            backup_path.mkdir()
+        for rel in files:
+            if rel in changed_set:
+                continue
+            dest = self._copy_destination(backup_path, rel)
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            try:
+                os.link(self._copy_destination(previous_path, rel), dest)
+                linked += 1
+            except OSError:
+                # Outro sistema de arquivos ou arquivo ausente no snapshot anterior
+                to_copy.append(rel)
+        
+        hashes = self._create_copy_backup(backup_path, to_copy, workers)
+        print(f"🔗 {linked} arquivo(s) inalterado(s) com hardlink, {len(to_copy)} copiado(s)")
+        return hashes
+    
+    def _copy_destination(self, backup_path, rel):
+        """Caminho de um arquivo dentro de um backup sem compressão"""
+        if self.source_path.is_file():
+            return backup_path
+        return backup_path / rel
+    
+    def _write_json(self, path, data):
+        """Grava um JSON compacto e retorna o caminho"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        return path
+    
+    def _load_manifest(self, backup_info):
+        """Carrega o manifesto de um backup (None para backups sem manifesto)"""
+        # Backups anteriores aos manifestos não têm tipo registrado
+        if not backup_info.get("type"):
+            return None
+        return self.catalog.load_manifest(backup_info["backup_name"])
+    
+    def _load_configs(self):
+        """Carrega o histórico de backups"""
+        return self.catalog.list_backups()
+    
+    def _format_for(self, compress):
+        """Formato dos backups criados com a configuração atual"""
+        if self.backend == "chunks":
+            return "chunks"
+        return "zip" if compress else "copy"
+    
+    @staticmethod
+    def _backup_format(backup_path):
+        """Formato de um backup existente: zip, chunks ou copy"""
+        name = str(backup_path)
+        if name.endswith('.chunks.json'):
+            return "chunks"
+        if name.endswith('.zip'):
+            return "zip"
+        return "copy"
+    
+    def _load_last_manifest(self, backup_format, snapshot=False):
+        """
+        Retorna (info, manifesto) do último backup desta origem no mesmo formato
+        
+        Com snapshot=True, considera apenas snapshots (árvores completas).
+        """
+        for backup_info in reversed(self.catalog.list_backups(source_path=self.source_path)):
+            if self._backup_format(backup_info["backup_path"]) != backup_format:
+                continue
+            if snapshot and not backup_info.get("snapshot"):
+                continue
+            manifest = self._load_manifest(backup_info)
+            if manifest is None or not Path(backup_info["backup_path"]).exists():
+                return None
+            return backup_info, manifest
+        return None
+    
+    def _save_backup_info(self, backup_path, timestamp, manifest, **extra):
+        """Registra o backup e seus arquivos no catálogo"""
         backup_info = {
             "timestamp": timestamp,
             "backup_path": str(backup_path),
             "source_path": str(self.source_path),
-            "size": backup_path.stat().st_size if backup_path.exists() else 0
+            "size": self._backup_size(backup_path)
         }
+        backup_info.update(extra)
+        self.catalog.add_backup(backup_info, manifest)
+    
+    def _discard_partial(self, backup_path):
+        """Remove o que já foi gravado de um backup que falhou"""
+        try:
+            if backup_path.is_dir():
+                shutil.rmtree(backup_path)
+            elif backup_path.exists():
+                backup_path.unlink()
+        except OSError as e:
+            print(f"⚠️  Não foi possível remover o backup incompleto {backup_path}: {e}")
+    
+    def _backup_size(self, backup_path):
+        """Tamanho em bytes de um backup (arquivo ou pasta)"""
+        if backup_path.is_dir():
+            return sum(f.stat().st_size for f in backup_path.rglob('*') if f.is_file())
+        return backup_path.stat().st_size if backup_path.exists() else 0
+    
+    def watch(self, interval=60, max_mb=64, duration=None, compress=True):
+        """
+        Modo contínuo: observa a origem com inotify e grava pequenos backups
+        incrementais com os caminhos alterados, sem varrer a árvore inteira
         
-        configs = []
-        if self.config_file.exists():
-            with open(self.config_file, 'r', encoding='utf-8') as f:
-                configs = json.load(f)
+        Args:
+            interval: Segundos máximos entre uma alteração e o backup dela
+            max_mb: Grava antes do intervalo quando as alterações somam isso
+            duration: Tempo total em segundos (None = até Ctrl+C)
+            compress: Formato dos backups incrementais (como em create_backup)
         
-        configs.append(backup_info)
+        Os caminhos alterados vão para um diário durável antes do backup;
+        se o processo cair, são gravados na próxima execução. Quando a fila
+        do inotify transborda, a próxima gravação faz uma varredura completa.
+        Um backup que falha (ex: disco cheio) é descartado e as alterações
+        continuam pendentes até a tentativa seguinte, um intervalo depois.
         
-        with open(self.config_file, 'w', encoding='utf-8') as f:
-            json.dump(configs, f, indent=2, ensure_ascii=False)
+        Returns:
+            Lista dos backups criados
+        """
+        if not self.source_path.is_dir():
+            raise ValueError("O modo contínuo exige uma pasta de origem")
+        journal = ChangeJournal(self.backup_dir / f"journal_{self.source_path.name}.log")
+        pending = journal.load()
+        if pending:
+            print(f"📓 {len(pending)} alteração(ões) pendente(s) recuperada(s) do diário")
+        try:
+            watcher = InotifyWatcher(self.source_path, self.rules)
+        except OSError as e:
+            print(f"⚠️  inotify indisponível ({e}). Usando varredura completa a cada {interval}s.")
+            watcher = None
+        
+        print(f"👀 Observando {self.source_path} (Ctrl+C para parar)")
+        created = []
+        # O que mudou enquanto nada observava a origem só aparece numa varredura
+        rescan = True
+        pending_bytes = 0
+        last_flush = start = time.time()
+        retry_at = 0.0
+        try:
+            while True:
+                now = time.time()
+                finished = duration is not None and now - start >= duration
+                due = rescan or (pending and (finished or now - last_flush >= interval
+                                              or pending_bytes >= max_mb * 1024 * 1024))
+                if due and now >= retry_at:
+                    try:
+                        created.append(self.create_backup(
+                            compress=compress, incremental=True,
+                            changed_paths=None if rescan else pending))
+                    except Exception as e:
+                        # pending e o diário ficam intactos para a próxima tentativa
+                        print(f"❌ Erro no backup contínuo: {e}. Nova tentativa em {interval}s")
+                        retry_at = time.time() + interval
+                    else:
+                        journal.clear()
+                        pending = set()
+                        pending_bytes = 0
+                        rescan = False
+                        last_flush = time.time()
+                if finished:
+                    if pending:
+                        print("📓 Alterações não gravadas continuam no diário para a próxima execução")
+                    break
+                if watcher is None:
+                    time.sleep(interval)
+                    rescan = True
+                    continue
+                
+                try:
+                    changed, overflow = watcher.read(timeout=min(1.0, interval))
+                except OSError as e:
+                    # Ex.: limite de watches (fs.inotify.max_user_watches) atingido
+                    print(f"⚠️  {e}. Usando varredura completa a cada {interval}s.")
+                    watcher.close()
+                    watcher = None
+                    rescan = True
+                    continue
+                new = changed - pending
+                if new:
+                    journal.append(new)
+                    pending |= new
+                    for rel in new:
+                        try:
+                            pending_bytes += (self.source_path / rel).stat().st_size
+                        except OSError:
+                            pass
+                if overflow:
+                    print("⚠️  Fila do inotify transbordou: a próxima gravação varre a origem inteira")
+                    rescan = True
+        except KeyboardInterrupt:
+            print("\n⏹️  Backup contínuo interrompido")
+            if pending:
+                created.append(self.create_backup(
+                    compress=compress, incremental=True, changed_paths=pending))
+                journal.clear()
+        finally:
+            if watcher is not None:
+                watcher.close()
+        return created
     
     def list_backups(self):
         """Lista todos os backups criados"""
-        if not self.config_file.exists():
+        configs = self._load_configs()
+        if not configs:
             print("Nenhum backup encontrado.")
             return []
         
-        with open(self.config_file, 'r', encoding='utf-8') as f:
-            configs = json.load(f)
-        
         print("\n📋 Lista de Backups:")
         print("-" * 60)
         for i, backup in enumerate(configs, 1):
             size_mb = backup['size'] / (1024 * 1024)
-            print(f"{i}. {backup['timestamp']} - {size_mb:.2f} MB")
+            label = " [incremental]" if backup.get('type') == "incremental" else ""
+            if backup.get('consolidated_from'):
+                label = " [completo sintético]"
+            if backup.get('stream'):
+                label += " [stream]"
+            if backup.get('snapshot'):
+                label = " [snapshot]"
+            print(f"{i}. {backup['timestamp']} - {size_mb:.2f} MB{label}")
             print(f"   {backup['backup_path']}")
         
         return configs
     
-    def restore_backup(self, backup_index):
-        """Restaura um backup específico"""
+    def _backup_chain(self, configs, backup_info):
+        """
+        Retorna o backup completo e os incrementais até backup_info, em ordem
+        
+        Returns:
+            Lista de backups ou None se algum elo da cadeia estiver faltando
+        """
+        by_name = {c.get("backup_name"): c for c in configs if c.get("backup_name")}
+        chain = [backup_info]
+        while chain[0].get("parent"):
+            parent = by_name.get(chain[0]["parent"])
+            if parent is None:
+                return None
+            chain.insert(0, parent)
+        return chain
+    
+    def restore_backup(self, backup_index, workers=4):
+        """
+        Restaura um backup específico (incluindo a cadeia de incrementais)
+        
+        Args:
+            backup_index: Número do backup (como em list_backups)
+            workers: Threads de cópia na restauração de backups sem compressão
+        """
         configs = self.list_backups()
         if not configs or backup_index < 1 or backup_index > len(configs):
             print("❌ Índice de backup inválido.")
             return
         
         backup_info = configs[backup_index - 1]
+        chain = self._backup_chain(configs, backup_info)
+        if chain is None:
+            print("❌ Cadeia de backups incompleta: backup completo de origem não encontrado.")
+            return
+        
+        for link in chain:
+            backup_path = Path(link['backup_path'])
+            if not backup_path.exists():
+                print(f"❌ Arquivo de backup não encontrado: {backup_path}")
+                return
+        
+        restore_dir = self.backup_dir / "restored"
+        restore_dir.mkdir(exist_ok=True)
+        
+        # Backups sem compressão são restaurados na pasta do backup escolhido
+        copy_root = restore_dir / Path(backup_info['backup_path']).name
+        engine = CopyEngine(workers)
+        for link in chain:
+            self._restore_link(link, restore_dir, copy_root, engine)
+        
+        if engine.stats["files"]:
+            print(f"⚡ Cópia: {engine.report()}")
+        print(f"✅ Backup restaurado em: {restore_dir}")
+    
+    def _restore_link(self, backup_info, restore_dir, copy_root, engine):
+        """Restaura um elo da cadeia e aplica as remoções registradas nele"""
         backup_path = Path(backup_info['backup_path'])
+        source_name = Path(backup_info['source_path']).name
+        backup_format = self._backup_format(backup_path)
         
-        if not backup_path.exists():
-            print(f"❌ Arquivo de backup não encontrado: {backup_path}")
+        if backup_format == "chunks":
+            self._restore_chunks(backup_info, restore_dir)
             return
+        if backup_format == "zip":
+            self._extract_zip_link(backup_info, restore_dir)
+            deleted_root = restore_dir / source_name
+        elif backup_path.is_file():
+            engine.copy_many([(backup_path, restore_dir / source_name)])
+            deleted_root = None
+        else:
+            engine.copy_tree(backup_path, copy_root)
+            deleted_root = copy_root
+        
+        manifest = self._load_manifest(backup_info)
+        if manifest and deleted_root:
+            for rel in manifest["deleted"]:
+                target = deleted_root / rel
+                if target.is_file():
+                    target.unlink()
+    
+    def _extract_zip_link(self, backup_info, restore_dir):
+        """
+        Extrai um ZIP da cadeia e aplica os deltas dele sobre as versões já
+        restauradas pelos elos anteriores
+        """
+        manifest = self._load_manifest(backup_info) or {"files": {}}
+        deltas = {self._member_arcname(backup_info, manifest, rel): rel
+                  for rel, entry in manifest["files"].items() if entry.get("delta")}
+        with zipfile.ZipFile(backup_info['backup_path'], 'r') as zipf:
+            delta_members = {arcname + DELTA_SUFFIX for arcname in deltas}
+            members = [m for m in zipf.infolist() if m.filename not in delta_members]
+            zipf.extractall(restore_dir, members)
+            for arcname in deltas:
+                target = restore_dir / arcname
+                temp = target.with_name(target.name + DELTA_SUFFIX)
+                with open(target, 'rb') as base, open(temp, 'wb') as out, \
+                        zipf.open(arcname + DELTA_SUFFIX) as delta:
+                    _apply_delta(base, delta, out.write)
+                os.replace(temp, target)
+    
+    def _restore_chunks(self, backup_info, restore_dir):
+        """Remonta os arquivos de um backup deduplicado a partir dos chunks"""
+        manifest = self._load_manifest(backup_info)
+        root = self._restore_root(backup_info, manifest, restore_dir)
+        for rel, entry in manifest["files"].items():
+            self._write_chunk_file(entry, root / rel)
+    
+    @staticmethod
+    def _restore_root(backup_info, manifest, restore_dir):
+        """Pasta onde os arquivos são restaurados (mesma estrutura da extração do ZIP)"""
+        source_name = Path(backup_info['source_path']).name
+        # Origem que era um único arquivo é restaurada direto na pasta
+        if list(manifest["files"]) == [source_name]:
+            return restore_dir
+        return restore_dir / source_name
+    
+    def _write_chunk_file(self, entry, target):
+        """Grava um arquivo a partir da sua lista de chunks"""
+        target.parent.mkdir(parents=True, exist_ok=True)
+        with open(target, 'wb') as f:
+            for digest in entry["chunks"]:
+                f.write(self.chunk_store.get(digest))
+        os.utime(target, ns=(entry["mtime"], entry["mtime"]))
+    
+    @staticmethod
+    def _matches_any(rel, patterns):
+        """Verifica se o caminho casa com algum padrão glob ou está sob uma pasta indicada"""
+        for pattern in patterns:
+            pattern = pattern.strip('/')
+            if fnmatch.fnmatchcase(rel, pattern) or rel.startswith(pattern + '/'):
+                return True
+        return False
+    
+    def restore_files(self, backup_index, patterns, workers=4):
+        """
+        Restaura apenas arquivos ou subpastas de um backup, sem extrair tudo
+        
+        Args:
+            backup_index: Número do backup (como em list_backups)
+            patterns: Caminhos ou padrões glob relativos à origem
+                (ex: "config/app.ini", "docs/*.txt" ou a pasta "docs")
+            workers: Threads usadas na extração
+        
+        Returns:
+            Lista dos caminhos restaurados
+        """
+        if isinstance(patterns, str):
+            patterns = [patterns]
+        configs = self._load_configs()
+        if not configs or backup_index < 1 or backup_index > len(configs):
+            print("❌ Índice de backup inválido.")
+            return []
+        
+        backup_info = configs[backup_index - 1]
+        chain = self._backup_chain(configs, backup_info)
+        manifest = self._load_manifest(backup_info)
+        if chain is None or manifest is None:
+            print("❌ Backup sem índice de arquivos: use a restauração completa.")
+            return []
+        
+        selected = [rel for rel in manifest["files"] if self._matches_any(rel, patterns)]
+        if not selected:
+            print("Nenhum arquivo do backup corresponde aos padrões informados.")
+            return []
         
+        # O conteúdo de cada arquivo está no último elo da cadeia que o gravou
+        links = {link['backup_name']: link for link in chain}
+        locations = self.catalog.stored_locations([link['backup_name'] for link in chain])
+        delta_chains = self.catalog.delta_chains([link['backup_name'] for link in chain])
         restore_dir = self.backup_dir / "restored"
         restore_dir.mkdir(exist_ok=True)
+        copy_root = restore_dir / Path(backup_info['backup_path']).name
         
-        if backup_path.suffix == '.zip':
-            with zipfile.ZipFile(backup_path, 'r') as zipf:
-                zipf.extractall(restore_dir)
+        # Cada thread mantém seus ZIPs abertos; o diretório central é lido uma vez
+        local = threading.local()
+        opened = []
+        
+        def open_archive(backup_path):
+            archives = local.__dict__.setdefault("archives", {})
+            if backup_path not in archives:
+                archives[backup_path] = zipfile.ZipFile(backup_path, 'r')
+                opened.append(archives[backup_path])
+            return archives[backup_path]
+        
+        engine = CopyEngine(workers)
+        
+        def restore_one(rel):
+            # Backups de chunks são autossuficientes e não aparecem em locations
+            link = links.get(locations.get(rel), backup_info)
+            if rel in delta_chains:
+                return self._restore_delta_member(
+                    [links[name] for name in delta_chains[rel]], rel, manifest,
+                    restore_dir, open_archive)
+            return self._restore_member(link, rel, manifest, restore_dir, copy_root,
+                                        open_archive, engine)
+        
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                restored = list(pool.map(restore_one, selected))
+        finally:
+            for zipf in opened:
+                zipf.close()
+        print(f"✅ {len(restored)} arquivo(s) restaurado(s) em: {restore_dir}")
+        return restored
+    
+    def _restore_member(self, link, rel, manifest, restore_dir, copy_root, open_archive, engine):
+        """Restaura um único arquivo a partir do elo da cadeia que o contém"""
+        backup_path = Path(link['backup_path'])
+        backup_format = self._backup_format(backup_path)
+        root = self._restore_root(link, manifest, restore_dir)
+        
+        if backup_format == "chunks":
+            target = root / rel
+            self._write_chunk_file(manifest["files"][rel], target)
+        elif backup_format == "zip":
+            zipf = open_archive(backup_path)
+            arcname = self._member_arcname(link, manifest, rel)
+            # Cria a pasta antes: o extract do zipfile não é seguro entre threads
+            (root / rel).parent.mkdir(parents=True, exist_ok=True)
+            target = Path(zipf.extract(zipf.getinfo(arcname), restore_dir))
         else:
-            shutil.copytree(backup_path, restore_dir / backup_path.name)
+            source = backup_path / rel if backup_path.is_dir() else backup_path
+            target = copy_root / rel if backup_path.is_dir() else root / rel
+            target.parent.mkdir(parents=True, exist_ok=True)
+            engine.copy_file(source, target)
+        return target
+    
+    def _delta_steps(self, delta_links, manifest, rel):
+        """Membros dos ZIPs (cópia completa e deltas) que reconstroem um arquivo"""
+        return [(link['backup_path'],
+                 self._member_arcname(link, manifest, rel) + (DELTA_SUFFIX if i else ""))
+                for i, link in enumerate(delta_links)]
+    
+    def _restore_delta_member(self, delta_links, rel, manifest, restore_dir, open_archive):
+        """Restaura um arquivo guardado como cópia completa seguida de deltas"""
+        target = restore_dir / self._member_arcname(delta_links[-1], manifest, rel)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        with open(target, 'wb') as out:
+            _rebuild_delta(self._delta_steps(delta_links, manifest, rel), out.write,
+                           open_archive, target.parent)
+        return target
+    
+    def _member_arcname(self, backup_info, manifest, rel):
+        """Nome do membro no ZIP de um backup para uma chave do manifesto"""
+        root = self._restore_root(backup_info, manifest, Path())
+        return rel if root == Path() else f"{root.name}/{rel}"
+    
+    def verify_backup(self, backup_index, workers=4):
+        """
+        Verifica se um backup pode ser restaurado, recalculando o hash de cada
+        arquivo (sem extrair para o disco) e comparando com o registrado
         
-        print(f"✅ Backup restaurado em: {restore_dir}")
+        Args:
+            backup_index: Número do backup (como em list_backups)
+            workers: Processos usados na verificação
+        
+        Returns:
+            Relatório com arquivos ok, corrompidos, ausentes e a vazão
+        """
+        configs = self._load_configs()
+        if not configs or backup_index < 1 or backup_index > len(configs):
+            print("❌ Índice de backup inválido.")
+            return None
+        
+        backup_info = configs[backup_index - 1]
+        chain = self._backup_chain(configs, backup_info)
+        manifest = self._load_manifest(backup_info)
+        if chain is None or manifest is None:
+            print("❌ Backup sem hashes registrados: não é possível verificar.")
+            return None
+        
+        # Verifica cada arquivo no elo da cadeia que contém seu conteúdo
+        links = {link['backup_name']: link for link in chain}
+        locations = self.catalog.stored_locations(list(links))
+        delta_chains = self.catalog.delta_chains(list(links))
+        batches_by_link = {}
+        for rel, entry in manifest["files"].items():
+            if rel in delta_chains:
+                steps = self._delta_steps([links[name] for name in delta_chains[rel]], manifest, rel)
+                batches_by_link.setdefault("", []).append((rel, steps, entry["hash"], None))
+                continue
+            link = links.get(locations.get(rel), backup_info)
+            backup_path = Path(link['backup_path'])
+            backup_format = self._backup_format(backup_path)
+            if backup_format == "zip":
+                location = self._member_arcname(link, manifest, rel)
+            elif backup_format == "copy":
+                location = str(backup_path / rel if backup_path.is_dir() else backup_path)
+            else:
+                location = None
+            batches_by_link.setdefault(link['backup_path'], []).append(
+                (rel, location, entry["hash"], entry.get("chunks")))
+        
+        start = time.time()
+        results = []
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = []
+            for backup_path, items in batches_by_link.items():
+                # Arquivos com delta são reconstruídos a partir de vários ZIPs
+                backup_format = self._backup_format(backup_path) if backup_path else "delta"
+                batch_size = max(1, -(-len(items) // (workers * 4)))
+                for i in range(0, len(items), batch_size):
+                    futures.append(pool.submit(
+                        _verify_batch, backup_path, backup_format,
+                        str(self.backup_dir / "chunks"), items[i:i + batch_size]))
+            for future in futures:
+                results.extend(future.result())
+        elapsed = time.time() - start
+        
+        total_bytes = sum(r[2] for r in results)
+        report = {
+            "backup_name": backup_info['backup_name'],
+            "files": len(results),
+            "ok": sum(1 for r in results if r[1] == "ok"),
+            "corrupt": [{"path": r[0], "detail": r[3]} for r in results if r[1] == "corrupt"],
+            "missing": [{"path": r[0], "detail": r[3]} for r in results if r[1] == "missing"],
+            "bytes": total_bytes,
+            "seconds": round(elapsed, 3),
+            "mb_per_s": round(total_bytes / (1024 * 1024) / elapsed, 2) if elapsed else 0.0
+        }
+        
+        print(f"\n🔍 Verificação de {backup_info['backup_name']}:")
+        print(f"   {report['ok']}/{report['files']} arquivo(s) íntegro(s)")
+        for item in report["corrupt"]:
+            print(f"   ❌ Corrompido: {item['path']} ({item['detail']})")
+        for item in report["missing"]:
+            print(f"   ❌ Ausente: {item['path']}")
+        print(f"   {total_bytes / (1024 * 1024):.2f} MB em {elapsed:.2f}s ({report['mb_per_s']} MB/s)")
+        return report
+    
+    def find_file(self, pattern):
+        """
+        Lista os backups desta origem que contêm um arquivo, sem abrir os arquivos
+        
+        Args:
+            pattern: Caminho ou padrão glob relativo à origem
+        """
+        results = self.catalog.find_file(pattern, self.source_path)
+        if not results:
+            print(f"Nenhum backup contém: {pattern}")
+            return []
+        
+        print(f"\n🔎 Backups que contêm '{pattern}':")
+        print("-" * 60)
+        for result in results:
+            size_kb = result['size'] / 1024
+            label = {"stored": "", "delta": " [delta]"}.get(result['status'], " [inalterado]")
+            print(f"{result['timestamp']} - {result['path']} ({size_kb:.1f} KB){label}")
+            print(f"   {result['backup_path']}")
+        return results
+    
+    def consolidate(self, backup_index, replace=True):
+        """
+        Cria um backup completo sintético com o estado de um incremental,
+        montado apenas a partir dos backups da cadeia (sem ler a origem)
+        
+        Membros de ZIP são copiados sem recompressão; arquivos guardados como
+        delta são reconstruídos e gravados completos.
+        
+        Args:
+            backup_index: Número do backup (como em list_backups)
+            replace: Se True, o backup sintético substitui o incremental no
+                catálogo (mesma posição na lista) e os incrementais seguintes
+                passam a depender dele; o incremental é removido do disco
+        
+        Returns:
+            Caminho do backup sintético ou None
+        """
+        configs = self._load_configs()
+        if not configs or backup_index < 1 or backup_index > len(configs):
+            print("❌ Índice de backup inválido.")
+            return None
+        
+        backup_info = configs[backup_index - 1]
+        if not backup_info.get("parent"):
+            print("ℹ️  O backup já é completo: nada a consolidar.")
+            return None
+        chain = self._backup_chain(configs, backup_info)
+        manifest = self._load_manifest(backup_info)
+        if chain is None or manifest is None:
+            print("❌ Cadeia de backups incompleta: não é possível consolidar.")
+            return None
+        
+        backup_format = self._backup_format(backup_info['backup_path'])
+        backup_name = self._unique_backup_name(f"{backup_info['backup_name']}_full")
+        start = time.time()
+        if backup_format == "zip":
+            backup_path = self.backup_dir / f"{backup_name}.zip"
+            signatures = self._consolidate_zip(chain, manifest, backup_path)
+        else:
+            backup_path = self.backup_dir / backup_name
+            signatures = {}
+            self._consolidate_copy(chain, manifest, backup_path)
+        
+        files = {rel: {k: v for k, v in entry.items() if k != "delta"}
+                 for rel, entry in manifest["files"].items()}
+        new_manifest = {"files": files, "changed": sorted(files), "deleted": [],
+                        "signatures": signatures}
+        new_info = {
+            "backup_name": backup_name,
+            "timestamp": backup_info['timestamp'],
+            "backup_path": str(backup_path),
+            "source_path": backup_info['source_path'],
+            "size": self._backup_size(backup_path),
+            "type": "full",
+            "parent": None,
+            "consolidated_from": backup_info['backup_name'],
+        }
+        if replace:
+            self.catalog.replace_backup(backup_info['backup_name'], new_info, new_manifest)
+            self._remove_backup_files(backup_info)
+        else:
+            self.catalog.add_backup(new_info, new_manifest)
+        
+        print(f"🧱 {len(chain)} backup(s) consolidado(s) em {time.time() - start:.2f}s: {backup_path}")
+        return backup_path
+    
+    def _consolidate_zip(self, chain, manifest, backup_path):
+        """
+        Monta o ZIP sintético a partir dos ZIPs da cadeia
+        
+        Returns:
+            Assinaturas dos arquivos grandes, base para deltas futuros
+        """
+        names = [link['backup_name'] for link in chain]
+        links = {link['backup_name']: link for link in chain}
+        locations = self.catalog.stored_locations(names)
+        delta_chains = self.catalog.delta_chains(names)
+        archives = {}
+        
+        def open_archive(path):
+            if path not in archives:
+                archives[path] = zipfile.ZipFile(path, 'r')
+            return archives[path]
+        
+        signatures = {}
+        try:
+            with self._opener(backup_path, 'w+b') as out, \
+                    zipfile.ZipFile(out, 'w', zipfile.ZIP_DEFLATED) as zipf:
+                for rel, entry in manifest["files"].items():
+                    arcname = self._member_arcname(chain[-1], manifest, rel)
+                    large = self.delta_min_size is not None and entry["size"] >= self.delta_min_size
+                    if rel in delta_chains:
+                        delta_links = [links[name] for name in delta_chains[rel]]
+                        signature = self._write_rebuilt_member(
+                            zipf, delta_links, manifest, rel, arcname, entry, large, open_archive)
+                        if signature:
+                            signatures[rel] = (DELTA_BLOCK_SIZE, 0, signature)
+                        continue
+                    
+                    link = links.get(locations.get(rel))
+                    if link is None:
+                        raise FileNotFoundError(f"Conteúdo de {rel} não encontrado na cadeia")
+                    src = open_archive(link['backup_path'])
+                    info = src.getinfo(self._member_arcname(link, manifest, rel))
+                    _copy_raw_member(src.fp, info, zipf, arcname)
+                    if large:
+                        signature = self.catalog.load_signature(names, rel)
+                        if signature and signature[0] == link['backup_name']:
+                            signatures[rel] = (signature[1], 0, signature[3])
+        except BaseException:
+            if backup_path.exists():
+                backup_path.unlink()
+            raise
+        finally:
+            for archive in archives.values():
+                archive.close()
+        return signatures
+    
+    def _write_rebuilt_member(self, zipf, delta_links, manifest, rel, arcname, entry, large,
+                              open_archive):
+        """
+        Reconstrói um arquivo guardado como delta e o grava completo no ZIP
+        
+        Returns:
+            Assinatura do arquivo (se for grande) ou None
+        """
+        with tempfile.NamedTemporaryFile(dir=self.backup_dir, delete=False) as temp:
+            _rebuild_delta(self._delta_steps(delta_links, manifest, rel), temp.write,
+                           open_archive, self.backup_dir)
+        try:
+            compress_type, level = self.codec_policy.zip_compression(temp.name)
+            digest = _write_zip_member(zipf, temp.name, arcname, compress_type, level)
+            if digest != entry["hash"]:
+                raise ValueError(f"Hash de {rel} reconstruído não confere com o registrado")
+            return _block_signature(temp.name) if large else None
+        finally:
+            os.unlink(temp.name)
+    
+    def _consolidate_copy(self, chain, manifest, backup_path):
+        """Monta a pasta sintética copiando cada arquivo do elo que o contém"""
+        links = {link['backup_name']: link for link in chain}
+        locations = self.catalog.stored_locations(list(links))
+        pairs = []
+        for rel in manifest["files"]:
+            link = links.get(locations.get(rel))
+            if link is None:
+                raise FileNotFoundError(f"Conteúdo de {rel} não encontrado na cadeia")
+            source = Path(link['backup_path'])
+            pairs.append((source / rel if source.is_dir() else source,
+                          self._copy_destination(backup_path, rel)))
+        if self.source_path.is_dir():
+            backup_path.mkdir()
+        engine = CopyEngine(throttle=self.throttle)
+        engine.copy_many(pairs)
+        print(f"⚡ Cópia: {engine.report()}")
+    
+    def _remove_backup_files(self, backup_info):
+        """Remove do disco o backup e seu manifesto"""
+        backup_path = Path(backup_info['backup_path'])
+        if backup_path.is_dir():
+            shutil.rmtree(backup_path)
+        elif backup_path.exists():
+            backup_path.unlink()
+        manifest_path = backup_info.get("manifest")
+        if manifest_path and Path(manifest_path).exists():
+            Path(manifest_path).unlink()
+        print(f"🗑️  Removido: {backup_path.name}")
+    
+    def _collect_chunk_garbage(self):
+        """Remove chunks que nenhum backup do catálogo referencia"""
+        removed = self.chunk_store.collect_garbage(self.catalog.live_chunks())
+        print(f"🧩 {removed} chunk(s) sem referência removido(s)")
     
-    def cleanup_old_backups(self, keep_last=5):
-        """Remove backups antigos, mantendo apenas os últimos N"""
+    def cleanup_old_backups(self, keep_last=5, consolidate=False):
+        """
+        Remove backups antigos, mantendo apenas os últimos N
+        
+        Backups completos e incrementais dos quais os mantidos dependem
+        também são preservados, para que continuem restauráveis.
+        
+        Args:
+            keep_last: Quantidade de backups mantidos
+            consolidate: Se True, o mais antigo dos mantidos que depende de
+                backups a remover vira um completo sintético (consolidate),
+                liberando a cadeia antiga inteira
+        """
         configs = self.list_backups()
         if len(configs) <= keep_last:
             print("Nenhum backup antigo para remover.")
             return
         
-        configs_to_remove = configs[:-keep_last]
+        while consolidate:
+            kept = configs[len(configs) - keep_last:]
+            kept_names = {c['backup_name'] for c in kept}
+            index = next((len(configs) - keep_last + i + 1 for i, c in enumerate(kept)
+                          if c.get('parent') and c['parent'] not in kept_names), None)
+            if index is None or self.consolidate(index) is None:
+                break
+            configs = self._load_configs()
+        
+        required = set()
+        for backup_info in configs[len(configs) - keep_last:]:
+            chain = self._backup_chain(configs, backup_info) or [backup_info]
+            required.update(link['backup_path'] for link in chain)
+        
+        remaining_backups = [c for c in configs if c['backup_path'] in required]
+        configs_to_remove = [c for c in configs if c['backup_path'] not in required]
         for backup_info in configs_to_remove:
-            backup_path = Path(backup_info['backup_path'])
-            if backup_path.exists():
-                backup_path.unlink()
-                print(f"🗑️  Removido: {backup_path.name}")
+            self._remove_backup_files(backup_info)
+        
+        # Atualiza o catálogo
+        self.catalog.delete_backups(c['backup_name'] for c in configs_to_remove)
         
-        # Atualiza o arquivo de configuração
-        remaining_backups = configs[-keep_last:]
-        with open(self.config_file, 'w', encoding='utf-8') as f:
-            json.dump(remaining_backups, f, indent=2, ensure_ascii=False)
+        if any(self._backup_format(c['backup_path']) == "chunks" for c in configs_to_remove):
+            self._collect_chunk_garbage()
         
+        kept_for_chain = len(remaining_backups) - keep_last
+        if kept_for_chain > 0:
+            print(f"ℹ️  {kept_for_chain} backup(s) antigo(s) mantido(s) por serem base de incrementais.")
         print(f"✅ Limpeza concluída. Mantidos os últimos {keep_last} backups.")
 
 
+class BackupScheduler:
+    """
+    Executa vários jobs de backup em paralelo, limitando quantos jobs usam
+    ao mesmo tempo cada disco físico (de origem ou de destino)
+    """
+    
+    # Opções do job repassadas ao BackupSystem e ao create_backup
+    SYSTEM_OPTIONS = ("backend", "codec", "level", "delta_min_size", "max_delta_chain")
+    BACKUP_OPTIONS = ("compress", "incremental", "workers", "snapshot")
+    
+    def __init__(self, jobs, max_jobs=4, per_device=1):
+        """
+        Args:
+            jobs: Lista de dicionários com "source" e, opcionalmente, "name",
+                "backup_dir", "exclude" e as opções de BackupSystem e create_backup
+            max_jobs: Jobs executados ao mesmo tempo no total
+            per_device: Jobs simultâneos em cada disco físico
+        """
+        self.jobs = jobs
+        self.max_jobs = max_jobs
+        self.per_device = max(1, per_device)
+    
+    @classmethod
+    def from_file(cls, config_file):
+        """
+        Carrega os jobs de um JSON no formato
+        {"max_jobs": 4, "per_device": 1, "jobs": [{"source": ..., ...}]}
+        """
+        with open(config_file, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+        return cls(config["jobs"], config.get("max_jobs", 4), config.get("per_device", 1))
+    
+    @staticmethod
+    def _device_key(path):
+        """
+        Disco físico de um caminho: partições do mesmo disco compartilham a
+        chave (via /sys/dev/block); fora do Linux usa o st_dev (no Windows,
+        o número de série do volume, já que os.major não existe)
+        """
+        path = Path(path).absolute()
+        while not path.exists():
+            path = path.parent
+        dev = path.stat().st_dev
+        if not hasattr(os, "major"):
+            return str(dev)
+        key = f"{os.major(dev)}:{os.minor(dev)}"
+        sys_block = Path("/sys/dev/block") / key
+        if (sys_block / "partition").exists():
+            parent_dev = sys_block.resolve().parent / "dev"
+            if parent_dev.exists():
+                key = parent_dev.read_text().strip()
+        return key
+    
+    def _job_devices(self, job):
+        """Discos físicos usados por um job (origem e destino)"""
+        try:
+            return {self._device_key(job["source"]), self._device_key(job.get("backup_dir", "backups"))}
+        except (OSError, AttributeError):
+            # O próprio job vai falhar ao acessar o caminho
+            return set()
+    
+    def _run_job(self, job, waited=0.0):
+        """
+        Executa um job (o coordenador de run() só o inicia quando há vaga
+        nos discos dele) e retorna o resumo
+        
+        Args:
+            job: Configuração do job
+            waited: Segundos que o job esperou na fila
+        """
+        name = job.get("name") or Path(job["source"]).name
+        backup_dir = job.get("backup_dir", "backups")
+        result = {"name": name, "source": job["source"], "status": "ok", "backup_path": None,
+                  "bytes": 0, "seconds": 0.0, "waited": round(waited, 3), "mb_per_s": 0.0,
+                  "error": None}
+        started = time.time()
+        try:
+            options = {k: job[k] for k in self.SYSTEM_OPTIONS if k in job}
+            if "throttle" in job:
+                options["throttle"] = IOThrottle(**job["throttle"])
+            if "exclude" in job:
+                options["rules"] = ScanRules.from_ignore_file(
+                    Path(job["source"]) / IGNORE_FILE, exclude=job["exclude"])
+            system = BackupSystem(job["source"], backup_dir, **options)
+            try:
+                backup_path = system.create_backup(
+                    **{k: job[k] for k in self.BACKUP_OPTIONS if k in job})
+                result["bytes"] = system.metrics.counters["bytes_read"]
+                result["backup_path"] = str(backup_path)
+            finally:
+                system.catalog.close()
+        except Exception as e:
+            result["status"] = "erro"
+            result["error"] = str(e)
+            print(f"❌ Job {name} falhou: {e}")
+        
+        elapsed = time.time() - started
+        result["seconds"] = round(elapsed, 3)
+        if elapsed:
+            result["mb_per_s"] = round(result["bytes"] / (1024 * 1024) / elapsed, 2)
+        return result
+    
+    def run(self, summary_file=None):
+        """
+        Executa todos os jobs e mostra o resumo
+        
+        Args:
+            summary_file: Caminho opcional para salvar o resumo em JSON
+        
+        Returns:
+            Lista com o resumo de cada job, na ordem da configuração
+        """
+        start = time.time()
+        devices = [self._job_devices(job) for job in self.jobs]
+        busy = {}
+        pending = list(range(len(self.jobs)))
+        running = {}
+        results = [None] * len(self.jobs)
+        with ThreadPoolExecutor(max_workers=self.max_jobs) as pool:
+            while pending or running:
+                # Inicia, na ordem da configuração, os jobs com vaga em todos os
+                # discos; os demais continuam na fila sem ocupar uma thread
+                for index in list(pending):
+                    if len(running) >= self.max_jobs:
+                        break
+                    if any(busy.get(device, 0) >= self.per_device for device in devices[index]):
+                        continue
+                    for device in devices[index]:
+                        busy[device] = busy.get(device, 0) + 1
+                    pending.remove(index)
+                    future = pool.submit(self._run_job, self.jobs[index], time.time() - start)
+                    running[future] = index
+                
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index = running.pop(future)
+                    for device in devices[index]:
+                        busy[device] -= 1
+                    results[index] = future.result()
+        elapsed = time.time() - start
+        
+        total_bytes = sum(r["bytes"] for r in results)
+        summary = {
+            "jobs": results,
+            "ok": sum(1 for r in results if r["status"] == "ok"),
+            "failed": sum(1 for r in results if r["status"] != "ok"),
+            "bytes": total_bytes,
+            "seconds": round(elapsed, 3),
+            "mb_per_s": round(total_bytes / (1024 * 1024) / elapsed, 2) if elapsed else 0.0
+        }
+        self.print_summary(summary)
+        if summary_file:
+            with open(summary_file, 'w', encoding='utf-8') as f:
+                json.dump(summary, f, indent=2, ensure_ascii=False)
+        return results
+    
+    @staticmethod
+    def print_summary(summary):
+        """Mostra duração, espera e vazão de cada job e o total"""
+        print("\n📊 Resumo dos jobs:")
+        print("-" * 60)
+        for r in summary["jobs"]:
+            icon = "✅" if r["status"] == "ok" else "❌"
+            print(f"{icon} {r['name']}: {r['bytes'] / (1024 * 1024):.2f} MB em {r['seconds']:.2f}s "
+                  f"({r['mb_per_s']} MB/s, espera {r['waited']:.2f}s)")
+        print("-" * 60)
+        print(f"Total: {summary['ok']} ok, {summary['failed']} com erro, "
+              f"{summary['bytes'] / (1024 * 1024):.2f} MB em {summary['seconds']:.2f}s "
+              f"({summary['mb_per_s']} MB/s)")
+
+
 def main():
     """Exemplo de uso"""
     print("🔄 Sistema de Backup Automatizado\n")
@@ -167,27 +3816,53 @@ def main():
         print("2. Listar backups")
         print("3. Restaurar backup")
         print("4. Limpar backups antigos")
-        print("5. Sair")
+        print("5. Verificar backup")
+        print("6. Backup contínuo (inotify)")
+        print("7. Consolidar incrementais (completo sintético)")
+        print("8. Sair")
         print("="*50)
         
         choice = input("\nEscolha uma opção: ").strip()
         
         if choice == "1":
-            backup_system.create_backup(compress=True)
+            incremental = input("Backup incremental? (s/N): ").strip().lower() == "s"
+            backup_system.create_backup(compress=True, incremental=incremental)
         elif choice == "2":
             backup_system.list_backups()
         elif choice == "3":
             backup_system.list_backups()
             idx = input("\nDigite o número do backup para restaurar: ").strip()
+            patterns = input("Arquivos/padrões a restaurar, separados por vírgula (Enter para tudo): ").strip()
             try:
-                backup_system.restore_backup(int(idx))
+                if patterns:
+                    backup_system.restore_files(int(idx), [p.strip() for p in patterns.split(",")])
+                else:
+                    backup_system.restore_backup(int(idx))
             except ValueError:
                 print("❌ Número inválido.")
         elif choice == "4":
             keep = input("Quantos backups manter? (padrão: 5): ").strip()
             keep = int(keep) if keep.isdigit() else 5
-            backup_system.cleanup_old_backups(keep)
+            consolidate = input("Consolidar incrementais para liberar cadeias antigas? (s/N): ").strip().lower() == "s"
+            backup_system.cleanup_old_backups(keep, consolidate)
         elif choice == "5":
+            backup_system.list_backups()
+            idx = input("\nDigite o número do backup para verificar: ").strip()
+            try:
+                backup_system.verify_backup(int(idx))
+            except ValueError:
+                print("❌ Número inválido.")
+        elif choice == "6":
+            interval = input("Intervalo entre gravações em segundos (padrão: 60): ").strip()
+            backup_system.watch(int(interval) if interval.isdigit() else 60)
+        elif choice == "7":
+            backup_system.list_backups()
+            idx = input("\nDigite o número do backup incremental para consolidar: ").strip()
+            try:
+                backup_system.consolidate(int(idx))
+            except ValueError:
+                print("❌ Número inválido.")
+        elif choice == "8":
             print("👋 Até logo!")
             break
         else:
@@ -195,4 +3870,12 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    if len(sys.argv) == 3 and sys.argv[1] == "--jobs":
+        BackupScheduler.from_file(sys.argv[2]).run()
+    elif len(sys.argv) in (3, 4) and sys.argv[1] == "--stream":
+        # O ZIP vai para a saída padrão; as mensagens, para a saída de erro
+        stream = sys.stdout.buffer
+        with redirect_stdout(sys.stderr):
+            BackupSystem(*sys.argv[2:]).create_backup(stream=stream)
+    else:
+        main()
@@ -0,0 +1,305 @@
+"""
+Benchmark do Sistema de Backup
+Gera árvores sintéticas reprodutíveis e mede create_backup, restore_backup e
+a limpeza em cada modo, gravando resultados em JSON comparáveis entre versões
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import statistics
+import subprocess
+from contextlib import redirect_stdout
+from datetime import datetime
+from pathlib import Path
+
+from backup_system import BackupSystem, BLOCK_SIZE
+
+
+# Palavras usadas no conteúdo comprimível (texto parecido com logs e código)
+WORDS = ("backup", "arquivo", "pasta", "erro", "info", "debug", "usuario", "config",
+         "valor", "registro", "def", "return", "import", "class", "self", "None",
+         "2024-01-01", "12:00:00", "GET", "POST", "/api/v1/items", "200", "404")
+
+
+def _compressible_block(rng, size):
+    """Bloco de texto com palavras aleatórias (comprime bem com deflate)"""
+    words = []
+    total = 0
+    while total < size:
+        word = rng.choice(WORDS)
+        words.append(word)
+        total += len(word) + 1
+    return " ".join(words).encode()[:size]
+
+
+def _random_block(rng, size):
+    """Bloco de bytes aleatórios (incomprimível), reprodutível pela semente"""
+    return rng.getrandbits(size * 8).to_bytes(size, "little") if size else b""
+
+
+def _write_file(path, rng, size, compressible):
+    """Grava um arquivo sintético em blocos de BLOCK_SIZE"""
+    with open(path, "wb") as f:
+        if compressible:
+            # Um bloco base por arquivo, com um contador para variar o conteúdo
+            base = _compressible_block(rng, min(size, BLOCK_SIZE))
+            written = 0
+            counter = 0
+            while written < size:
+                block = (b"%d " % counter + base)[:min(BLOCK_SIZE, size - written)]
+                f.write(block)
+                written += len(block)
+                counter += 1
+        else:
+            written = 0
+            while written < size:
+                block = _random_block(rng, min(BLOCK_SIZE, size - written))
+                f.write(block)
+                written += len(block)
+
+
+def make_tiny(root, rng, scale):
+    """1M arquivos de 0 a 1 KB, 1000 por pasta (custo dominado por metadados)"""
+    count = max(1, int(1_000_000 * scale))
+    for i in range(count):
+        folder = root / f"d{i // 1000:04d}"
+        if i % 1000 == 0:
+            folder.mkdir()
+        size = rng.randint(0, 1024)
+        with open(folder / f"f{i:07d}.txt", "wb") as f:
+            f.write(_compressible_block(rng, size))
+
+
+def make_huge(root, rng, scale):
+    """Poucos arquivos enormes: um comprimível, um aleatório e um misto"""
+    size = max(BLOCK_SIZE, int(1024 ** 3 * scale))
+    _write_file(root / "texto.log", rng, size, True)
+    _write_file(root / "aleatorio.bin", rng, size, False)
+    with open(root / "misto.img", "wb") as f:
+        for i in range(size // BLOCK_SIZE):
+            f.write(_compressible_block(rng, BLOCK_SIZE) if i % 2 else _random_block(rng, BLOCK_SIZE))
+
+
+def make_mixed(root, rng, scale):
+    """Arquivos de 1 KB a 4 MB (distribuição log-uniforme), metade comprimível"""
+    count = max(1, int(2000 * scale))
+    for i in range(count):
+        folder = root / f"d{i // 100:03d}"
+        folder.mkdir(exist_ok=True)
+        size = int(2 ** rng.uniform(10, 22))
+        compressible = rng.random() < 0.5
+        name = f"f{i:05d}.{'txt' if compressible else 'bin'}"
+        _write_file(folder / name, rng, size, compressible)
+
+
+SHAPES = {
+    "tiny": make_tiny,
+    "huge": make_huge,
+    "mixed": make_mixed,
+}
+
+# Opções de BackupSystem, do primeiro backup e do segundo (origem sem mudanças)
+MODES = {
+    "zip": {"system": {}, "create": {}, "again": {"incremental": True}},
+    "zip_parallel": {"system": {}, "create": {"workers": os.cpu_count() or 1},
+                     "again": {"incremental": True, "workers": os.cpu_count() or 1}},
+    "copy": {"system": {}, "create": {"compress": False},
+             "again": {"compress": False, "incremental": True}},
+    "snapshot": {"system": {}, "create": {"compress": False, "snapshot": True},
+                 "again": {"compress": False, "snapshot": True}},
+    "chunks": {"system": {"backend": "chunks"}, "create": {}, "again": {}},
+}
+
+
+def prepare_tree(workdir, shape, scale, seed):
+    """
+    Gera (ou reaproveita) a árvore sintética de um formato
+    
+    Returns:
+        (caminho, quantidade de arquivos, bytes)
+    """
+    root = Path(workdir) / "trees" / f"{shape}_{scale}_{seed}"
+    marker = root.with_name(root.name + ".json")
+    if marker.exists():
+        info = json.loads(marker.read_text())
+        return root, info["files"], info["bytes"]
+    
+    if root.exists():
+        shutil.rmtree(root)
+    root.mkdir(parents=True)
+    print(f"🌱 Gerando árvore '{shape}' (escala {scale})...")
+    start = time.perf_counter()
+    SHAPES[shape](root, random.Random(f"{shape}-{seed}"), scale)
+    files = 0
+    total = 0
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            files += 1
+            total += os.path.getsize(os.path.join(dirpath, name))
+    marker.write_text(json.dumps({"files": files, "bytes": total}))
+    print(f"   {files} arquivo(s), {total / (1024 * 1024):.1f} MB em {time.perf_counter() - start:.1f}s")
+    return root, files, total
+
+
+def _timed(func, *args, **kwargs):
+    """Executa func sem as mensagens do sistema de backup e retorna os segundos"""
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        start = time.perf_counter()
+        func(*args, **kwargs)
+        return time.perf_counter() - start
+
+
+def run_mode(tree, backup_dir, mode):
+    """
+    Mede uma rodada completa de um modo em uma pasta de backups vazia
+    
+    Returns:
+        Dicionário {operação: segundos} e as métricas do primeiro backup
+    """
+    if backup_dir.exists():
+        shutil.rmtree(backup_dir)
+    backup_dir.parent.mkdir(parents=True, exist_ok=True)
+    options = MODES[mode]
+    system = BackupSystem(tree, backup_dir, **options["system"])
+    timings = {}
+    timings["create"] = _timed(system.create_backup, **options["create"])
+    metrics = system.metrics.to_dict()
+    timings["create_again"] = _timed(system.create_backup, **options["again"])
+    timings["restore"] = _timed(system.restore_backup, 2)
+    shutil.rmtree(backup_dir / "restored")
+    timings["cleanup"] = _timed(system.cleanup_old_backups, 0)
+    system.catalog.conn.close()
+    shutil.rmtree(backup_dir)
+    return timings, metrics
+
+
+def run_benchmark(shapes, modes, scale=1.0, repeat=3, seed=42, workdir="benchmark_data"):
+    """
+    Executa o benchmark
+    
+    Args:
+        shapes: Formatos de árvore (chaves de SHAPES)
+        modes: Modos de backup (chaves de MODES)
+        scale: Multiplicador da quantidade/tamanho dos arquivos (1.0 = 1M
+            arquivos pequenos, arquivos enormes de 1 GB)
+        repeat: Rodadas por combinação (os resultados trazem mínimo e mediana)
+        seed: Semente das árvores sintéticas
+        workdir: Pasta das árvores (reaproveitadas entre execuções) e backups
+    
+    Returns:
+        Dicionário com o ambiente e os resultados
+    """
+    results = []
+    for shape in shapes:
+        tree, files, total = prepare_tree(workdir, shape, scale, seed)
+        for mode in modes:
+            samples = {}
+            metrics = None
+            for _ in range(repeat):
+                timings, metrics = run_mode(tree, Path(workdir) / "runs" / f"{shape}_{mode}", mode)
+                for operation, seconds in timings.items():
+                    samples.setdefault(operation, []).append(seconds)
+            operations = {
+                operation: {
+                    "min_s": round(min(values), 4),
+                    "median_s": round(statistics.median(values), 4),
+                    "mb_per_s": round(total / (1024 * 1024) / min(values), 2) if min(values) else 0.0,
+                }
+                for operation, values in samples.items()
+            }
+            results.append({
+                "shape": shape,
+                "mode": mode,
+                "files": files,
+                "bytes": total,
+                "bytes_written": metrics["bytes_written"],
+                "phases": metrics["phases"],
+                "operations": operations,
+            })
+            summary = ", ".join(f"{op} {stats['min_s']:.2f}s" for op, stats in operations.items())
+            print(f"⏱️  {shape:<6} {mode:<13} {summary}")
+    
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "scale": scale,
+        "seed": seed,
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def _git_commit():
+    """Commit atual do repositório (None fora de um repositório git)"""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True, cwd=Path(__file__).parent).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline, current):
+    """Mostra a variação do tempo mínimo de cada operação entre dois resultados"""
+    old = {(r["shape"], r["mode"]): r["operations"] for r in baseline["results"]}
+    print(f"\n📊 {baseline.get('commit')} → {current.get('commit')}")
+    for result in current["results"]:
+        key = (result["shape"], result["mode"])
+        if key not in old:
+            continue
+        changes = []
+        for operation, stats in result["operations"].items():
+            before = old[key].get(operation)
+            if before and before["min_s"]:
+                change = (stats["min_s"] - before["min_s"]) / before["min_s"] * 100
+                changes.append(f"{operation} {change:+.1f}%")
+        print(f"   {key[0]:<6} {key[1]:<13} {', '.join(changes)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do sistema de backup")
+    parser.add_argument("--shapes", default=",".join(SHAPES),
+                        help=f"Formatos de árvore separados por vírgula ({', '.join(SHAPES)})")
+    parser.add_argument("--modes", default=",".join(MODES),
+                        help=f"Modos separados por vírgula ({', '.join(MODES)})")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="Multiplicador do tamanho das árvores (ex: 0.01 para um teste rápido)")
+    parser.add_argument("--repeat", type=int, default=3, help="Rodadas por combinação")
+    parser.add_argument("--seed", type=int, default=42, help="Semente das árvores sintéticas")
+    parser.add_argument("--workdir", default="benchmark_data", help="Pasta de trabalho")
+    parser.add_argument("--output", help="Arquivo JSON de saída (padrão: saída padrão)")
+    parser.add_argument("--compare", help="JSON de uma execução anterior para comparar")
+    args = parser.parse_args()
+    
+    shapes = [s for s in args.shapes.split(",") if s]
+    modes = [m for m in args.modes.split(",") if m]
+    unknown = [s for s in shapes if s not in SHAPES] + [m for m in modes if m not in MODES]
+    if unknown:
+        parser.error(f"Formato ou modo desconhecido: {', '.join(unknown)}")
+    
+    # Com o JSON na saída padrão, o progresso vai para a saída de erro
+    log = sys.stderr if not args.output else sys.stdout
+    with redirect_stdout(log):
+        report = run_benchmark(shapes, modes, args.scale, args.repeat, args.seed, args.workdir)
+        if args.compare:
+            with open(args.compare, "r", encoding="utf-8") as f:
+                compare(json.load(f), report)
+    
+    data = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        Path(args.output).write_text(data + "\n", encoding="utf-8")
+        print(f"💾 Resultados salvos em: {args.output}")
+    else:
+        print(data)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""
+Benchmark do Monitor de Logs
+Mede a verificação de padrões do PatternEngine contra uma regex por vez,
+em linhas sintéticas reprodutíveis, com quantidades crescentes de padrões
+"""
+
+import re
+import sys
+import json
+import time
+import random
+import string
+import argparse
+import platform
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import log_monitor
+from log_monitor import LogMonitor, PatternEngine
+
+
+# Palavras das mensagens sintéticas
+WORDS = ("request", "handled", "user", "session", "cache", "miss", "hit", "db", "query",
+         "ok", "GET", "POST", "/api/v1/items", "/api/v1/users", "200", "201", "304", "latency")
+
+
+def make_lines(count, seed, hit_rate):
+    """
+    Linhas parecidas com as de um log de aplicação; uma fração hit_rate
+    contém um dos códigos procurados pelos padrões
+    """
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1)
+    lines = []
+    for i in range(count):
+        message = " ".join(rng.choice(WORDS) for _ in range(rng.randint(4, 10)))
+        if rng.random() < hit_rate:
+            message += f" ERROR E{rng.randrange(10_000):04d} falhou"
+        lines.append(f"[{start + timedelta(milliseconds=i):%Y-%m-%d %H:%M:%S}] INFO {message}")
+    return lines
+
+
+def make_patterns(count, kind="codes"):
+    """
+    Padrões com literais distintos
+    
+    Args:
+        count: Quantidade de padrões
+        kind: "codes" (códigos de erro com prefixo comum, como E0037) ou
+            "words" (palavras aleatórias, sem prefixos em comum: pior caso
+            do pré-filtro)
+    """
+    if kind == "codes":
+        return [re.compile(rf"E{i * 37 % 10_000:04d} falhou") for i in range(count)]
+    rng = random.Random(count)
+    return [re.compile("".join(rng.choice(string.ascii_letters) for _ in range(rng.randint(4, 12))))
+            for _ in range(count)]
+
+
+KINDS = ("codes", "words")
+
+# Padrões da conferência da busca paralela: os sem literal obrigatório
+# verificam todas as linhas do trecho, inclusive as vazias
+SEARCH_CHECK_PATTERNS = (".*", "^$|ERROR", "^$", r"E\d{4}", "ERROR")
+
+
+def _best(func, repeat):
+    """Menor tempo (segundos) de repeat execuções"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def run_benchmark(lines, pattern_counts, kinds=KINDS, repeat=3):
+    """
+    Mede, para cada quantidade de padrões, o PatternEngine e o laço com uma
+    regex por vez (e confere se os dois encontram as mesmas linhas)
+    
+    Returns:
+        Lista de resultados por quantidade de padrões
+    """
+    results = []
+    for kind, count in [(kind, count) for kind in kinds for count in pattern_counts]:
+        patterns = make_patterns(count, kind)
+        engine = PatternEngine()
+        for i, pattern in enumerate(patterns):
+            engine.add(i, pattern)
+        engine.scan(lines[:1])  # Compila fora da medição
+        
+        def naive():
+            return [(index, [i for i, pattern in enumerate(patterns) if pattern.search(line)])
+                    for index, line in enumerate(lines)]
+        
+        expected = [(index, keys) for index, keys in naive() if keys]
+        if engine.scan(lines) != expected:
+            raise AssertionError(f"PatternEngine divergiu da verificação regex a regex ({count} padrões)")
+        
+        engine_s = _best(lambda: engine.scan(lines), repeat)
+        naive_s = _best(naive, repeat)
+        results.append({
+            "kind": kind,
+            "patterns": count,
+            "engine_s": round(engine_s, 4),
+            "naive_s": round(naive_s, 4),
+            "engine_lines_per_s": round(len(lines) / engine_s),
+            "speedup": round(naive_s / engine_s, 1),
+        })
+        print(f"⏱️  {kind:<5} {count:>5} padrão(ões): engine {engine_s:.3f}s, "
+              f"uma regex por vez {naive_s:.3f}s ({naive_s / engine_s:.1f}x)")
+    return results
+
+
+def check_parallel_search(lines, patterns=SEARCH_CHECK_PATTERNS, workers=2, chunk_size=4096):
+    """
+    Confere se a busca paralela (search_log com workers) encontra as mesmas
+    linhas da sequencial, com trechos pequenos para haver muitas divisas
+    entre trechos
+    
+    Raises:
+        AssertionError: Se algum padrão der resultados diferentes
+    """
+    # Linhas vazias no meio e no fim do arquivo
+    lines = [line if i % 7 else "" for i, line in enumerate(lines, 1)] + [""]
+    original_chunk_size = log_monitor.SEARCH_CHUNK_SIZE
+    with tempfile.TemporaryDirectory() as directory:
+        log_file = Path(directory) / "check.log"
+        log_file.write_text("\n".join(lines) + "\n", encoding="utf-8")
+        monitor = LogMonitor(str(log_file))
+        log_monitor.SEARCH_CHUNK_SIZE = chunk_size
+        try:
+            for pattern in patterns:
+                expected = monitor.search_log(pattern, max_results=2 * len(lines))
+                found = monitor.search_log(pattern, max_results=2 * len(lines), workers=workers)
+                if found != expected:
+                    raise AssertionError(f"Busca paralela divergiu da sequencial com {pattern!r}: "
+                                         f"{len(found)} x {len(expected)} linha(s)")
+        finally:
+            log_monitor.SEARCH_CHUNK_SIZE = original_chunk_size
+    print(f"✅ Busca paralela confere com a sequencial ({len(patterns)} padrão(ões))")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark da verificação de padrões")
+    parser.add_argument("--lines", type=int, default=100_000, help="Linhas sintéticas")
+    parser.add_argument("--patterns", default="1,10,200,1000",
+                        help="Quantidades de padrões separadas por vírgula")
+    parser.add_argument("--kinds", default=",".join(KINDS),
+                        help=f"Tipos de padrão separados por vírgula ({', '.join(KINDS)})")
+    parser.add_argument("--hit-rate", type=float, default=0.01,
+                        help="Fração das linhas com um código de erro")
+    parser.add_argument("--repeat", type=int, default=3, help="Rodadas por medição")
+    parser.add_argument("--seed", type=int, default=42, help="Semente das linhas")
+    parser.add_argument("--output", help="Arquivo JSON de saída (opcional)")
+    args = parser.parse_args()
+    
+    counts = [int(c) for c in args.patterns.split(",") if c]
+    kinds = [k for k in args.kinds.split(",") if k]
+    unknown = [k for k in kinds if k not in KINDS]
+    if unknown:
+        parser.error(f"Tipo desconhecido: {', '.join(unknown)}")
+    lines = make_lines(args.lines, args.seed, args.hit_rate)
+    print(f"🧪 {len(lines)} linhas, {args.hit_rate:.1%} com código de erro")
+    check_parallel_search(lines[:2000])
+    results = run_benchmark(lines, counts, kinds, args.repeat)
+    
+    if args.output:
+        report = {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "lines": args.lines,
+            "hit_rate": args.hit_rate,
+            "seed": args.seed,
+            "results": results,
+        }
+        Path(args.output).write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+        print(f"💾 Resultados salvos em: {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
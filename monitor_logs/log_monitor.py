@@ -4,36 +4,938 @@ Monitora arquivos de log em tempo real e detecta padrões
 """
 
 import os
+import sys
+import glob
 import time
+import asyncio
+import bisect
+import itertools
+import mmap
+import fnmatch
+import errno
+import select
+import struct
+import zlib
 from pathlib import Path
 from datetime import datetime
 import re
 from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 import json
+import gzip
 
+try:
+    # Parser de regex da biblioteca padrão (usado para extrair literais)
+    from re import _parser as sre_parse
+except ImportError:
+    try:
+        import sre_parse
+    except ImportError:
+        sre_parse = None
 
-class LogMonitor:
-    def __init__(self, log_file, buffer_size=100):
+try:
+    import ctypes
+    import ctypes.util
+except ImportError:
+    ctypes = None
+
+
+def _load_libc():
+    """
+    libc do Linux via ctypes (None em outros sistemas ou se ela não carregar;
+    sem ela o inotify fica indisponível e o código usa varredura)
+    """
+    if ctypes is None or not sys.platform.startswith("linux"):
+        return None
+    try:
+        # No Windows find_library("c") retorna None e CDLL(None) gera TypeError
+        return ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    except (OSError, TypeError, AttributeError):
+        return None
+
+
+_libc = _load_libc()
+INOTIFY_AVAILABLE = hasattr(_libc, "inotify_init1")
+
+
+# Eventos do inotify (linux/inotify.h)
+IN_MODIFY = 0x00000002
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+WATCH_MASK = IN_MODIFY | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_ONLYDIR
+INOTIFY_EVENT = struct.Struct("iIII")
+
+# Sistemas de arquivos em que o inotify não vê escritas feitas por outras
+# máquinas: nesses o monitor volta a verificar o arquivo a cada intervalo
+POLL_FILESYSTEMS = {"nfs", "nfs4", "cifs", "smb3", "smbfs", "fuse.sshfs", "9p", "afs",
+                    "ceph", "glusterfs", "lustre", "vboxsf", "fuse.vmhgfs-fuse"}
+
+# Tamanho dos blocos lidos do log
+READ_SIZE = 1024 * 1024
+
+# Segundos sem dados para considerar encerrado um log rotacionado
+ROTATE_GRACE = 1.0
+
+# Bytes do início do log usados para reconhecê-lo ao retomar um checkpoint
+FINGERPRINT_SIZE = 4096
+
+# Intervalo mínimo entre gravações do checkpoint durante o monitoramento
+CHECKPOINT_INTERVAL = 1.0
+
+# Logs rotacionados e comprimidos não são lidos ao retomar um checkpoint
+COMPRESSED_SUFFIXES = {".gz", ".bz2", ".xz", ".zst", ".lz4", ".zip"}
+
+# Sufixo de um log rotacionado (app.log.1, app.log.20250115, app.log.2025-01-15)
+ROTATED_SUFFIX_RE = re.compile(r"\d+|\d{4}-\d{2}-\d{2}(?:[-_T]\d{2}(?:[-:]?\d{2}){0,2})?")
+
+# Arquivos auxiliares gravados ao lado do log, que nunca são logs rotacionados
+SIDECAR_SUFFIXES = {".idx", ".tmp", ".checkpoint"}
+
+# Segundos entre reexpansões dos globs do MultiLogMonitor
+RESCAN_INTERVAL = 10.0
+
+# Caracteres especiais de glob
+GLOB_MAGIC = re.compile(r"[*?[]")
+
+# Bytes entre checkpoints do índice de busca (<log>.idx)
+INDEX_STEP = 1024 * 1024
+
+# Ocorrências guardadas por padrão (as mais antigas são descartadas)
+MAX_MATCHES = 1000
+
+# Bytes de cada trecho do log na busca paralela
+SEARCH_CHUNK_SIZE = 16 * 1024 * 1024
+
+# Caracteres não ASCII que o re, sem diferenciar maiúsculas, iguala a letras ASCII
+UNICODE_CASE_ALIASES = {"i": "\u0130\u0131", "k": "\u212a", "s": "\u017f"}
+
+# Timestamp no início das linhas ("2025-01-15 10:00:00" ou "2025-01-15T10:00:00")
+TIMESTAMP_RE = re.compile(r"(\d{4}-\d{2}-\d{2})[ T](\d{2}:\d{2}:\d{2})")
+
+
+def filesystem_type(path):
+    """Tipo do sistema de arquivos de um caminho (via /proc/mounts) ou None"""
+    try:
+        with open("/proc/mounts", "r", encoding="utf-8") as f:
+            mounts = [line.split()[1:3] for line in f if len(line.split()) > 2]
+    except OSError:
+        return None
+    path = os.path.realpath(path)
+    best, fs_type = "", None
+    for mount_point, mount_type in mounts:
+        mount_point = mount_point.replace("\\040", " ")
+        inside = path == mount_point or path.startswith(mount_point.rstrip("/") + "/")
+        if inside and len(mount_point) >= len(best):
+            best, fs_type = mount_point, mount_type
+    return fs_type
+
+
+class InotifyWatcher:
+    """
+    Observa pastas com inotify (via ctypes) e informa quais arquivos delas
+    foram alterados, criados, movidos ou removidos
+    """
+    
+    def __init__(self):
         """
-        Inicializa o monitor de logs
+        Raises:
+            OSError: inotify indisponível neste sistema
+        """
+        if not INOTIFY_AVAILABLE:
+            raise OSError(errno.ENOSYS, "inotify não disponível neste sistema")
+        self.fd = _libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 falhou")
+        self.watches = {}
+    
+    def add_directory(self, directory):
+        """Observa os arquivos de uma pasta"""
+        directory = Path(directory).absolute()
+        wd = _libc.inotify_add_watch(self.fd, os.fsencode(str(directory)), WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, f"inotify_add_watch falhou em {directory}: {os.strerror(err)}")
+        self.watches[wd] = directory
+    
+    def read(self, timeout):
+        """
+        Espera eventos por até timeout segundos
         
+        Returns:
+            (conjunto de caminhos alterados, True se a fila do kernel
+            transbordou e eventos foram perdidos)
+        """
+        changed = set()
+        overflow = False
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return changed, overflow
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+                name = os.fsdecode(data[offset + INOTIFY_EVENT.size:
+                                        offset + INOTIFY_EVENT.size + length].rstrip(b"\0"))
+                offset += INOTIFY_EVENT.size + length
+                if mask & IN_Q_OVERFLOW:
+                    overflow = True
+                    continue
+                if mask & IN_IGNORED:
+                    self.watches.pop(wd, None)
+                    continue
+                directory = self.watches.get(wd)
+                if directory is not None and name:
+                    changed.add(directory / name)
+        return changed, overflow
+    
+    def close(self):
+        """Fecha o descritor do inotify (e todas as watches)"""
+        os.close(self.fd)
+
+
+class _OpenLog:
+    """Arquivo de log aberto e a posição logo após a última linha completa lida"""
+    
+    def __init__(self, f, position=0):
+        self.file = f
+        stat = os.fstat(f.fileno())
+        self.identity = (stat.st_dev, stat.st_ino)
+        self.position = position
+        self.partial = b""
+        self.last_data = time.time()
+        f.seek(position)
+    
+    def read_lines(self):
+        """Lê as linhas completas acrescentadas desde a última leitura"""
+        lines = []
+        while True:
+            data = self.file.read(READ_SIZE)
+            if not data:
+                break
+            self.last_data = time.time()
+            data = self.partial + data
+            end = data.rfind(b"\n") + 1
+            self.partial = data[end:]
+            if end:
+                lines.extend(_decode_line(line) for line in data[:end - 1].split(b"\n"))
+                self.position += end
+        return lines
+    
+    def truncated(self):
+        """Verifica se o arquivo ficou menor do que o que já foi lido"""
+        return os.fstat(self.file.fileno()).st_size < self.position + len(self.partial)
+    
+    def seek(self, position):
+        """Volta a ler a partir de uma posição (em bytes)"""
+        self.position = position
+        self.partial = b""
+        self.file.seek(position)
+    
+    def fingerprint(self, size=None):
+        """CRC32 dos primeiros bytes (até 4 KB), para reconhecer o arquivo numa retomada"""
+        size = min(FINGERPRINT_SIZE, self.position if size is None else size)
+        offset = self.file.tell()
+        self.file.seek(0)
+        data = self.file.read(size)
+        self.file.seek(offset)
+        return zlib.crc32(data), len(data)
+    
+    def close(self):
+        """Fecha o arquivo e retorna a última linha sem quebra (se houver)"""
+        self.file.close()
+        return [_decode_line(self.partial)] if self.partial else []
+
+
+def _decode_line(data):
+    """Converte uma linha lida em bytes para texto"""
+    return data.decode('utf-8', errors='ignore').rstrip('\r')
+
+
+class LogTailer:
+    """
+    Acompanha um arquivo de log mantendo-o aberto: cada leitura pega só o
+    que foi acrescentado desde a anterior e entrega apenas linhas completas
+    (uma linha ainda sem quebra fica guardada até ser terminada)
+    
+    O arquivo é identificado pelo dispositivo e inode. Se o caminho passa a
+    apontar para outro arquivo (rotação), o antigo continua aberto e é lido
+    até ficar rotate_grace segundos sem receber dados, e só então as linhas
+    do novo são entregues; se o arquivo fica menor que a posição lida
+    (truncamento, como no copytruncate), a leitura recomeça do início.
+    """
+    
+    def __init__(self, path, position=0, rotate_grace=ROTATE_GRACE):
+        """
+        Args:
+            path: Caminho do arquivo de log
+            position: Posição (em bytes) a partir da qual ler
+            rotate_grace: Segundos sem dados para encerrar um arquivo rotacionado
+        """
+        self.path = Path(path)
+        self.rotate_grace = rotate_grace
+        self.rotations = 0
+        self.truncations = 0
+        self._start = position
+        self._current = None
+        self._rotated = deque()
+    
+    @property
+    def position(self):
+        """Posição (em bytes) logo após a última linha lida do arquivo atual"""
+        return self._current.position if self._current is not None else self._start
+    
+    @property
+    def draining(self):
+        """True enquanto um arquivo rotacionado ainda está sendo lido"""
+        return bool(self._rotated)
+    
+    def seek(self, position):
+        """Volta a ler o arquivo atual a partir de uma posição (em bytes)"""
+        if self._current is not None:
+            self._current.seek(position)
+        else:
+            self._start = position
+    
+    def _open_current(self):
+        """Abre o arquivo do caminho; retorna False se ele não existe"""
+        if self._current is None:
+            try:
+                f = open(self.path, 'rb')
+            except FileNotFoundError:
+                return False
+            self._current = _OpenLog(f, self._start)
+            self._start = 0
+        return True
+    
+    def read_lines(self):
+        """Lê as linhas completas acrescentadas desde a última leitura, em ordem"""
+        lines = []
+        # Arquivos rotacionados terminam de ser lidos antes do atual
+        while self._rotated:
+            old = self._rotated[0]
+            lines.extend(old.read_lines())
+            if time.time() - old.last_data < self.rotate_grace:
+                return lines
+            lines.extend(old.close())
+            self._rotated.popleft()
+        
+        if not self._open_current():
+            return lines
+        lines.extend(self._current.read_lines())
+        if self._current.truncated():
+            self.truncations += 1
+            self._current.seek(0)
+            lines.extend(self._current.read_lines())
+        
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            # Renomeado e o novo ainda não foi criado: segue no aberto
+            return lines
+        if (stat.st_dev, stat.st_ino) != self._current.identity:
+            self.rotations += 1
+            self._rotated.append(self._current)
+            self._current = None
+            if self.rotate_grace <= 0:
+                lines.extend(self.read_lines())
+        return lines
+    
+    def checkpoint(self):
+        """
+        Estado para retomar a leitura: o arquivo mais antigo ainda não lido
+        até o fim e a posição dentro dele
+        """
+        log = self._rotated[0] if self._rotated else self._current
+        if log is None:
+            return {"log_file": str(self.path), "position": self._start}
+        checksum, size = log.fingerprint()
+        return {
+            "log_file": str(self.path),
+            "device": log.identity[0],
+            "inode": log.identity[1],
+            "position": log.position,
+            "fingerprint": checksum,
+            "fingerprint_size": size,
+        }
+    
+    def _rotated_siblings(self, exclude=()):
+        """
+        O log e os arquivos rotacionados dele na mesma pasta: o próprio nome
+        ou o nome seguido de "." e um número ou data (app.log.1,
+        app.log.2025-01-15); comprimidos e arquivos auxiliares ficam de fora
+        """
+        exclude = {Path(path).absolute() for path in exclude}
+        prefix = self.path.name + "."
+        try:
+            entries = list(self.path.parent.iterdir())
+        except OSError:
+            return []
+        siblings = []
+        for candidate in entries:
+            name = candidate.name
+            if name != self.path.name and not (name.startswith(prefix)
+                                                and ROTATED_SUFFIX_RE.fullmatch(name[len(prefix):])):
+                continue
+            if candidate.suffix in SIDECAR_SUFFIXES or candidate.absolute() in exclude:
+                continue
+            siblings.append(candidate)
+        return siblings
+    
+    def restore(self, checkpoint, exclude=()):
+        """
+        Retoma a leitura de um checkpoint: no mesmo arquivo, se ele ainda é o
+        do caminho, ou no arquivo rotacionado com o mesmo inode (que é lido
+        até o fim antes do atual)
+        
+        Args:
+            checkpoint: Estado retornado por checkpoint()
+            exclude: Caminhos que nunca são lidos como logs (ex: o próprio
+                arquivo do checkpoint)
+        
+        Returns:
+            True se a posição foi retomada, False se a leitura recomeça do início
+        """
+        identity = (checkpoint.get("device"), checkpoint.get("inode"))
+        position = checkpoint.get("position", 0)
+        if identity == (None, None):
+            self.seek(position)
+            return True
+        
+        rotated = []
+        for candidate in self._rotated_siblings(exclude):
+            try:
+                stat = os.stat(candidate)
+            except OSError:
+                continue
+            if candidate.is_file():
+                rotated.append((stat.st_mtime, candidate, stat))
+        rotated.sort()
+        for i, (_, candidate, stat) in enumerate(rotated):
+            if (stat.st_dev, stat.st_ino) != identity or stat.st_size < position:
+                continue
+            log = _OpenLog(open(candidate, 'rb'), position)
+            if log.fingerprint(checkpoint.get("fingerprint_size", 0))[0] != checkpoint.get("fingerprint"):
+                # Inode reaproveitado por outro arquivo
+                log.close()
+                continue
+            if candidate == self.path:
+                self._current = log
+                return True
+            # Rotações feitas com o monitor parado: os arquivos mais novos que
+            # o do checkpoint também são lidos, do mais antigo ao mais recente
+            self._rotated.append(log)
+            for _, newer, _ in rotated[i + 1:]:
+                if newer != self.path:
+                    self._rotated.append(_OpenLog(open(newer, 'rb')))
+            return True
+        return False
+    
+    def close(self):
+        """Fecha os arquivos abertos"""
+        for log in self._rotated:
+            log.close()
+        self._rotated.clear()
+        if self._current is not None:
+            self._current.close()
+            self._current = None
+
+
+def _parse_timestamp(line):
+    """Timestamp no início da linha como "AAAA-MM-DD HH:MM:SS" (ou None)"""
+    match = TIMESTAMP_RE.search(line, 0, 64)
+    return f"{match.group(1)} {match.group(2)}" if match else None
+
+
+def _last_timestamp(data):
+    """Timestamp da última linha de data (bytes de linhas completas) que tem um (ou None)"""
+    end = len(data)
+    while end > 0:
+        start = data.rfind(b"\n", 0, end - 1) + 1
+        timestamp = _parse_timestamp(_decode_line(data[start:min(end, start + 64)]))
+        if timestamp is not None:
+            return timestamp
+        end = start
+    return None
+
+
+def _timestamp_key(value):
+    """Converte datetime ou texto ISO ("2025-01-15", "2025-01-15 10:00") para o formato do índice"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.strip())
+    return value.strftime("%Y-%m-%d %H:%M:%S")
+
+
+class LogIndex:
+    """
+    Índice esparso de um log, mantido ao lado dele em <log>.idx (JSON)
+    
+    A cada step bytes há um checkpoint no início de uma linha com o número
+    da linha, a posição em bytes e o timestamp em vigor (o da linha ou o da
+    última linha com timestamp antes dela). Buscas por trecho de linhas ou janela de tempo
+    começam no checkpoint mais próximo em vez do início do arquivo. O índice
+    guarda o inode e um CRC dos primeiros bytes: enquanto o log só cresce,
+    cada atualização lê apenas o que foi acrescentado; se ele é rotacionado
+    ou truncado, o índice é refeito.
+    """
+    
+    def __init__(self, log_file, index_file=None, step=INDEX_STEP):
+        """
         Args:
             log_file: Caminho do arquivo de log
-            buffer_size: Tamanho do buffer de linhas
+            index_file: Arquivo do índice (padrão: <log>.idx)
+            step: Bytes entre checkpoints
         """
         self.log_file = Path(log_file)
-        self.buffer_size = buffer_size
-        self.last_position = 0
+        self.index_file = Path(index_file) if index_file else self.log_file.with_name(self.log_file.name + ".idx")
+        self.step = step
+        self._reset(None, (0, 0))
+        self.load()
+    
+    def _reset(self, identity, fingerprint):
+        """Esvazia o índice (arquivo novo, rotacionado ou truncado)"""
+        self.identity = identity
+        self.fingerprint = fingerprint
+        self.lines = 0
+        self.bytes = 0
+        self.checkpoints = []
+        # Timestamp da última linha indexada que tem um
+        self.timestamp = None
+    
+    def load(self):
+        """Carrega o índice salvo (um índice ilegível é ignorado e refeito)"""
+        try:
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("step") != self.step or "timestamp" not in data:
+            return
+        self.identity = (data["device"], data["inode"])
+        self.fingerprint = (data["fingerprint"], data["fingerprint_size"])
+        self.lines = data["lines"]
+        self.bytes = data["bytes"]
+        self.checkpoints = data["checkpoints"]
+        self.timestamp = data["timestamp"]
+    
+    def save(self):
+        """Grava o índice de forma atômica (arquivo temporário + os.replace)"""
+        temp = self.index_file.with_name(self.index_file.name + ".tmp")
+        with open(temp, 'w', encoding='utf-8') as f:
+            json.dump({
+                "log_file": str(self.log_file),
+                "device": self.identity[0],
+                "inode": self.identity[1],
+                "fingerprint": self.fingerprint[0],
+                "fingerprint_size": self.fingerprint[1],
+                "step": self.step,
+                "lines": self.lines,
+                "bytes": self.bytes,
+                "checkpoints": self.checkpoints,
+                "timestamp": self.timestamp,
+            }, f)
+        os.replace(temp, self.index_file)
+    
+    def update(self):
+        """
+        Indexa as linhas completas acrescentadas desde a última atualização
+        e salva o índice
+        
+        Returns:
+            True se o índice mudou
+        """
+        with open(self.log_file, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            identity = (stat.st_dev, stat.st_ino)
+            if (identity != self.identity or stat.st_size < self.bytes
+                    or zlib.crc32(f.read(self.fingerprint[1])) != self.fingerprint[0]):
+                self._reset(identity, (0, 0))
+            if stat.st_size == self.bytes:
+                return False
+            
+            f.seek(self.bytes)
+            pending = b""
+            while True:
+                data = f.read(self.step)
+                if not data:
+                    break
+                data = pending + data
+                end = data.rfind(b"\n") + 1
+                pending = data[end:]
+                if not end:
+                    # Linha maior que o bloco: continua no próximo
+                    continue
+                # O bloco começa no início de uma linha
+                timestamp = _parse_timestamp(_decode_line(data[:64].split(b"\n", 1)[0]))
+                self.checkpoints.append([self.lines + 1, self.bytes, timestamp or self.timestamp])
+                self.timestamp = _last_timestamp(data[:end]) or self.timestamp
+                self.lines += data.count(b"\n", 0, end)
+                self.bytes += end
+            
+            if self.fingerprint[1] < FINGERPRINT_SIZE:
+                f.seek(0)
+                data = f.read(min(FINGERPRINT_SIZE, self.bytes))
+                self.fingerprint = (zlib.crc32(data), len(data))
+        try:
+            self.save()
+        except OSError as e:
+            print(f"⚠️  Índice não salvo ({e}): será refeito na próxima execução")
+        return True
+    
+    def locate(self, line=None, since=None):
+        """
+        Checkpoint mais adiantado que ainda vem antes da linha line e do
+        instante since (texto "AAAA-MM-DD HH:MM:SS")
+        
+        Returns:
+            (número da linha, posição em bytes, timestamp em vigor ou None)
+        """
+        best = 0
+        if line is not None:
+            best = max(best, bisect.bisect_right([cp[0] for cp in self.checkpoints], line) - 1)
+        if since is not None:
+            # Linhas antes de um checkpoint com timestamp < since são mais antigas que since
+            timestamps = [cp[2] or "" for cp in self.checkpoints]
+            best = max(best, bisect.bisect_left(timestamps, since) - 1)
+        if best < 0 or not self.checkpoints:
+            return 1, 0, None
+        return tuple(self.checkpoints[best])
+
+
+def _flatten(items):
+    """Desfaz grupos que não mudam flags: o conteúdo deles é sequencial"""
+    for op, av in items:
+        if op == sre_parse.SUBPATTERN and not av[1] and not av[2]:
+            yield from _flatten(av[3])
+        elif op == getattr(sre_parse, "ATOMIC_GROUP", None):
+            yield from _flatten(av)
+        else:
+            yield op, av
+
+
+def _literal_runs(items, runs):
+    """Acrescenta a runs os trechos literais obrigatórios de uma sequência"""
+    repeats = {sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT,
+               getattr(sre_parse, "POSSESSIVE_REPEAT", None)}
+    current = []
+    for op, av in _flatten(items):
+        if op == sre_parse.LITERAL:
+            current.append(chr(av))
+            continue
+        if op == sre_parse.AT:
+            # Âncoras (^, $, \b) não consomem caracteres
+            continue
+        runs.append("".join(current))
+        current = []
+        if op in repeats and av[0] >= 1:
+            _literal_runs(av[2], runs)
+    runs.append("".join(current))
+
+
+def required_literal(regex):
+    """
+    Maior trecho literal que toda correspondência da regex contém
+    
+    Returns:
+        O literal ou None (ex: alternativas no nível principal ou só
+        classes de caracteres)
+    """
+    if sre_parse is None or not isinstance(regex.pattern, str):
+        return None
+    try:
+        parsed = sre_parse.parse(regex.pattern, regex.flags)
+    except (re.error, TypeError, ValueError):
+        return None
+    runs = []
+    _literal_runs(parsed, runs)
+    literal = max(runs, key=len)
+    return literal if literal and "\n" not in literal else None
+
+
+def _trie_pattern(literals):
+    """
+    Regex que casa com qualquer um dos literais, montada como uma árvore de
+    prefixos ("erro|error|warn" vira "(?:erro|warn)"): cada posição do texto
+    testa um caractere por nível, e não todos os literais
+    
+    Basta achar algum literal, então um literal que é prefixo de outro
+    torna o mais longo desnecessário.
+    """
+    trie = {}
+    for literal in literals:
+        node = trie
+        for char in literal:
+            if node.get("") is True:
+                break
+            node = node.setdefault(char, {})
+        else:
+            node.clear()
+            node[""] = True
+    
+    def build(node):
+        prefix = ""
+        while len(node) == 1 and "" not in node:
+            # Trecho sem ramificações: concatena sem recursão
+            (char, node), = node.items()
+            prefix += re.escape(char)
+        if "" in node:
+            return prefix
+        single = []
+        branches = []
+        for char, child in sorted(node.items()):
+            rest = build(child)
+            if rest:
+                branches.append(re.escape(char) + rest)
+            else:
+                single.append(char)
+        if len(single) == 1:
+            branches.append(re.escape(single[0]))
+        elif single:
+            branches.append("[" + "".join(re.escape(char) for char in single) + "]")
+        return prefix + (branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")")
+    
+    return build(trie)
+
+
+class PatternEngine:
+    """
+    Casa muitas regexes com um lote de linhas em uma única passada
+    
+    De cada regex é extraído o literal que toda correspondência precisa
+    conter. Uma só regex com a alternância de todos os literais percorre o
+    lote inteiro (em C) e aponta as linhas candidatas: as demais são
+    descartadas sem rodar nenhuma regex. Numa linha candidata, cada regex só
+    roda se o seu literal estiver nela. Regexes iguais (mesmo texto e flags)
+    rodam uma vez, e regexes sem literal obrigatório rodam em todas as linhas.
+    """
+    
+    def __init__(self):
+        self._rules = []
+        self._compiled = False
+    
+    def add(self, key, regex):
+        """
+        Registra uma regex
+        
+        Args:
+            key: Identificador devolvido quando a regex casa
+            regex: Regex compilada ou string
+        """
+        if isinstance(regex, str):
+            regex = re.compile(regex)
+        self._rules.append((key, regex))
+        self._compiled = False
+    
+    def _compile(self):
+        """Agrupa as regexes repetidas e monta o pré-filtro de literais"""
+        groups = {}
+        for order, (key, regex) in enumerate(self._rules):
+            group = groups.setdefault((regex.pattern, regex.flags), (regex, []))
+            group[1].append((order, key))
+        
+        by_literal = {}
+        self._always = []
+        for regex, keys in groups.values():
+            literal = required_literal(regex)
+            if literal is None:
+                self._always.append((regex, keys))
+                continue
+            # Sem diferenciar maiúsculas, o literal segue as regras de caixa da regex
+            case_flags = regex.flags & (re.IGNORECASE | re.ASCII) if regex.flags & re.IGNORECASE else 0
+            by_literal.setdefault((literal, case_flags), []).append((regex, keys))
+        
+        self._literals = []
+        by_case = {}
+        for (literal, case_flags), regexes in by_literal.items():
+            if case_flags:
+                flags = "a" if case_flags & re.ASCII else ""
+                search = re.compile(f"(?{flags}i:{re.escape(literal)})").search
+                self._literals.append((None, search, regexes))
+            else:
+                self._literals.append((literal, None, regexes))
+            by_case.setdefault(case_flags, []).append(literal)
+        
+        alternatives = []
+        for case_flags, literals in by_case.items():
+            pattern = _trie_pattern(literals)
+            if case_flags:
+                pattern = f"(?{'a' if case_flags & re.ASCII else ''}i:{pattern})"
+            alternatives.append(pattern)
+        self._prefilter = re.compile("|".join(alternatives)) if alternatives else None
+        self._compiled = True
+    
+    def _candidates(self, lines):
+        """Índices das linhas que contêm algum literal, numa passada pelo lote"""
+        if self._prefilter is None:
+            return []
+        search = self._prefilter.search
+        text = "\n".join(lines)
+        if text.count("\n") != len(lines) - 1:
+            # Linhas com quebras internas: verifica uma a uma
+            return [i for i, line in enumerate(lines) if search(line)]
+        
+        candidates = []
+        index = 0
+        position = 0
+        match = search(text)
+        while match:
+            index += text.count("\n", position, match.start())
+            candidates.append(index)
+            # O resto da linha já não importa: continua na próxima
+            position = text.find("\n", match.start()) + 1
+            if not position:
+                break
+            index += 1
+            match = search(text, position)
+        return candidates
+    
+    def scan(self, lines):
+        """
+        Casa as regexes com um lote de linhas
+        
+        Returns:
+            Lista de (índice da linha, chaves das regexes que casaram na
+            ordem em que foram registradas), só para as linhas com alguma
+            correspondência
+        """
+        if not self._compiled:
+            self._compile()
+        candidates = self._candidates(lines)
+        if self._always:
+            candidate_set = set(candidates)
+            candidates = range(len(lines))
+        else:
+            candidate_set = None
+        
+        results = []
+        for index in candidates:
+            line = lines[index]
+            matched = []
+            if candidate_set is None or index in candidate_set:
+                for literal, search, regexes in self._literals:
+                    if (literal in line) if search is None else search(line):
+                        for regex, keys in regexes:
+                            if regex.search(line):
+                                matched.extend(keys)
+            for regex, keys in self._always:
+                if regex.search(line):
+                    matched.extend(keys)
+            if matched:
+                matched.sort(key=lambda item: item[0])
+                results.append((index, [key for _, key in matched]))
+        return results
+
+
+def _bytes_prefilter(regex):
+    """
+    Regex de bytes do literal obrigatório da regex em UTF-8: toda linha em
+    que a regex casa o contém (None se não há literal utilizável)
+    """
+    literal = required_literal(regex)
+    if literal is None:
+        return None
+    if not regex.flags & re.IGNORECASE:
+        return re.compile(re.escape(literal.encode('utf-8')))
+    if not all(ord(char) < 128 for char in literal):
+        # Sem diferenciar maiúsculas, só letras ASCII têm equivalentes previsíveis em bytes
+        return None
+    parts = []
+    for char in literal:
+        aliases = "" if regex.flags & re.ASCII else UNICODE_CASE_ALIASES.get(char.lower(), "")
+        escaped = re.escape(char.encode())
+        if aliases:
+            escaped = b"(?:" + b"|".join([escaped] + [a.encode('utf-8') for a in aliases]) + b")"
+        parts.append(escaped)
+    return re.compile(b"".join(parts), re.IGNORECASE)
+
+
+def _search_chunk(log_file, regex, start, end, max_results):
+    """
+    Busca a regex no trecho [start, end) do log, alinhado a quebras de linha
+    (executada nos processos de LogMonitor.search_log com workers)
+    
+    O trecho é lido do arquivo mapeado em memória. Se a regex tem um literal
+    obrigatório, ele é procurado em bytes e só as linhas que o contêm são
+    decodificadas e verificadas com a regex.
+    
+    Returns:
+        (lista de (índice da linha no trecho, conteúdo), quantidade de
+        quebras de linha no trecho; a contagem só é completa se menos de
+        max_results linhas foram encontradas)
+    """
+    with open(log_file, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        block = mm[start:end]
+    matches = []
+    prefilter = _bytes_prefilter(regex)
+    if prefilter is None:
+        # A quebra final do trecho não inicia uma linha (nem o fim do arquivo)
+        lines = block[:-1] if block.endswith(b"\n") else block
+        for index, data in enumerate(lines.split(b"\n")):
+            line = _decode_line(data)
+            if regex.search(line):
+                matches.append((index, line))
+                if len(matches) >= max_results:
+                    break
+        return matches, block.count(b"\n")
+    
+    index = 0
+    counted = 0
+    match = prefilter.search(block)
+    while match:
+        line_start = block.rfind(b"\n", 0, match.start()) + 1
+        line_end = block.find(b"\n", match.start())
+        if line_end < 0:
+            line_end = len(block)
+        index += block.count(b"\n", counted, line_start)
+        counted = line_start
+        line = _decode_line(block[line_start:line_end])
+        if regex.search(line):
+            matches.append((index, line))
+            if len(matches) >= max_results:
+                break
+        match = prefilter.search(block, line_end + 1)
+    return matches, block.count(b"\n")
+
+
+def _match_record(match):
+    """Converte uma ocorrência guardada (instante, linha, arquivo) em dicionário"""
+    timestamp, line, source = match
+    record = {
+        'timestamp': datetime.fromtimestamp(timestamp).isoformat(),
+        'line': line
+    }
+    if source is not None:
+        record['file'] = str(source)
+    return record
+
+
+def _isoformat(timestamp):
+    """Instante (time.time()) em ISO 8601, ou None"""
+    return datetime.fromtimestamp(timestamp).isoformat() if timestamp is not None else None
+
+
+class PatternRegistry:
+    """
+    Padrões e alertas registrados, verificados em lotes de linhas por um
+    único PatternEngine (compartilhado por todos os arquivos monitorados)
+    """
+    
+    def __init__(self):
         self.patterns = {}
         self.alerts = []
-        self.line_buffer = deque(maxlen=buffer_size)
-        
-        if not self.log_file.exists():
-            print(f"⚠️  Arquivo não encontrado: {log_file}")
-            print("Criando arquivo...")
-            self.log_file.touch()
+        self._engine = None
     
-    def add_pattern(self, name, pattern, action=None):
+    def add_pattern(self, name, pattern, action=None, max_matches=MAX_MATCHES):
         """
         Adiciona um padrão para monitorar
         
@@ -41,13 +943,21 @@ class LogMonitor:
             name: Nome do padrão
             pattern: Regex pattern ou string simples
             action: Função a executar quando encontrado (opcional)
+            max_matches: Ocorrências guardadas em memória (as mais antigas
+                são descartadas; count continua contando todas)
         """
         self.patterns[name] = {
             'pattern': re.compile(pattern) if isinstance(pattern, str) else pattern,
             'action': action,
             'count': 0,
-            'matches': []
+            'first_seen': None,
+            'last_seen': None,
+            'spilled': 0,
+            # Tuplas (instante, linha, arquivo) em um buffer circular; uso
+            # interno, as ocorrências são lidas por get_matches()
+            '_matches': deque(maxlen=max_matches)
         }
+        self._engine = None
     
     def add_alert(self, name, pattern, threshold=1):
         """
@@ -64,73 +974,271 @@ class LogMonitor:
             'threshold': threshold,
             'count': 0
         })
+        self._engine = None
+    
+    @property
+    def engine(self):
+        """PatternEngine com todos os padrões e alertas (recriado quando mudam)"""
+        if self._engine is None:
+            self._engine = PatternEngine()
+            for name, pattern_info in self.patterns.items():
+                self._engine.add(("pattern", name), pattern_info['pattern'])
+            for index, alert in enumerate(self.alerts):
+                self._engine.add(("alert", index), alert['pattern'])
+        return self._engine
+    
+    def process_lines(self, lines, patterns=True, alerts=True, source=None):
+        """
+        Verifica padrões e alertas nas linhas em uma única passada do
+        PatternEngine (linhas sem nenhum literal dos padrões são descartadas
+        sem rodar as regexes)
+        
+        Args:
+            lines: Linhas a verificar
+            patterns: Registra as ocorrências dos padrões
+            alerts: Conta as ocorrências dos alertas
+            source: Arquivo de origem das linhas (registrado nas ocorrências)
+        """
+        for index, keys in self.engine.scan(lines):
+            line = lines[index]
+            for kind, key in keys:
+                if kind == "pattern" and patterns:
+                    self._record_match(self.patterns[key], line, source)
+                elif kind == "alert" and alerts:
+                    self._count_alert(self.alerts[key])
+    
+    def _record_match(self, pattern_info, line, source=None):
+        """Registra uma ocorrência de padrão"""
+        now = time.time()
+        pattern_info['count'] += 1
+        if pattern_info['first_seen'] is None:
+            pattern_info['first_seen'] = now
+        pattern_info['last_seen'] = now
+        pattern_info['_matches'].append((now, line, source))
+        
+        # Executa ação se definida
+        if pattern_info['action']:
+            pattern_info['action'](line)
+    
+    def get_matches(self, name, n=None):
+        """
+        Ocorrências guardadas de um padrão, da mais antiga à mais recente
+        
+        Args:
+            name: Nome do padrão
+            n: Só as n mais recentes (None = todas as guardadas)
+        
+        Returns:
+            Lista de dicionários {'timestamp', 'line'} (mais 'file' quando a
+            linha veio de um MultiLogMonitor)
+        """
+        matches = self.patterns[name]['_matches']
+        if n is not None:
+            matches = reversed(list(itertools.islice(reversed(matches), n)))
+        return [_match_record(match) for match in matches]
+    
+    def pattern_statistics(self, name):
+        """Contadores de um padrão: total, primeira/última ocorrência e destino das ocorrências"""
+        pattern_info = self.patterns[name]
+        stored = len(pattern_info['_matches'])
+        return {
+            'count': pattern_info['count'],
+            'first_seen': _isoformat(pattern_info['first_seen']),
+            'last_seen': _isoformat(pattern_info['last_seen']),
+            'stored': stored,
+            'spilled': pattern_info['spilled'],
+            'discarded': pattern_info['count'] - stored - pattern_info['spilled']
+        }
+    
+    def spill_matches(self, spill_file, keep=10):
+        """
+        Move para um segmento comprimido as ocorrências guardadas de todos os
+        padrões, menos as keep mais recentes de cada um
+        
+        O segmento é um JSON Lines com gzip; cada chamada acrescenta um novo
+        membro gzip ao arquivo (gzip.open lê todos em sequência).
+        
+        Returns:
+            Quantidade de ocorrências gravadas
+        """
+        spilled = 0
+        with gzip.open(spill_file, 'at', encoding='utf-8') as f:
+            for name, pattern_info in self.patterns.items():
+                matches = pattern_info['_matches']
+                while len(matches) > keep:
+                    record = {'pattern': name}
+                    record.update(_match_record(matches[0]))
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    matches.popleft()
+                    pattern_info['spilled'] += 1
+                    spilled += 1
+        return spilled
+    
+    def _count_alert(self, alert):
+        """Conta uma ocorrência de alerta e dispara ao atingir o limite"""
+        alert['count'] += 1
+        
+        if alert['count'] >= alert['threshold']:
+            print(f"🚨 ALERTA: {alert['name']} - {alert['count']} ocorrências!")
+            alert['count'] = 0  # Reset contador
+    
+    def check_patterns(self, lines):
+        """Verifica padrões nas linhas"""
+        self.process_lines(lines, alerts=False)
+    
+    def check_alerts(self, lines):
+        """Verifica alertas"""
+        self.process_lines(lines, patterns=False)
+    
+    def show_statistics(self):
+        """Mostra estatísticas dos padrões encontrados"""
+        if not self.patterns:
+            return
+        
+        print("\n📊 Estatísticas de Padrões:")
+        print("-" * 50)
+        for name, pattern_info in self.patterns.items():
+            print(f"  {name}: {pattern_info['count']} ocorrências")
+
+
+class LogMonitor(PatternRegistry):
+    def __init__(self, log_file, buffer_size=100, checkpoint_file=None):
+        """
+        Inicializa o monitor de logs
+        
+        Args:
+            log_file: Caminho do arquivo de log
+            buffer_size: Tamanho do buffer de linhas
+            checkpoint_file: JSON onde a posição de leitura é salva (opcional);
+                se existir, a leitura continua de onde parou
+        """
+        super().__init__()
+        self.log_file = Path(log_file)
+        self.buffer_size = buffer_size
+        self.tailer = LogTailer(self.log_file)
+        self.checkpoint_file = Path(checkpoint_file) if checkpoint_file else None
+        self._index = None
+        self.line_buffer = deque(maxlen=buffer_size)
+        
+        if not self.log_file.exists():
+            print(f"⚠️  Arquivo não encontrado: {log_file}")
+            print("Criando arquivo...")
+            self.log_file.touch()
+        
+        if self.checkpoint_file and self.checkpoint_file.exists():
+            self.load_checkpoint()
+    
+    @property
+    def last_position(self):
+        """Posição (em bytes) logo após a última linha lida"""
+        return self.tailer.position
+    
+    @last_position.setter
+    def last_position(self, position):
+        self.tailer.seek(position)
+    
+    def load_checkpoint(self):
+        """Retoma a leitura da posição salva em checkpoint_file"""
+        try:
+            with open(self.checkpoint_file, 'r', encoding='utf-8') as f:
+                checkpoint = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️  Checkpoint ignorado: {e}")
+            return
+        if self.tailer.restore(checkpoint, exclude=[self.checkpoint_file]):
+            print(f"↩️  Retomando a leitura do byte {checkpoint['position']}")
+        else:
+            print("⚠️  Arquivo do checkpoint não encontrado: lendo o log desde o início")
+    
+    def save_checkpoint(self):
+        """
+        Salva a posição de leitura em checkpoint_file de forma atômica
+        (arquivo temporário + os.replace): um checkpoint nunca fica pela metade
+        """
+        if not self.checkpoint_file:
+            return
+        temp = self.checkpoint_file.with_name(self.checkpoint_file.name + ".tmp")
+        with open(temp, 'w', encoding='utf-8') as f:
+            json.dump(self.tailer.checkpoint(), f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp, self.checkpoint_file)
     
     def read_new_lines(self):
-        """Lê novas linhas do arquivo de log"""
+        """Lê novas linhas do arquivo de log (que fica aberto entre as leituras)"""
+        rotations, truncations = self.tailer.rotations, self.tailer.truncations
         try:
-            with open(self.log_file, 'r', encoding='utf-8', errors='ignore') as f:
-                # Vai para a última posição conhecida
-                f.seek(self.last_position)
-                
-                new_lines = []
-                for line in f:
-                    new_lines.append(line.rstrip('\n\r'))
-                    self.line_buffer.append(line.rstrip('\n\r'))
-                
-                # Atualiza posição
-                self.last_position = f.tell()
-                
-                return new_lines
+            new_lines = self.tailer.read_lines()
         except Exception as e:
             print(f"❌ Erro ao ler log: {e}")
             return []
+        if self.tailer.rotations != rotations:
+            print("🔄 Log rotacionado: o arquivo anterior é lido até o fim antes do novo")
+        if self.tailer.truncations != truncations:
+            print("✂️  Log truncado: lendo desde o início")
+        self.line_buffer.extend(new_lines)
+        return new_lines
     
-    def check_patterns(self, lines):
-        """Verifica padrões nas linhas"""
-        for line in lines:
-            for name, pattern_info in self.patterns.items():
-                if pattern_info['pattern'].search(line):
-                    pattern_info['count'] += 1
-                    pattern_info['matches'].append({
-                        'timestamp': datetime.now().isoformat(),
-                        'line': line
-                    })
-                    
-                    # Executa ação se definida
-                    if pattern_info['action']:
-                        pattern_info['action'](line)
+    def _start_watcher(self):
+        """
+        Cria o watcher inotify da pasta do log, ou None quando é preciso
+        verificar o arquivo por polling (sem inotify ou em sistemas de
+        arquivos de rede)
+        """
+        if not INOTIFY_AVAILABLE or filesystem_type(self.log_file.parent) in POLL_FILESYSTEMS:
+            return None
+        try:
+            watcher = InotifyWatcher()
+        except OSError:
+            return None
+        try:
+            # A pasta (e não o arquivo) é observada: o log pode ser recriado
+            watcher.add_directory(self.log_file.parent)
+        except OSError:
+            watcher.close()
+            return None
+        return watcher
     
-    def check_alerts(self, lines):
-        """Verifica alertas"""
-        for line in lines:
-            for alert in self.alerts:
-                if alert['pattern'].search(line):
-                    alert['count'] += 1
-                    
-                    if alert['count'] >= alert['threshold']:
-                        print(f"🚨 ALERTA: {alert['name']} - {alert['count']} ocorrências!")
-                        alert['count'] = 0  # Reset contador
+    def _wait_for_changes(self, watcher, timeout):
+        """Espera o log ser alterado, por até timeout segundos"""
+        deadline = time.time() + timeout
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return False
+            changed, overflow = watcher.read(remaining)
+            if overflow or self.log_file.absolute() in changed:
+                return True
     
     def monitor(self, interval=1, duration=None):
         """
         Monitora o log continuamente
         
+        Com inotify, novas linhas são lidas assim que o log é alterado e
+        interval só define o ritmo das estatísticas e da checagem da
+        duração; sem inotify (ou em sistemas de arquivos de rede), o arquivo
+        é verificado a cada interval segundos.
+        
         Args:
             interval: Intervalo entre verificações (segundos)
             duration: Duração do monitoramento (None = infinito)
         """
+        watcher = self._start_watcher()
         print(f"👁️  Monitorando: {self.log_file}")
-        print(f"⏱️  Intervalo: {interval}s")
+        if watcher is not None:
+            print("⚡ Modo: eventos do inotify")
+        else:
+            print(f"⏱️  Intervalo: {interval}s (polling)")
         if duration:
             print(f"⏰ Duração: {duration}s")
         print("Pressione Ctrl+C para parar\n")
         
         start_time = time.time()
-        iteration = 0
+        last_statistics = start_time
+        last_checkpoint = start_time
         
         try:
             while True:
-                iteration += 1
                 new_lines = self.read_new_lines()
                 
                 if new_lines:
@@ -138,41 +1246,72 @@ class LogMonitor:
                     for line in new_lines:
                         print(f"  {line}")
                     
-                    # Verifica padrões
-                    self.check_patterns(new_lines)
-                    
-                    # Verifica alertas
-                    self.check_alerts(new_lines)
+                    # Verifica padrões e alertas
+                    self.process_lines(new_lines)
                 
                 # Mostra estatísticas periodicamente
-                if iteration % 10 == 0:
+                now = time.time()
+                if self.checkpoint_file and now - last_checkpoint >= CHECKPOINT_INTERVAL:
+                    self.save_checkpoint()
+                    last_checkpoint = now
+                if now - last_statistics >= 10 * interval:
                     self.show_statistics()
+                    last_statistics = now
                 
                 # Verifica duração
-                if duration and (time.time() - start_time) >= duration:
+                if duration and (now - start_time) >= duration:
                     print(f"\n⏱️  Tempo de monitoramento ({duration}s) concluído.")
                     break
                 
-                time.sleep(interval)
+                timeout = interval
+                if duration:
+                    timeout = min(timeout, start_time + duration - now)
+                if self.tailer.draining:
+                    # O arquivo rotacionado não tem mais o nome observado
+                    timeout = min(timeout, self.tailer.rotate_grace / 4)
+                if watcher is not None:
+                    self._wait_for_changes(watcher, timeout)
+                else:
+                    time.sleep(timeout)
                 
         except KeyboardInterrupt:
             print("\n\n⏹️  Monitoramento interrompido.")
             self.show_statistics()
+        finally:
+            if watcher is not None:
+                watcher.close()
+            self.save_checkpoint()
     
-    def show_statistics(self):
-        """Mostra estatísticas dos padrões encontrados"""
-        if not self.patterns:
-            return
-        
-        print("\n📊 Estatísticas de Padrões:")
-        print("-" * 50)
-        for name, pattern_info in self.patterns.items():
-            print(f"  {name}: {pattern_info['count']} ocorrências")
+    @property
+    def index(self):
+        """LogIndex do log (<log>.idx), usado nas buscas por trecho"""
+        if self._index is None:
+            self._index = LogIndex(self.log_file)
+        return self._index
     
-    def search_log(self, pattern, max_results=10):
-        """Busca padrão no log completo"""
-        matches = []
+    def search_log(self, pattern, max_results=10, start_line=None, end_line=None, since=None, until=None,
+                   workers=None):
+        """
+        Busca padrão no log completo ou num trecho dele
+        
+        Com start_line/end_line (inclusivos) ou since/until (datetime ou texto
+        ISO, como "2025-01-15 10:00"), o índice do log é atualizado só com o
+        que foi acrescentado e a leitura começa no checkpoint mais próximo do
+        trecho. A janela de tempo usa o timestamp de cada linha (linhas sem
+        timestamp herdam o da anterior) e supõe que eles não diminuem ao
+        longo do log.
+        
+        Com workers > 1, a busca no log completo é dividida entre processos:
+        o arquivo é mapeado em memória e separado em trechos alinhados a
+        quebras de linha, e os resultados voltam na ordem das linhas.
+        """
         pattern_re = re.compile(pattern) if isinstance(pattern, str) else pattern
+        if start_line is not None or end_line is not None or since is not None or until is not None:
+            return self._search_range(pattern_re, max_results, start_line, end_line,
+                                      _timestamp_key(since), _timestamp_key(until))
+        if workers and workers > 1:
+            return self._search_parallel(pattern_re, max_results, workers)
+        matches = []
         
         try:
             with open(self.log_file, 'r', encoding='utf-8', errors='ignore') as f:
@@ -189,23 +1328,105 @@ class LogMonitor:
         
         return matches
     
+    def _search_range(self, pattern_re, max_results, start_line, end_line, since, until):
+        """Busca num trecho de linhas e/ou janela de tempo a partir do checkpoint mais próximo"""
+        matches = []
+        try:
+            self.index.update()
+            line_num, position, current = self.index.locate(start_line, since)
+            with open(self.log_file, 'rb') as f:
+                f.seek(position)
+                for data in f:
+                    if end_line is not None and line_num > end_line:
+                        break
+                    line = _decode_line(data.rstrip(b"\n"))
+                    in_range = start_line is None or line_num >= start_line
+                    if since is not None or until is not None:
+                        current = _parse_timestamp(line) or current
+                        if until is not None and current is not None and current > until:
+                            break
+                        in_range = in_range and current is not None and (since is None or current >= since)
+                    if in_range and pattern_re.search(line):
+                        matches.append({
+                            'line_number': line_num,
+                            'content': line
+                        })
+                        if len(matches) >= max_results:
+                            break
+                    line_num += 1
+        except Exception as e:
+            print(f"❌ Erro ao buscar: {e}")
+        
+        return matches
+    
+    def _search_parallel(self, pattern_re, max_results, workers):
+        """
+        Busca no log completo com workers processos; para de esperar os
+        trechos seguintes (e cancela os que não começaram) assim que
+        max_results linhas são encontradas
+        """
+        matches = []
+        try:
+            with open(self.log_file, 'rb') as f:
+                size = os.fstat(f.fileno()).st_size
+                if not size:
+                    return matches
+                bounds = [0]
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    while bounds[-1] < size:
+                        newline = mm.find(b"\n", bounds[-1] + SEARCH_CHUNK_SIZE - 1)
+                        bounds.append(newline + 1 if newline >= 0 else size)
+            
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(_search_chunk, str(self.log_file), pattern_re, start, end, max_results)
+                           for start, end in zip(bounds, bounds[1:])]
+                try:
+                    line_base = 1
+                    for future in futures:
+                        found, lines = future.result()
+                        for index, line in found[:max_results - len(matches)]:
+                            matches.append({
+                                'line_number': line_base + index,
+                                'content': line
+                            })
+                        if len(matches) >= max_results:
+                            break
+                        line_base += lines
+                finally:
+                    for future in futures:
+                        future.cancel()
+        except Exception as e:
+            print(f"❌ Erro ao buscar: {e}")
+        
+        return matches
+    
     def get_recent_lines(self, n=10):
         """Retorna as últimas N linhas"""
         return list(self.line_buffer)[-n:]
     
-    def export_statistics(self, filename="log_statistics.json"):
-        """Exporta estatísticas para JSON"""
+    def export_statistics(self, filename="log_statistics.json", spill_file=None):
+        """
+        Exporta estatísticas para JSON
+        
+        Args:
+            filename: Arquivo JSON das estatísticas
+            spill_file: Segmento .jsonl.gz para onde vão as ocorrências
+                guardadas além das 10 mais recentes de cada padrão (opcional)
+        """
         stats = {
             'log_file': str(self.log_file),
             'timestamp': datetime.now().isoformat(),
             'patterns': {}
         }
         
-        for name, pattern_info in self.patterns.items():
-            stats['patterns'][name] = {
-                'count': pattern_info['count'],
-                'recent_matches': pattern_info['matches'][-10:]  # Últimas 10
-            }
+        if spill_file:
+            spilled = self.spill_matches(spill_file)
+            stats['spill_file'] = str(spill_file)
+            print(f"🗜️  {spilled} ocorrência(s) gravadas em: {spill_file}")
+        
+        for name in self.patterns:
+            stats['patterns'][name] = self.pattern_statistics(name)
+            stats['patterns'][name]['recent_matches'] = self.get_matches(name, 10)  # Últimas 10
         
         filepath = Path(filename)
         with open(filepath, 'w', encoding='utf-8') as f:
@@ -214,6 +1435,268 @@ class LogMonitor:
         print(f"✅ Estatísticas exportadas: {filepath}")
 
 
+def _glob_root(pattern):
+    """Pasta mais longa no início de um glob sem caracteres especiais"""
+    root = []
+    for part in Path(pattern).parts[:-1]:
+        if GLOB_MAGIC.search(part):
+            break
+        root.append(part)
+    return Path(*root) if root else Path(".")
+
+
+def _end_of_last_line(path):
+    """Posição logo após a última quebra de linha do arquivo (para ler só o que vier depois)"""
+    with open(path, 'rb') as f:
+        size = f.seek(0, os.SEEK_END)
+        start = max(0, size - 64 * 1024)
+        f.seek(start)
+        end = f.read().rfind(b"\n")
+    if end >= 0:
+        return start + end + 1
+    return 0 if start == 0 else size
+
+
+class MultiLogMonitor(PatternRegistry):
+    """
+    Monitora todos os arquivos que casam com um ou mais globs em um único
+    event loop do asyncio
+    
+    Cada arquivo tem um LogTailer (mantido aberto, seguindo rotação e
+    truncamento) e um só watcher inotify, registrado no event loop, observa
+    as pastas deles. Arquivos novos que casam com os globs são lidos desde o
+    início assim que aparecem numa pasta observada; os globs também são
+    reexpandidos a cada rescan_interval segundos. As linhas de todos os
+    arquivos passam pelo mesmo PatternEngine, e cada ocorrência registra o
+    arquivo de origem.
+    """
+    
+    def __init__(self, patterns, buffer_size=100, rescan_interval=RESCAN_INTERVAL, from_start=False):
+        """
+        Inicializa o monitor
+        
+        Args:
+            patterns: Glob ou lista de globs (ex: "/var/log/*/*.log"; "**"
+                inclui subpastas). Devem casar só com os nomes atuais dos
+                logs: arquivos rotacionados são lidos pelo LogTailer do atual
+            buffer_size: Tamanho do buffer de linhas recentes (de todos os arquivos)
+            rescan_interval: Segundos entre reexpansões dos globs
+            from_start: Lê também o conteúdo que os arquivos já têm ao iniciar
+                (por padrão, só as linhas acrescentadas depois)
+        """
+        super().__init__()
+        if isinstance(patterns, (str, os.PathLike)):
+            patterns = [patterns]
+        self.globs = [os.path.abspath(os.path.expanduser(str(p))) for p in patterns]
+        self.buffer_size = buffer_size
+        self.rescan_interval = rescan_interval
+        self.from_start = from_start
+        self.tailers = {}
+        self.line_buffer = deque(maxlen=buffer_size)
+        self._watcher = None
+        self._watched = set()
+        self._polled = set()
+        self._changed = set()
+        self._rescan = False
+        self._wakeup = None
+    
+    def _matches(self, path):
+        """Verifica se um caminho casa com algum dos globs"""
+        path = str(path)
+        return any(fnmatch.fnmatchcase(path, pattern) for pattern in self.globs)
+    
+    def _watch(self, directory):
+        """Observa uma pasta com inotify ou, se não der, verifica seus arquivos por polling"""
+        if directory in self._watched or directory in self._polled:
+            return
+        if self._watcher is not None and filesystem_type(directory) not in POLL_FILESYSTEMS:
+            try:
+                self._watcher.add_directory(directory)
+                self._watched.add(directory)
+                return
+            except OSError as e:
+                print(f"⚠️  Sem inotify em {directory} ({e.strerror}): verificando por polling")
+        self._polled.add(directory)
+    
+    def discover(self, initial=False):
+        """
+        Expande os globs e passa a acompanhar os arquivos novos
+        
+        Args:
+            initial: Arquivos encontrados na partida (lidos desde o início só
+                com from_start)
+        
+        Returns:
+            Lista dos arquivos novos
+        """
+        if self._watcher is not None:
+            # Pastas removidas perdem a watch e são observadas de novo se voltarem
+            self._watched.intersection_update(self._watcher.watches.values())
+        found = []
+        for pattern in self.globs:
+            root = _glob_root(pattern)
+            if root.is_dir():
+                self._watch(root)
+            for name in glob.iglob(pattern, recursive=True):
+                path = Path(name)
+                if path in self.tailers or path.suffix in COMPRESSED_SUFFIXES or not path.is_file():
+                    continue
+                try:
+                    position = _end_of_last_line(path) if initial and not self.from_start else 0
+                except OSError:
+                    continue
+                self.tailers[path] = LogTailer(path, position)
+                self._watch(path.parent)
+                found.append(path)
+        return found
+    
+    def _forget_missing(self):
+        """Para de acompanhar arquivos que não existem mais (lendo o que restou neles)"""
+        for path in [p for p, tailer in self.tailers.items() if not tailer.draining and not p.exists()]:
+            self._read({path})
+            self.tailers.pop(path).close()
+    
+    def _on_events(self):
+        """Callback do event loop: o descritor do inotify tem eventos para ler"""
+        changed, overflow = self._watcher.read(0)
+        self._changed |= changed
+        if overflow:
+            # Eventos perdidos: lê todos os arquivos e reexpande os globs
+            self._changed.update(self.tailers)
+            self._rescan = True
+        self._wakeup.set()
+    
+    def _read(self, paths):
+        """
+        Lê as linhas novas dos arquivos e as verifica, marcadas com a origem
+        
+        Returns:
+            Quantidade de linhas lidas
+        """
+        total = 0
+        for path in paths:
+            tailer = self.tailers.get(path)
+            if tailer is None:
+                continue
+            try:
+                lines = tailer.read_lines()
+            except Exception as e:
+                print(f"❌ Erro ao ler {path}: {e}")
+                continue
+            if not lines:
+                continue
+            if not total:
+                print("\n--- Novas linhas ---")
+            total += len(lines)
+            for line in lines:
+                print(f"  [{path}] {line}")
+            self.line_buffer.extend((path, line) for line in lines)
+            self.process_lines(lines, source=path)
+        return total
+    
+    def _pending(self):
+        """Arquivos a ler agora: alterados, em pastas sem inotify ou com rotação pendente"""
+        changed, self._changed = self._changed, set()
+        if any(path not in self.tailers and self._matches(path) for path in changed):
+            changed.update(self.discover())
+        return [path for path, tailer in self.tailers.items()
+                if path in changed or path.parent in self._polled or tailer.draining]
+    
+    async def run(self, interval=1, duration=None):
+        """
+        Acompanha os arquivos por duration segundos (None = infinito)
+        
+        Com inotify, o descritor do watcher é registrado no event loop
+        (add_reader) e só os arquivos alterados são lidos; arquivos em
+        pastas sem inotify (ou em sistemas de arquivos de rede) são
+        verificados a cada interval segundos.
+        
+        Args:
+            interval: Intervalo do polling e ritmo das estatísticas (segundos)
+            duration: Duração do monitoramento (None = infinito)
+        """
+        loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        if INOTIFY_AVAILABLE:
+            try:
+                self._watcher = InotifyWatcher()
+                loop.add_reader(self._watcher.fd, self._on_events)
+            except OSError:
+                self._watcher = None
+        self.discover(initial=True)
+        print(f"📂 {len(self.tailers)} arquivo(s) em {len(self._watched)} pasta(s) com inotify"
+              f" e {len(self._polled)} por polling")
+        
+        start = loop.time()
+        last_rescan = last_statistics = start
+        try:
+            while True:
+                self._read(self._pending())
+                
+                now = loop.time()
+                if self._rescan or now - last_rescan >= self.rescan_interval:
+                    self._forget_missing()
+                    self._read(self.discover())
+                    self._rescan = False
+                    last_rescan = now
+                if now - last_statistics >= 10 * interval:
+                    self.show_statistics()
+                    last_statistics = now
+                if duration and now - start >= duration:
+                    print(f"\n⏱️  Tempo de monitoramento ({duration}s) concluído.")
+                    break
+                
+                timeout = last_rescan + self.rescan_interval - now
+                if self._polled:
+                    timeout = min(timeout, interval)
+                if any(tailer.draining for tailer in self.tailers.values()):
+                    timeout = min(timeout, ROTATE_GRACE / 4)
+                if duration:
+                    timeout = min(timeout, start + duration - now)
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), max(timeout, 0))
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+        finally:
+            if self._watcher is not None:
+                loop.remove_reader(self._watcher.fd)
+                self._watcher.close()
+                self._watcher = None
+            self._watched.clear()
+            self._polled.clear()
+    
+    def monitor(self, interval=1, duration=None):
+        """
+        Monitora os arquivos continuamente (executa run num event loop novo)
+        
+        Args:
+            interval: Intervalo do polling e ritmo das estatísticas (segundos)
+            duration: Duração do monitoramento (None = infinito)
+        """
+        print(f"👁️  Monitorando: {', '.join(self.globs)}")
+        if duration:
+            print(f"⏰ Duração: {duration}s")
+        print("Pressione Ctrl+C para parar\n")
+        try:
+            asyncio.run(self.run(interval, duration))
+        except KeyboardInterrupt:
+            print("\n\n⏹️  Monitoramento interrompido.")
+            self.show_statistics()
+        finally:
+            self.close()
+    
+    def get_recent_lines(self, n=10):
+        """Retorna as últimas N linhas, como (arquivo, linha)"""
+        return list(self.line_buffer)[-n:]
+    
+    def close(self):
+        """Fecha todos os arquivos acompanhados"""
+        for tailer in self.tailers.values():
+            tailer.close()
+        self.tailers.clear()
+
+
 def create_example_log():
     """Cria um arquivo de log de exemplo"""
     log_file = Path("example.log")
@@ -278,8 +1761,10 @@ def main():
         pattern = input("Padrão a buscar (regex): ").strip()
         max_results = input("Máximo de resultados (padrão: 10): ").strip()
         max_results = int(max_results) if max_results.isdigit() else 10
+        since = input("Desde (AAAA-MM-DD HH:MM, Enter para o log todo): ").strip() or None
+        until = input("Até (AAAA-MM-DD HH:MM, Enter para o fim): ").strip() or None
         
-        matches = monitor.search_log(pattern, max_results=max_results)
+        matches = monitor.search_log(pattern, max_results=max_results, since=since, until=until)
         print(f"\n✅ {len(matches)} correspondências encontradas:")
         for match in matches:
             print(f"  Linha {match['line_number']}: {match['content']}")